@@ -5,15 +5,32 @@ Main API application
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+import glob
+import hmac
 import json
 import os
-import pickle
+import threading
+import time
 import pandas as pd
 from modules.json_parser import parse_match_json
 from modules.credits_calculator import calculate_credits_for_all
+from modules.data_snapshot import load_snapshot
+from modules.history_index import PlayerHistoryIndex
+from modules.role_percentiles import RolePercentileSnapshots
+from modules.role_resolver import RoleResolver
+from modules.feature_store import PlayerFeatureStore
+from modules.context_aggregates import ContextAggregates
+from modules.feature_cache import FeatureCache, data_version
+from modules.solver_cache import SolverCache
+from modules.row_cache import RowCache
+from modules.inference_batcher import InferenceBatcher
+from modules.model_registry import ModelRegistry, ARMS
+from modules.constraint_profiles import load_profiles, DEFAULT_PROFILE_NAME
 from modules.feature_engineer_v2 import create_features_for_inference_v2 as create_features_for_inference
-from modules.predictor import predict_fantasy_points
-from modules.constraints_solver import select_optimal_xi
+from modules.feature_engineer_v2 import create_features_for_batch_v2 as create_features_for_batch
+from modules.predictor import predict_fantasy_points, predict_fantasy_points_by_match
+from modules.constraints_solver import select_optimal_xi, select_top_k_xis, selection_sensitivity, DEFAULT_PROFILE
+from modules.risk_optimizer import select_risk_aware_xi, RISK_OBJECTIVES, DEFAULT_QUANTILE, DEFAULT_SCENARIOS
 from modules.explainer import compute_attributions
 from modules.fantasy_points import calculate_actual_fantasy_points
 from modules.llm_explainer import (
@@ -33,17 +50,22 @@ print("="*70)
 print("Dream11 Backend - Starting...")
 print("="*70)
 
+# Model packages live in MODEL_DIR; MODEL_PATH is the one served at startup
+MODEL_DIR = os.environ.get('MODEL_DIR', 'model_artifacts')
+MODEL_PATH = os.environ.get('MODEL_PATH', os.path.join(MODEL_DIR, 'ProductUI_Model.pkl'))
+
 # Load model and data on startup
-def load_model_package():
-    try:
-        with open('model_artifacts/ProductUI_Model.pkl', 'rb') as f:
-            return pickle.load(f)
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        return None
+def load_data_snapshot():
+    """Load the binary data snapshot if one was built and is still valid"""
+    snapshot = load_snapshot('data')
+    if snapshot is not None:
+        print("[OK] Using binary data snapshot")
+    return snapshot
 
-def load_historical_data():
+def load_historical_data(snapshot=None):
     """Load historical data - creates dummy data if file doesn't exist"""
+    if snapshot is not None:
+        return snapshot['matches']
     try:
         return pd.read_csv('data/player_match_base.csv', parse_dates=['match_date'])
     except FileNotFoundError:
@@ -60,8 +82,11 @@ def load_historical_data():
             'opponent': []
         })
 
-def load_roles():
+def load_roles(snapshot=None):
     """Load role mappings - creates dummy data if files don't exist"""
+    if snapshot is not None:
+        return snapshot['roles_by_season'], snapshot['roles_global']
+
     try:
         roles_by_season = pd.read_csv('data/player_roles_by_season.csv')
     except FileNotFoundError:
@@ -77,15 +102,60 @@ def load_roles():
     return roles_by_season, roles_global
 
 print("Loading model and historical data...")
-model_package = load_model_package()
-historical_data = load_historical_data()
-roles_by_season, roles_global = load_roles()
+# Served model versions: the active one plus an optional A/B candidate,
+# hot-swappable through the /admin/models endpoints
+model_registry = ModelRegistry()
+model_registry.load(MODEL_PATH, background=False)
+data_snapshot = load_data_snapshot()
+historical_data = load_historical_data(data_snapshot)
+history_index = PlayerHistoryIndex(historical_data)
+feature_store = PlayerFeatureStore(history_index)
+context_aggregates = ContextAggregates(historical_data)
+roles_by_season, roles_global = load_roles(data_snapshot)
+role_resolver = RoleResolver(roles_by_season, roles_global)
+role_percentiles = RolePercentileSnapshots(history_index, role_resolver)
+
+# Optionally materialize role-percentile snapshots for whole seasons up front,
+# e.g. PERCENTILE_PRECOMPUTE_SEASONS=2024,2025
+for season in filter(None, os.environ.get('PERCENTILE_PRECOMPUTE_SEASONS', '').split(',')):
+    role_percentiles.precompute_season(season.strip())
+
+# Feature vectors are cached per (player, match context); the data version
+# ties them to the loaded history, and each model version (whose label
+# encoders they use) reads them through its own view
+feature_cache = FeatureCache(max_bytes=int(os.environ.get('FEATURE_CACHE_MB', 32)) * 1024 * 1024)
+feature_cache.set_version(data_version(historical_data, None))
+
+# Predictions and attributions per feature row, keyed by model version
+row_cache = RowCache(max_entries=int(os.environ.get('ROW_CACHE_ENTRIES', 20000)))
+
+# Concurrent /predict calls score their uncached rows in shared model calls,
+# waiting at most INFERENCE_BATCH_WAIT_MS for company (INFERENCE_BATCH_ROWS=0
+# predicts in the request thread instead)
+INFERENCE_BATCH_ROWS = int(os.environ.get('INFERENCE_BATCH_ROWS', 512))
+inference_batcher = InferenceBatcher(
+    max_wait_ms=float(os.environ.get('INFERENCE_BATCH_WAIT_MS', 2)),
+    max_rows=INFERENCE_BATCH_ROWS
+) if INFERENCE_BATCH_ROWS > 0 else None
+
+# Selected XIs keyed by a hash of the candidates and constraints (shared by
+# the predicted-XI and Dream-XI solves)
+solver_cache = SolverCache(max_entries=int(os.environ.get('SOLVER_CACHE_ENTRIES', 4096)))
+
+# Contest formats selectable with ?profile=<name>, compiled once here
+constraint_profiles = load_profiles(os.environ.get('CONSTRAINT_PROFILES', 'config/constraint_profiles.json'), DEFAULT_PROFILE)
+print(f"[OK] Constraint profiles: {', '.join(sorted(constraint_profiles))}")
 
-if model_package:
-    print(f"[OK] Model loaded: {model_package['model_name']}")
+# Time allowed for the attributions of one /predict in ms (0 = always exact);
+# the most faithful mode expected to fit is used
+ATTRIBUTION_BUDGET_MS = float(os.environ.get('ATTRIBUTION_BUDGET_MS', 0))
+
+if model_registry.active:
+    print(f"[OK] Model loaded: {model_registry.active['name']} (version {model_registry.active['version']})")
     print(f"[OK] Historical data: {len(historical_data)} records")
     print(f"[OK] Roles by season: {len(roles_by_season)} records")
     print(f"[OK] Roles global: {len(roles_global)} records")
+    print(f"[OK] Role percentile snapshots: {role_percentiles.stats()['snapshots']} precomputed")
 else:
     print("[ERROR] Model not loaded!")
 
@@ -99,10 +169,332 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "message": "Dream11 Backend is running!",
-        "model_loaded": model_package is not None,
-        "data_records": len(historical_data)
+        "model_loaded": model_registry.active is not None,
+        "models": model_registry.stats(),
+        "data_records": len(historical_data),
+        "feature_cache": feature_cache.stats(),
+        "row_cache": row_cache.stats(),
+        "solver_cache": solver_cache.stats(),
+        "constraint_profiles": sorted(constraint_profiles)
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Inference batching (queue depth, batch sizes, waits) and cache counters"""
+    return jsonify({
+        "inference_batcher": inference_batcher.stats() if inference_batcher else None,
+        "row_cache": row_cache.stats(),
+        "feature_cache": feature_cache.stats(),
+        "solver_cache": solver_cache.stats(),
+        "models_served": model_registry.stats()['served']
+    })
+
+# Upper bound on the lineups one /predict call may ask for
+MAX_LINEUPS = 20
+
+# Upper bound on the Monte Carlo scenarios of one risk-aware /predict
+MAX_SCENARIOS = 100000
+
+# Default solver time budget per /predict in ms (0 = none), overridden by ?time_limit_ms=
+SOLVER_TIME_LIMIT_MS = int(os.environ.get('SOLVER_TIME_LIMIT_MS', 0))
+
+# Request header that picks the model arm ('active' / 'candidate') or carries
+# a routing key (e.g. a user id) hashed into the candidate's traffic share
+ROUTE_HEADER = 'X-Model-Route'
+
+def route_model():
+    """(arm, version) serving the current request"""
+    return model_registry.route(request.headers.get(ROUTE_HEADER))
+
+def captaincy_multiplier(player, xi_result):
+    """Points multiplier of a selected player (2.0 captain, 1.5 vice-captain)"""
+    if player is xi_result.get('captain'):
+        return xi_result['multipliers'][0]
+    if player is xi_result.get('vice_captain'):
+        return xi_result['multipliers'][1]
+    return 1.0
+
+def prediction_interval(player):
+    """Spread of the forest's per-tree predictions for a player"""
+    return {
+        "std": round(player['tree_std_fp'], 2),
+        "p10": round(player['p10_fp'], 2),
+        "p90": round(player['p90_fp'], 2)
+    }
+
+def player_ref(player):
+    """Short reference to a player, or None"""
+    if player is None:
+        return None
+    return {"player_id": player['player_id'], "player_name": player['player_name']}
+
+def run_prediction(match_data, k=1, min_diff=1, profile=DEFAULT_PROFILE_NAME, risk=None, time_limit_ms=0, model=None):
+    """
+    Run the full pipeline for one match JSON
+
+    With k > 1 the response also lists the k best lineups, each differing
+    from every better one in at least min_diff players. profile names the
+    constraint profile (contest format) the XI is selected under.
+
+    risk, if given, is a dict of select_risk_aware_xi options (objective,
+    quantile, threshold, n_scenarios); the recommended XI is then the one
+    with the best risk objective instead of the best mean.
+
+    time_limit_ms (0 = none) bounds the whole selection stage - XI, extra
+    lineups and sensitivity; a solve cut short returns its best lineup so
+    far, with the proven bound and gap in budget_info. A selection that
+    ran out of time without any lineup is repeated without the limit, and
+    a ValueError is raised when no XI satisfies the profile.
+
+    model is the registry version to predict with (default: the active one).
+
+    Returns:
+        dict: the /predict response body
+    """
+    model = model or model_registry.active
+    model_package = model['package']
+
+    # 2. Parse match JSON
+    match_info = parse_match_json(match_data)
+    print(f"\n[PREDICT] Processing match: {match_info['match_id']}")
+    print(f"  Teams: {match_info['team1']} vs {match_info['team2']}")
+    print(f"  Venue: {match_info['venue']}")
+    print(f"  Players: {len(match_info['players'])}")
+
+    # 3. Calculate credits for all players
+    player_credits = calculate_credits_for_all(
+        match_info['players'],
+        match_info['match_date'],
+        historical_data,
+        roles_by_season,
+        roles_global,
+        history_index=history_index,
+        role_percentiles=role_percentiles,
+        role_resolver=role_resolver
+    )
+    print(f"  Credits calculated for {len(player_credits)} players")
+
+    # 4. Create features for prediction
+    player_features = create_features_for_inference(
+        match_info['players'],
+        match_info['match_date'],
+        match_info['venue'],
+        historical_data,
+        roles_by_season,
+        roles_global,
+        model_package['label_encoders'],
+        role_resolver=role_resolver,
+        feature_store=feature_store,
+        context_aggregates=context_aggregates,
+        feature_cache=feature_cache.view(model['version'])
+    )
+    print(f"  Features created: {len(player_features)} players x {len(model_package['feature_cols'])} features")
+
+    # 5. Predict fantasy points
+    predictions, intervals = predict_fantasy_points(
+        player_features,
+        model_package['model'],
+        model_package['feature_cols'],
+        intervals=True,
+        forest=model['forest'],
+        cache=row_cache.view(model['version']),
+        batcher=inference_batcher
+    )
+    print(f"  Predictions generated for {len(predictions)} players")
+
+    # 6. Merge predictions with player info and credits
+    recent_std = dict(zip(player_features['player_id'], player_features['std_fp_last10']))
+    player_data = []
+    for player in match_info['players']:
+        player_data.append({
+            'player_id': player['player_id'],
+            'player_name': player['player_name'],
+            'team': player['team'],
+            'role': player.get('role', 'BAT'),
+            'predicted_fp': predictions.get(player['player_id'], 0),
+            'std_fp': float(recent_std.get(player['player_id'], 0) or 0),
+            'tree_std_fp': intervals.get(player['player_id'], {}).get('std', 0.0),
+            'p10_fp': intervals.get(player['player_id'], {}).get('p10', predictions.get(player['player_id'], 0)),
+            'p90_fp': intervals.get(player['player_id'], {}).get('p90', predictions.get(player['player_id'], 0)),
+            'credits': player_credits.get(player['player_id'], 7.5)
+        })
+
+    # 7. Run constraints solver
+    constraints = constraint_profiles[profile]
+    deadline = time.perf_counter() + time_limit_ms / 1000 if time_limit_ms else None
+
+    def time_left():
+        return None if deadline is None else max(deadline - time.perf_counter(), 0.0)
+
+    def select_lineups(time_limit):
+        # The k best lineups (k > 1) and the recommended XI
+        lineups = []
+        if k > 1:
+            lineups = select_top_k_xis(
+                player_data,
+                match_info['team1'],
+                match_info['team2'],
+                k=k,
+                min_diff=min_diff,
+                solver_cache=solver_cache,
+                profile=constraints,
+                time_limit=time_limit
+            )
+            print(f"  Lineups selected: {len(lineups)}/{k}")
+        if risk:
+            optimal_xi = select_risk_aware_xi(
+                player_data,
+                match_info['team1'],
+                match_info['team2'],
+                solver_cache=solver_cache,
+                profile=constraints,
+                time_limit=time_limit,
+                **risk
+            )
+            print(f"  Risk-aware XI: {risk['objective']} = {optimal_xi.get('risk', {}).get('value', 0):.3f}")
+        else:
+            optimal_xi = lineups[0] if lineups else select_optimal_xi(
+                player_data,
+                match_info['team1'],
+                match_info['team2'],
+                solver_cache=solver_cache,
+                profile=constraints,
+                time_limit=time_limit
+            )
+        return lineups, optimal_xi
+
+    lineups, optimal_xi = select_lineups(time_left())
+    if not optimal_xi['selected_players'] and optimal_xi['status'] == 'Not Solved':
+        # Out of time before any lineup (CBC): a late XI beats an empty one
+        print(f"[WARNING] No lineup within {time_limit_ms} ms - solving without the time limit")
+        lineups, optimal_xi = select_lineups(None)
+    if not optimal_xi['selected_players']:
+        raise ValueError(f"No XI satisfies the '{profile}' constraints ({optimal_xi['status']})")
+    print(f"  Optimal XI selected: {len(optimal_xi['selected_players'])} players ({profile} profile, {optimal_xi['status']})")
+    print(f"  Total credits: {optimal_xi['total_credits']:.2f}/{optimal_xi['budget']:g}")
+    print(f"  Predicted FP: {optimal_xi['total_predicted_fp']:.2f} ({optimal_xi['total_fp_with_captaincy']:.2f} with C/VC)")
+
+    # How far each player's prediction would have to move to flip their selection.
+    # The thresholds are against the best XI by predicted FP with captaincy, so
+    # they only describe the recommended XI when it is that XI (not in risk
+    # mode, and not when the solve was cut short)
+    sensitivity = {}
+    sensitivity_objective = None
+    if not risk and optimal_xi['status'] == 'Optimal':
+        sensitivity_objective = 'total_fp_with_captaincy'
+        sensitivity = selection_sensitivity(
+            player_data,
+            match_info['team1'],
+            match_info['team2'],
+            profile=constraints,
+            time_limit=time_left(),
+            lineup=[p['player_id'] for p in optimal_xi['selected_players']]
+        )
+
+    # 8. Compute SHAP attributions
+    attributions = compute_attributions(
+        optimal_xi,
+        player_features,
+        model_package['model'],
+        model_package['feature_cols'],
+        explainer=model['explainer'],
+        budget_ms=ATTRIBUTION_BUDGET_MS,
+        cache=row_cache.view(model['version'])
+    )
+
+    # 9. Format response
+    response = {
+        "model": {"version": model['version'], "name": model['name']},
+        "match_info": {
+            "match_id": match_info.get('match_id', 'unknown'),
+            "match_date": match_info['match_date'].strftime('%Y-%m-%d'),
+            "team1": match_info['team1'],
+            "team2": match_info['team2'],
+            "venue": match_info['venue']
+        },
+        "recommended_xi": [
+            {
+                "rank": idx + 1,
+                "player_id": p['player_id'],
+                "player_name": p['player_name'],
+                "team": p['team'],
+                "role": p['role'],
+                "predicted_fp": round(p['predicted_fp'], 2),
+                "prediction_interval": prediction_interval(p),
+                "credits": p['credits'],
+                "multiplier": captaincy_multiplier(p, optimal_xi),
+                "attribution": attributions.get(p['player_id'], {})
+            }
+            for idx, p in enumerate(optimal_xi['selected_players'])
+        ],
+        "captain": player_ref(optimal_xi['captain']),
+        "vice_captain": player_ref(optimal_xi['vice_captain']),
+        "budget_info": {
+            "profile": profile,
+            "total_credits_used": round(optimal_xi['total_credits'], 2),
+            "total_credits_available": optimal_xi['budget'],
+            "credits_remaining": round(optimal_xi['budget'] - optimal_xi['total_credits'], 2),
+            "role_distribution": optimal_xi['role_counts'],
+            "team_distribution": optimal_xi['team_counts'],
+            "constraints_satisfied": optimal_xi['feasible'],
+            "pruned_players": optimal_xi['pruned_players'],
+            "solver_status": optimal_xi['status'],
+            "objective_bound": None if optimal_xi['objective_bound'] is None else round(optimal_xi['objective_bound'], 2),
+            "optimality_gap": None if optimal_xi['optimality_gap'] is None else round(optimal_xi['optimality_gap'], 4)
+        },
+        "predictions_summary": {
+            "total_predicted_fp": round(optimal_xi['total_predicted_fp'], 2),
+            "average_predicted_fp": round(optimal_xi['total_predicted_fp'] / constraints['squad_size'], 2),
+            "total_fp_with_captaincy": round(optimal_xi['total_fp_with_captaincy'], 2)
+        },
+        "selection_sensitivity_objective": sensitivity_objective,
+        "selection_sensitivity": [
+            {
+                "player_id": p['player_id'],
+                "player_name": p['player_name'],
+                "selected": sensitivity[p['player_id']]['selected'],
+                "predicted_fp": round(p['predicted_fp'], 2),
+                "fp_change_to_flip": None if sensitivity[p['player_id']]['fp_change'] is None else round(sensitivity[p['player_id']]['fp_change'], 2),
+                "fp_threshold": None if sensitivity[p['player_id']]['fp_threshold'] is None else round(sensitivity[p['player_id']]['fp_threshold'], 2)
+            }
+            for p in player_data if p['player_id'] in sensitivity
+        ]
+    }
+
+    if 'risk' in optimal_xi:
+        response["risk"] = {
+            key: round(value, 4) if isinstance(value, float) else value
+            for key, value in optimal_xi['risk'].items()
+        }
+
+    if k > 1:
+        response["lineups"] = [
+            {
+                "rank": rank + 1,
+                "total_predicted_fp": round(lineup['total_predicted_fp'], 2),
+                "total_fp_with_captaincy": round(lineup['total_fp_with_captaincy'], 2),
+                "total_credits_used": round(lineup['total_credits'], 2),
+                "captain": player_ref(lineup['captain']),
+                "vice_captain": player_ref(lineup['vice_captain']),
+                "players": [
+                    {
+                        "player_id": p['player_id'],
+                        "player_name": p['player_name'],
+                        "team": p['team'],
+                        "role": p['role'],
+                        "predicted_fp": round(p['predicted_fp'], 2),
+                        "prediction_interval": prediction_interval(p),
+                        "credits": p['credits'],
+                        "multiplier": captaincy_multiplier(p, lineup)
+                    }
+                    for p in lineup['selected_players']
+                ]
+            }
+            for rank, lineup in enumerate(lineups)
+        ]
+
+    return response
+
 @app.route('/predict', methods=['POST'])
 def predict_team():
     """
@@ -119,108 +511,47 @@ def predict_team():
         if not match_data:
             return jsonify({"error": "No match data provided"}), 400
 
-        # 2. Parse match JSON
-        match_info = parse_match_json(match_data)
-        print(f"\n[PREDICT] Processing match: {match_info['match_id']}")
-        print(f"  Teams: {match_info['team1']} vs {match_info['team2']}")
-        print(f"  Venue: {match_info['venue']}")
-        print(f"  Players: {len(match_info['players'])}")
-
-        # 3. Calculate credits for all players
-        player_credits = calculate_credits_for_all(
-            match_info['players'],
-            match_info['match_date'],
-            historical_data,
-            roles_by_season,
-            roles_global
-        )
-        print(f"  Credits calculated for {len(player_credits)} players")
-
-        # 4. Create features for prediction
-        player_features = create_features_for_inference(
-            match_info['players'],
-            match_info['match_date'],
-            match_info['venue'],
-            historical_data,
-            roles_by_season,
-            roles_global,
-            model_package['label_encoders']
-        )
-        print(f"  Features created: {len(player_features)} players x {len(model_package['feature_cols'])} features")
+        # Optional: ?k=<lineups>&min_diff=<players>&profile=<name>
+        k = request.args.get('k', 1, type=int)
+        min_diff = request.args.get('min_diff', 1, type=int)
+        profile = request.args.get('profile', DEFAULT_PROFILE_NAME)
+        if profile not in constraint_profiles:
+            return jsonify({"error": f"Unknown profile '{profile}'", "profiles": sorted(constraint_profiles)}), 400
+        squad_size = constraint_profiles[profile]['squad_size']
+        if not 1 <= k <= MAX_LINEUPS:
+            return jsonify({"error": f"k must be between 1 and {MAX_LINEUPS}"}), 400
+        if not 1 <= min_diff <= squad_size:
+            return jsonify({"error": f"min_diff must be between 1 and {squad_size}"}), 400
 
-        # 5. Predict fantasy points
-        predictions = predict_fantasy_points(
-            player_features,
-            model_package['model'],
-            model_package['feature_cols']
-        )
-        print(f"  Predictions generated for {len(predictions)} players")
-
-        # 6. Merge predictions with player info and credits
-        player_data = []
-        for player in match_info['players']:
-            player_data.append({
-                'player_id': player['player_id'],
-                'player_name': player['player_name'],
-                'team': player['team'],
-                'role': player.get('role', 'BAT'),
-                'predicted_fp': predictions.get(player['player_id'], 0),
-                'credits': player_credits.get(player['player_id'], 7.5)
-            })
-
-        # 7. Run constraints solver
-        optimal_xi = select_optimal_xi(
-            player_data,
-            match_info['team1'],
-            match_info['team2']
-        )
-        print(f"  Optimal XI selected: {len(optimal_xi['selected_players'])} players")
-        print(f"  Total credits: {optimal_xi['total_credits']:.2f}/100")
-        print(f"  Predicted FP: {optimal_xi['total_predicted_fp']:.2f}")
-
-        # 8. Compute SHAP attributions
-        attributions = compute_attributions(
-            optimal_xi,
-            player_features,
-            model_package['model'],
-            model_package['feature_cols']
-        )
-
-        # 9. Format response
-        response = {
-            "match_info": {
-                "match_id": match_info.get('match_id', 'unknown'),
-                "match_date": match_info['match_date'].strftime('%Y-%m-%d'),
-                "team1": match_info['team1'],
-                "team2": match_info['team2'],
-                "venue": match_info['venue']
-            },
-            "recommended_xi": [
-                {
-                    "rank": idx + 1,
-                    "player_id": p['player_id'],
-                    "player_name": p['player_name'],
-                    "team": p['team'],
-                    "role": p['role'],
-                    "predicted_fp": round(p['predicted_fp'], 2),
-                    "credits": p['credits'],
-                    "attribution": attributions.get(p['player_id'], {})
-                }
-                for idx, p in enumerate(optimal_xi['selected_players'])
-            ],
-            "budget_info": {
-                "total_credits_used": round(optimal_xi['total_credits'], 2),
-                "total_credits_available": 100,
-                "credits_remaining": round(100 - optimal_xi['total_credits'], 2),
-                "role_distribution": optimal_xi['role_counts'],
-                "team_distribution": optimal_xi['team_counts'],
-                "constraints_satisfied": optimal_xi['feasible']
-            },
-            "predictions_summary": {
-                "total_predicted_fp": round(optimal_xi['total_predicted_fp'], 2),
-                "average_predicted_fp": round(optimal_xi['total_predicted_fp'] / 11, 2)
+        # Optional: ?risk=quantile&q=0.2 or ?risk=prob_above&threshold=450 (&scenarios=10000)
+        risk = None
+        if 'risk' in request.args:
+            risk = {
+                'objective': request.args.get('risk'),
+                'quantile': request.args.get('q', DEFAULT_QUANTILE, type=float),
+                'threshold': request.args.get('threshold', None, type=float),
+                'n_scenarios': request.args.get('scenarios', DEFAULT_SCENARIOS, type=int)
             }
-        }
+            if risk['objective'] not in RISK_OBJECTIVES:
+                return jsonify({"error": f"risk must be one of {', '.join(RISK_OBJECTIVES)}"}), 400
+            if risk['objective'] == 'quantile' and not 0 < risk['quantile'] < 1:
+                return jsonify({"error": "q must be between 0 and 1"}), 400
+            if risk['objective'] == 'prob_above' and risk['threshold'] is None:
+                return jsonify({"error": "risk=prob_above needs a threshold"}), 400
+            if not 1 <= risk['n_scenarios'] <= MAX_SCENARIOS:
+                return jsonify({"error": f"scenarios must be between 1 and {MAX_SCENARIOS}"}), 400
+
+        # Optional: ?time_limit_ms=<ms> solver budget (default SOLVER_TIME_LIMIT_MS)
+        time_limit_ms = request.args.get('time_limit_ms', SOLVER_TIME_LIMIT_MS, type=int)
+        if time_limit_ms < 0:
+            return jsonify({"error": "time_limit_ms must be non-negative"}), 400
+
+        arm, model = route_model()
+        if model is None:
+            return jsonify({"error": "Model not loaded"}), 503
+        response = run_prediction(match_data, k=k, min_diff=min_diff, profile=profile, risk=risk,
+                                  time_limit_ms=time_limit_ms, model=model)
+        response["model"]["arm"] = arm
 
         print(f"[SUCCESS] Prediction complete\n")
         return jsonify(response), 200
@@ -233,6 +564,48 @@ def predict_team():
         print(stack_trace)
         return jsonify({"error": error_msg, "details": stack_trace}), 500
 
+# Readiness: a worker only takes traffic once warm-up has paid the first-call
+# costs (lazy imports, solver start-up, first SHAP call) on the bundled samples
+readiness = {'ready': False, 'warmup_matches': 0, 'warmup_error': None}
+
+def warm_up(sample_dir='data/sample'):
+    """Run predictions on the sample matches, then mark the worker ready if at least one ran"""
+    try:
+        if model_registry.active is None:
+            readiness['warmup_error'] = "Model not loaded"
+            return
+        sample_paths = sorted(glob.glob(os.path.join(sample_dir, '*.json')))
+        if not sample_paths:
+            # Nothing would be warmed; stay unready rather than report a warm worker
+            readiness['warmup_error'] = f"No sample matches in {os.path.abspath(sample_dir)}"
+            print(f"[WARNING] Warm-up failed: {readiness['warmup_error']}")
+            return
+        for path in sample_paths:
+            with open(path) as f:
+                run_prediction(json.load(f))
+            readiness['warmup_matches'] += 1
+        print(f"[OK] Warm-up complete: {readiness['warmup_matches']} sample matches")
+    except Exception as e:
+        readiness['warmup_error'] = str(e)
+        print(f"[WARNING] Warm-up failed: {e}")
+    finally:
+        readiness['ready'] = model_registry.active is not None and readiness['warmup_matches'] > 0
+
+@app.route('/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: the process is up and serving HTTP"""
+    return jsonify({"status": "alive"}), 200
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 once the model is loaded and warm-up has run the sample matches"""
+    return jsonify({
+        "ready": readiness['ready'],
+        "model_loaded": model_registry.active is not None,
+        "warmup_matches": readiness['warmup_matches'],
+        "warmup_error": readiness['warmup_error']
+    }), 200 if readiness['ready'] else 503
+
 @app.route('/explain', methods=['POST'])
 def get_explanations():
     """Get detailed LLM-powered explanations for predictions"""
@@ -312,10 +685,237 @@ def export_eval_csv():
         import traceback
         return jsonify({"error": str(e), "trace": traceback.format_exc()}), 500
 
+def run_batch(match_jsons, profile=DEFAULT_PROFILE_NAME, model=None):
+    """
+    Score, select and evaluate a list of match JSONs
+
+    Every XI (predicted and Dream) is selected under the named constraint
+    profile, from the predictions of the given registry version (default:
+    the active one). A failing match gets a 'failed' result without
+    affecting the others.
+
+    Returns:
+        list: one result dict per match, in input order
+    """
+    model = model or model_registry.active
+    model_package = model['package']
+    results = [None] * len(match_jsons)
+    constraints = constraint_profiles[profile]
+
+    # 1. Parse and price each match on its own so one bad match stays isolated
+    parsed = []
+    for position, match_data in enumerate(match_jsons):
+        try:
+            match_info = parse_match_json(match_data)
+
+            player_credits = calculate_credits_for_all(
+                match_info['players'],
+                match_info['match_date'],
+                historical_data,
+                roles_by_season,
+                roles_global,
+                history_index=history_index,
+                role_percentiles=role_percentiles,
+                role_resolver=role_resolver
+            )
+
+            parsed.append((position, match_data, match_info, player_credits))
+
+        except Exception as e:
+            results[position] = {
+                "match_id": "error",
+                "error": str(e),
+                "status": "failed"
+            }
+
+    # 2. Build every match's features in one pass and score them in one model call
+    batch_predictions = {}
+    if parsed:
+        try:
+            batch_features = create_features_for_batch(
+                [match_info for _, _, match_info, _ in parsed],
+                historical_data,
+                roles_by_season,
+                roles_global,
+                model_package['label_encoders'],
+                role_resolver=role_resolver,
+                feature_store=feature_store,
+                context_aggregates=context_aggregates
+            )
+
+            if len(batch_features):
+                batch_predictions = predict_fantasy_points_by_match(
+                    batch_features,
+                    model_package['model'],
+                    model_package['feature_cols'],
+                    forest=model['forest']
+                )
+        except Exception as e:
+            for position, _, _, _ in parsed:
+                results[position] = {
+                    "match_id": "error",
+                    "error": str(e),
+                    "status": "failed"
+                }
+            parsed = []
+
+    # 3. Select and evaluate each match's XI
+    for batch_index, (position, match_data, match_info, player_credits) in enumerate(parsed):
+        try:
+            predictions = batch_predictions.get(batch_index, {})
+
+            player_data = []
+            for player in match_info['players']:
+                player_data.append({
+                    'player_id': player['player_id'],
+                    'player_name': player['player_name'],
+                    'team': player['team'],
+                    'role': player.get('role', 'BAT'),
+                    'predicted_fp': predictions.get(player['player_id'], 0),
+                    'credits': player_credits.get(player['player_id'], 7.5)
+                })
+
+            optimal_xi = select_optimal_xi(
+                player_data,
+                match_info['team1'],
+                match_info['team2'],
+                solver_cache=solver_cache,
+                profile=constraints
+            )
+
+            # Calculate Dream XI and ae_team_total
+            from modules.evaluation import compute_dream_xi, compute_ae_team_total
+
+            # Get actual fantasy points from match data if available
+            actual_fp_dict = {}
+            if 'innings' in match_data:
+                from modules.fantasy_points import calculate_actual_fantasy_points
+                actual_fp_dict = calculate_actual_fantasy_points(match_data, match_info['players'])
+
+            dream_xi_result = None
+            ae_team_total = 0
+
+            if actual_fp_dict:
+                try:
+                    dream_xi_result = compute_dream_xi(match_data, match_info['players'], actual_fp_dict,
+                                                       solver_cache=solver_cache, profile=constraints)
+                    if dream_xi_result and dream_xi_result.get('selected_players'):
+                        ae_team_total = compute_ae_team_total(
+                            optimal_xi['selected_players'],
+                            dream_xi_result['selected_players'],
+                            constraints['multipliers']
+                        )
+                except:
+                    pass  # If Dream XI calculation fails, just skip it
+
+            results[position] = {
+                "match_id": match_info.get('match_id', 'unknown'),
+                "match_date": match_info['match_date'].strftime('%Y-%m-%d'),
+                "team1": match_info['team1'],
+                "team2": match_info['team2'],
+                "predicted_xi": [p['player_name'] for p in optimal_xi['selected_players']],
+                "dream_xi": [p['player_name'] for p in dream_xi_result['selected_players']] if dream_xi_result else [],
+                "captain": optimal_xi['captain']['player_name'] if optimal_xi['captain'] else None,
+                "vice_captain": optimal_xi['vice_captain']['player_name'] if optimal_xi['vice_captain'] else None,
+                "total_predicted_fp": round(optimal_xi['total_predicted_fp'], 2),
+                "total_fp_with_captaincy": round(optimal_xi['total_fp_with_captaincy'], 2),
+                "total_credits": round(optimal_xi['total_credits'], 2),
+                "profile": profile,
+                "model_version": model['version'],
+                "ae_team_total": round(ae_team_total, 2),
+                "status": "success"
+            }
+
+        except Exception as e:
+            results[position] = {
+                "match_id": "error",
+                "error": str(e),
+                "status": "failed"
+            }
+
+    return results
+
+# Optional worker processes for /batch_predict (BATCH_WORKERS, 0 = in-process).
+# They are forked once the model and history are loaded, so they share them
+# copy-on-write; only match JSONs and result dicts cross process boundaries.
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 0))
+BATCH_PARALLEL_MIN = int(os.environ.get('BATCH_PARALLEL_MIN', 8))
+batch_pool = None
+
+def start_batch_pool(workers):
+    """
+    Fork the batch worker processes
+
+    Must run while the main thread is the only thread, so no worker inherits
+    a lock held by another thread.
+    """
+    global batch_pool
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    batch_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+    # With fork the executor starts every worker on the first submit
+    batch_pool.submit(os.getpid).result()
+    print(f"[OK] Batch worker pool started: {workers} processes")
+
+def run_batch_for_version(match_jsons, profile, version_id, path):
+    """run_batch in a worker, loading the version first if it was installed after the fork"""
+    return run_batch(match_jsons, profile, model_registry.resolve(version_id, path))
+
+def run_batch_parallel(match_jsons, profile=DEFAULT_PROFILE_NAME, model=None):
+    """
+    run_batch over the worker pool in contiguous chunks
+
+    Small batches (or no pool) run in-process. A chunk whose worker dies
+    fails only that chunk's matches; the pool is then retired and later
+    batches run in-process.
+
+    Returns:
+        list: one result dict per match, in input order
+    """
+    global batch_pool
+    model = model or model_registry.active
+    pool = batch_pool
+    if pool is None or len(match_jsons) < BATCH_PARALLEL_MIN:
+        return run_batch(match_jsons, profile, model)
+
+    # A few chunks per worker balances uneven match costs
+    n_chunks = min(len(match_jsons), BATCH_WORKERS * 4)
+    bounds = [len(match_jsons) * i // n_chunks for i in range(n_chunks + 1)]
+    futures = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        try:
+            futures.append((start, stop, pool.submit(run_batch_for_version, match_jsons[start:stop], profile,
+                                                     model['version'], model['path'])))
+        except Exception as e:
+            futures.append((start, stop, e))
+
+    from concurrent.futures.process import BrokenProcessPool
+    results = []
+    for start, stop, future in futures:
+        try:
+            if isinstance(future, Exception):
+                raise future
+            results.extend(future.result())
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and batch_pool is pool:
+                print(f"[WARNING] Batch worker pool broke ({e}) - running batches in-process")
+                batch_pool = None
+            results.extend({
+                "match_id": "error",
+                "error": str(e),
+                "status": "failed"
+            } for _ in range(stop - start))
+    return results
+
 @app.route('/batch_predict', methods=['POST'])
 def batch_predict():
     """Handle multiple match JSONs for batch processing"""
     try:
+        # Optional: ?profile=<name>, applied to every match
+        profile = request.args.get('profile', DEFAULT_PROFILE_NAME)
+        if profile not in constraint_profiles:
+            return jsonify({"error": f"Unknown profile '{profile}'", "profiles": sorted(constraint_profiles)}), 400
+
         files = request.files.getlist('files')
         if not files:
             match_jsons = request.get_json()
@@ -327,98 +927,16 @@ def batch_predict():
                 match_data = json.load(file)
                 match_jsons.append(match_data)
 
-        results = []
-
-        for match_data in match_jsons:
-            try:
-                # Process each match (simplified version)
-                match_info = parse_match_json(match_data)
-
-                player_credits = calculate_credits_for_all(
-                    match_info['players'],
-                    match_info['match_date'],
-                    historical_data,
-                    roles_by_season,
-                    roles_global
-                )
-
-                player_features = create_features_for_inference(
-                    match_info['players'],
-                    match_info['match_date'],
-                    match_info['venue'],
-                    historical_data,
-                    roles_by_season,
-                    roles_global,
-                    model_package['label_encoders']
-                )
+        arm, model = route_model()
+        if model is None:
+            return jsonify({"error": "Model not loaded"}), 503
+        results = run_batch_parallel(match_jsons, profile, model)
 
-                predictions = predict_fantasy_points(
-                    player_features,
-                    model_package['model'],
-                    model_package['feature_cols']
-                )
-
-                player_data = []
-                for player in match_info['players']:
-                    player_data.append({
-                        'player_id': player['player_id'],
-                        'player_name': player['player_name'],
-                        'team': player['team'],
-                        'role': player.get('role', 'BAT'),
-                        'predicted_fp': predictions.get(player['player_id'], 0),
-                        'credits': player_credits.get(player['player_id'], 7.5)
-                    })
-
-                optimal_xi = select_optimal_xi(
-                    player_data,
-                    match_info['team1'],
-                    match_info['team2']
-                )
-
-                # Calculate Dream XI and ae_team_total
-                from modules.evaluation import compute_dream_xi, compute_ae_team_total
-
-                # Get actual fantasy points from match data if available
-                actual_fp_dict = {}
-                if 'innings' in match_data:
-                    from modules.fantasy_points import calculate_actual_fantasy_points
-                    actual_fp_dict = calculate_actual_fantasy_points(match_data, match_info['players'])
-
-                dream_xi_result = None
-                ae_team_total = 0
-
-                if actual_fp_dict:
-                    try:
-                        dream_xi_result = compute_dream_xi(match_data, match_info['players'], actual_fp_dict)
-                        if dream_xi_result and dream_xi_result.get('selected_players'):
-                            ae_team_total = compute_ae_team_total(
-                                optimal_xi['selected_players'],
-                                dream_xi_result['selected_players']
-                            )
-                    except:
-                        pass  # If Dream XI calculation fails, just skip it
-
-                results.append({
-                    "match_id": match_info.get('match_id', 'unknown'),
-                    "match_date": match_info['match_date'].strftime('%Y-%m-%d'),
-                    "team1": match_info['team1'],
-                    "team2": match_info['team2'],
-                    "predicted_xi": [p['player_name'] for p in optimal_xi['selected_players']],
-                    "dream_xi": [p['player_name'] for p in dream_xi_result['selected_players']] if dream_xi_result else [],
-                    "total_predicted_fp": round(optimal_xi['total_predicted_fp'], 2),
-                    "total_credits": round(optimal_xi['total_credits'], 2),
-                    "ae_team_total": round(ae_team_total, 2),
-                    "status": "success"
-                })
-
-            except Exception as e:
-                results.append({
-                    "match_id": "error",
-                    "error": str(e),
-                    "status": "failed"
-                })
-
-        return jsonify({"results": results, "total_processed": len(results)}), 200
+        return jsonify({
+            "results": results,
+            "total_processed": len(results),
+            "model": {"version": model['version'], "name": model['name'], "arm": arm}
+        }), 200
 
     except Exception as e:
         import traceback
@@ -438,6 +956,91 @@ def export_results():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Model admin: load a package in the background (as the active version or an
+# A/B candidate), set the candidate's traffic share, promote or drop it.
+# Disabled unless ADMIN_TOKEN is set; callers send it as X-Admin-Token.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+def admin_denied():
+    """Error response for a request without the admin token, else None"""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled (set ADMIN_TOKEN)"}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({"error": "Invalid admin token"}), 401
+    return None
+
+@app.route('/admin/models', methods=['GET'])
+def admin_models():
+    """Loaded versions, traffic split and the last load"""
+    return admin_denied() or (jsonify(model_registry.stats()), 200)
+
+@app.route('/admin/models/load', methods=['POST'])
+def admin_load_model():
+    """
+    Load {"file": <package in MODEL_DIR>, "arm": "active"|"candidate", "percent": 10}
+    in the background; poll /admin/models for the outcome
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    file_name = str(data.get('file', ''))
+    arm = data.get('arm', 'candidate')
+    percent = data.get('percent')
+    if not file_name or os.path.basename(file_name) != file_name:
+        return jsonify({"error": f"file must name a model package in {MODEL_DIR}"}), 400
+    path = os.path.join(MODEL_DIR, file_name)
+    if not os.path.isfile(path):
+        return jsonify({"error": f"No model package {file_name} in {MODEL_DIR}"}), 404
+    if arm not in ARMS:
+        return jsonify({"error": f"arm must be one of {', '.join(ARMS)}"}), 400
+    if percent is not None and (not isinstance(percent, (int, float)) or not 0 <= percent <= 100):
+        return jsonify({"error": "percent must be between 0 and 100"}), 400
+    if not model_registry.load(path, arm=arm, percent=percent):
+        return jsonify({"error": "A model load is already running"}), 409
+    return jsonify(model_registry.stats()), 202
+
+@app.route('/admin/models/split', methods=['POST'])
+def admin_split():
+    """Set the candidate's share of routed traffic: {"percent": 0-100}"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    percent = (request.get_json(silent=True) or {}).get('percent')
+    if not isinstance(percent, (int, float)) or not 0 <= percent <= 100:
+        return jsonify({"error": "percent must be between 0 and 100"}), 400
+    model_registry.set_percent(percent)
+    return jsonify(model_registry.stats()), 200
+
+@app.route('/admin/models/promote', methods=['POST'])
+def admin_promote():
+    """Swap the candidate in as the active version"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    if not model_registry.promote():
+        return jsonify({"error": "No candidate model loaded"}), 409
+    return jsonify(model_registry.stats()), 200
+
+@app.route('/admin/models/candidate', methods=['DELETE'])
+def admin_drop_candidate():
+    """Stop serving the candidate"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    model_registry.drop_candidate()
+    return jsonify(model_registry.stats()), 200
+
+# Background work starts last: the batch pool must fork before any other
+# thread exists, and after every function it runs is defined
+if BATCH_WORKERS > 1 and model_registry.active:
+    start_batch_pool(BATCH_WORKERS)
+
+if os.environ.get('WARMUP_ON_START', '1') == '1':
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+else:
+    readiness['ready'] = model_registry.active is not None
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=True, host='0.0.0.0', port=port)
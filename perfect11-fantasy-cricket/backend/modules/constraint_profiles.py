@@ -0,0 +1,97 @@
+"""
+Named constraint profiles for XI selection
+A profile is one contest format: squad size, budget, role bounds, per-team
+bounds and captaincy multipliers. Profiles are read from a JSON config and
+compiled once at startup into the bound vectors the solver uses, so a
+request only names its profile
+"""
+import json
+import os
+
+DEFAULT_PROFILE_NAME = 'default'
+
+# Keys a profile may set; anything it leaves out comes from the default profile
+PROFILE_KEYS = ('squad_size', 'budget', 'roles', 'max_per_team', 'min_per_team', 'multipliers')
+
+
+def compile_profile(name, spec):
+    """
+    Validate a profile spec and compile it into solver bounds
+
+    Args:
+        name: Profile name
+        spec: dict with squad_size, budget, roles ({role: [min, max]}),
+            max_per_team, min_per_team and multipliers (best player first)
+
+    Returns:
+        dict: the spec plus roles (ordered), role_index, role_lo, role_hi
+        and a signature for cache keys
+    """
+    unknown = set(spec) - set(PROFILE_KEYS)
+    if unknown:
+        raise ValueError(f"Profile '{name}': unknown keys {sorted(unknown)}")
+
+    squad_size = int(spec['squad_size'])
+    budget = float(spec['budget'])
+    roles = list(spec['roles'])
+    role_lo = [int(spec['roles'][role][0]) for role in roles]
+    role_hi = [int(spec['roles'][role][1]) for role in roles]
+    max_per_team = int(spec['max_per_team'])
+    min_per_team = int(spec['min_per_team'])
+    multipliers = tuple(float(m) for m in spec['multipliers'])
+
+    if squad_size < 1 or budget < 0:
+        raise ValueError(f"Profile '{name}': squad_size must be positive and budget non-negative")
+    if not roles or any(not 0 <= lo <= hi for lo, hi in zip(role_lo, role_hi)):
+        raise ValueError(f"Profile '{name}': every role needs 0 <= min <= max")
+    if sum(role_lo) > squad_size:
+        raise ValueError(f"Profile '{name}': role minimums exceed the squad size")
+    if not 0 <= min_per_team <= max_per_team:
+        raise ValueError(f"Profile '{name}': need 0 <= min_per_team <= max_per_team")
+    if len(multipliers) > squad_size or any(m < 1 for m in multipliers) or list(multipliers) != sorted(multipliers, reverse=True):
+        raise ValueError(f"Profile '{name}': multipliers must be non-increasing, >= 1 and at most squad_size")
+
+    return {
+        'name': name,
+        'squad_size': squad_size,
+        'budget': budget,
+        'roles': roles,
+        'role_index': {role: j for j, role in enumerate(roles)},
+        'role_lo': role_lo,
+        'role_hi': role_hi,
+        'max_per_team': max_per_team,
+        'min_per_team': min_per_team,
+        'multipliers': multipliers,
+        'signature': [squad_size, budget, sorted(zip(roles, role_lo, role_hi)), max_per_team, min_per_team]
+    }
+
+
+def load_profiles(path, default):
+    """
+    Compile every profile in a JSON config
+
+    The config maps profile names to specs; each spec only lists what
+    differs from the default profile. A missing file leaves just the
+    default.
+
+    Args:
+        path: JSON config path
+        default: Compiled default profile
+
+    Returns:
+        dict: {name: compiled profile}, always including the default
+    """
+    profiles = {DEFAULT_PROFILE_NAME: default}
+    if not os.path.exists(path):
+        print(f"[WARNING] No constraint profiles at {path} - using the default profile only")
+        return profiles
+
+    with open(path) as f:
+        specs = json.load(f)
+
+    base = {key: default[key] for key in PROFILE_KEYS if key != 'roles'}
+    base['roles'] = {role: [lo, hi] for role, lo, hi in zip(default['roles'], default['role_lo'], default['role_hi'])}
+    for name, spec in specs.items():
+        profiles[name] = compile_profile(name, dict(base, **spec))
+
+    return profiles
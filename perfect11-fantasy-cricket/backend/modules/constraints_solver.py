@@ -1,71 +1,362 @@
 """
-Constraints solver to select optimal XI using Linear Programming
+Constraints solver to select optimal XI
+An exact in-process branch-and-bound by default; the PuLP/CBC model is kept
+as a reference backend (SOLVER_BACKEND=pulp or backend='pulp')
 """
-from pulp import *
-import pandas as pd
+import os
+import time
+import numpy as np
+from modules.solver_cache import problem_key
+from modules.constraint_profiles import compile_profile, DEFAULT_PROFILE_NAME
 
-def select_optimal_xi(player_data, team1, team2, score_key='predicted_fp'):
+SQUAD_SIZE = 11
+BUDGET = 100
+ROLE_CONSTRAINTS = {'WK': (1, 4), 'BAT': (3, 6), 'AR': (1, 4), 'BOWL': (3, 6)}
+MAX_PER_TEAM = 7
+MIN_PER_TEAM = 1
+
+# Dream11 scoring: the captain's points count double, the vice-captain's 1.5x
+CAPTAIN_MULTIPLIER = 2.0
+VICE_CAPTAIN_MULTIPLIER = 1.5
+CAPTAINCY_MULTIPLIERS = (CAPTAIN_MULTIPLIER, VICE_CAPTAIN_MULTIPLIER)
+
+# Tolerance for credit sums and objective comparisons
+EPS = 1e-9
+
+# Search nodes between deadline checks
+DEADLINE_CHECK_NODES = 256
+
+# The constraints above as a compiled profile (see constraint_profiles.py)
+DEFAULT_PROFILE = compile_profile(DEFAULT_PROFILE_NAME, {
+    'squad_size': SQUAD_SIZE,
+    'budget': BUDGET,
+    'roles': ROLE_CONSTRAINTS,
+    'max_per_team': MAX_PER_TEAM,
+    'min_per_team': MIN_PER_TEAM,
+    'multipliers': CAPTAINCY_MULTIPLIERS
+})
+
+
+def select_optimal_xi(player_data, team1, team2, score_key='predicted_fp', backend=None, captaincy=True,
+                      solver_cache=None, profile=None, prune=True, time_limit=None):
     """
-    Select optimal XI using linear programming
+    Select optimal XI
 
-    Constraints:
+    Constraints (default profile):
     - Total credits <= 100
     - WK: 1-4, BAT: 3-6, AR: 1-4, BOWL: 3-6
     - Max 7 from one team
     - Both teams represented
 
+    Other contest formats pass a compiled profile instead.
+
+    With captaincy the objective is the Dream11 team score: the XI, captain
+    (2x) and vice-captain (1.5x) are chosen together in one solve.
+
+    With a solver_cache, an identical problem seen before is answered from
+    the cache without solving.
+
+    With prune, players that cannot be needed by any optimal XI are dropped
+    before solving (see dominance_prune); result['pruned_players'] counts
+    them (None when served from the cache).
+
+    With a time_limit (seconds) the solve stops when it runs out and
+    returns the best lineup found so far with status 'Feasible';
+    objective_bound and optimality_gap in the result say how far from
+    optimal it can be. The native search always completes a first lineup
+    before it stops; only CBC can end 'Not Solved' (no lineup).
+
     Returns:
-        dict with selected_players, total_credits, total_predicted_fp, etc.
+        dict with selected_players, total_credits, total_predicted_fp,
+        captain, vice_captain, total_fp_with_captaincy, etc.
     """
+    profile = profile or DEFAULT_PROFILE
+    multipliers = profile['multipliers'] if captaincy else ()
+    key = None
+    if solver_cache is not None:
+        key = problem_key(player_data, team1, team2, score_key, ['xi', constraint_signature(multipliers, profile)])
+        cached = solver_cache.get(key)
+        if cached is not None:
+            (ids,), status = cached
+            return build_result(_players_by_id(player_data, ids), team1, team2, score_key, status, multipliers, profile,
+                                pruned=None)
 
-    # Create LP problem
-    prob = LpProblem("Dream11_Team_Selection", LpMaximize)
+    backend = backend or os.environ.get('SOLVER_BACKEND', 'native')
+    if backend not in ('native', 'pulp'):
+        raise ValueError(f"Unknown solver backend: {backend}")
 
-    # Decision variables
-    player_vars = {}
-    for i, player in enumerate(player_data):
-        player_vars[player['player_id']] = LpVariable(f"player_{i}", cat='Binary')
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    problem = compile_problem(player_data, team1, team2, score_key, multipliers, profile)
+    kept = dominance_prune(problem) if prune else np.arange(len(player_data))
+    bound = None
+    if backend == 'pulp':
+        selected, status = _solve_pulp([player_data[i] for i in kept], team1, team2, score_key,
+                                       multipliers=multipliers, profile=profile, time_limit=time_limit)
+        if status in ('Feasible', 'Not Solved'):
+            # CBC's own bound is not exposed through PuLP; the root bound is weaker but proven
+            bound = XISearch(restrict_problem(problem, kept)).root_bound()
+    else:
+        search = XISearch(restrict_problem(problem, kept))
+        selected, status = search.solve(deadline=deadline)
+        if search.timed_out:
+            bound = search.bound
+    selected = [int(kept[i]) for i in selected]
 
-    # Objective: Maximize predicted FP
-    prob += lpSum([player_vars[p['player_id']] * p[score_key] for p in player_data])
+    # A lineup cut short by the deadline is not the answer to the problem
+    if solver_cache is not None and status in ('Optimal', 'Infeasible'):
+        solver_cache.put(key, [[player_data[i]['player_id'] for i in selected]], status)
+    return build_result([player_data[i] for i in selected], team1, team2, score_key, status, multipliers, profile,
+                        pruned=len(player_data) - len(kept), bound=bound)
 
-    # Constraint 1: Exactly 11 players
-    prob += lpSum([player_vars[p['player_id']] for p in player_data]) == 11
 
-    # Constraint 2: Budget <= 100
-    prob += lpSum([player_vars[p['player_id']] * p['credits'] for p in player_data]) <= 100
+def select_top_k_xis(player_data, team1, team2, k=1, min_diff=1, score_key='predicted_fp', backend=None, captaincy=True,
+                     solver_cache=None, profile=None, time_limit=None):
+    """
+    K best lineups, each differing from every better one in at least min_diff players
 
-    # Constraint 3: Role constraints
-    role_constraints = {'WK': (1, 4), 'BAT': (3, 6), 'AR': (1, 4), 'BOWL': (3, 6)}
-    for role, (min_count, max_count) in role_constraints.items():
-        role_players = [p for p in player_data if p['role'] == role]
-        if len(role_players) > 0:
-            prob += lpSum([player_vars[p['player_id']] for p in role_players]) >= min_count
-            prob += lpSum([player_vars[p['player_id']] for p in role_players]) <= max_count
+    The problem is compiled once; each further lineup is one more solve with
+    a cut per earlier lineup (share at most 11 - min_diff players with it).
+    Dominance pruning is not applied: a dominated player can belong to the
+    second or later lineup. time_limit (seconds) covers all k solves; the
+    lineups completed in time are returned, the last one possibly
+    'Feasible' (see select_optimal_xi).
 
-    # Constraint 4: Max 7 from one team
-    team1_players = [p for p in player_data if p['team'] == team1]
-    team2_players = [p for p in player_data if p['team'] == team2]
+    Returns:
+        list: result dicts as from select_optimal_xi, best first; shorter
+        than k when no further lineup satisfies the constraints
+    """
+    profile = profile or DEFAULT_PROFILE
+    squad_size = profile['squad_size']
+    if k < 1:
+        raise ValueError("k must be at least 1")
+    if not 1 <= min_diff <= squad_size:
+        raise ValueError(f"min_diff must be between 1 and {squad_size}")
 
-    if len(team1_players) > 0:
-        prob += lpSum([player_vars[p['player_id']] for p in team1_players]) <= 7
-    if len(team2_players) > 0:
-        prob += lpSum([player_vars[p['player_id']] for p in team2_players]) <= 7
+    multipliers = profile['multipliers'] if captaincy else ()
+    key = None
+    if solver_cache is not None:
+        key = problem_key(player_data, team1, team2, score_key, ['top_k', k, min_diff, constraint_signature(multipliers, profile)])
+        cached = solver_cache.get(key)
+        if cached is not None:
+            return [
+                build_result(_players_by_id(player_data, ids), team1, team2, score_key, 'Optimal', multipliers, profile)
+                for ids in cached[0]
+            ]
 
-    # Constraint 5: Both teams represented (at least 1 from each)
-    if len(team1_players) > 0:
-        prob += lpSum([player_vars[p['player_id']] for p in team1_players]) >= 1
-    if len(team2_players) > 0:
-        prob += lpSum([player_vars[p['player_id']] for p in team2_players]) >= 1
+    backend = backend or os.environ.get('SOLVER_BACKEND', 'native')
+    if backend == 'native':
+        search = XISearch(compile_problem(player_data, team1, team2, score_key, multipliers, profile))
+    elif backend != 'pulp':
+        raise ValueError(f"Unknown solver backend: {backend}")
 
-    # Solve
-    prob.solve(PULP_CBC_CMD(msg=0))
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    max_overlap = squad_size - min_diff
+    lineups = []
+    cuts = []
+    status = 'Optimal'
+    while len(lineups) < k:
+        bound = None
+        if backend == 'native':
+            selected, status = search.solve(cuts, max_overlap, deadline)
+            if search.timed_out:
+                bound = search.bound
+        else:
+            remaining = None if deadline is None else max(deadline - time.perf_counter(), 0.0)
+            selected, status = _solve_pulp(player_data, team1, team2, score_key, cuts, max_overlap, multipliers, profile,
+                                           remaining)
+        if status not in ('Optimal', 'Feasible'):
+            break
+        cuts.append(selected)
+        lineups.append(build_result([player_data[i] for i in selected], team1, team2, score_key, status, multipliers, profile,
+                                    bound=bound))
+        if status != 'Optimal':
+            break
 
-    # Extract solution
-    selected_players = []
-    for player in player_data:
-        if player_vars[player['player_id']].varValue == 1:
-            selected_players.append(player)
+    # Only a search that ran to completion is cached
+    if solver_cache is not None and status in ('Optimal', 'Infeasible'):
+        solver_cache.put(key, [[player_data[i]['player_id'] for i in cut] for cut in cuts], 'Optimal')
+    return lineups
+
+
+def selection_sensitivity(player_data, team1, team2, score_key='predicted_fp', captaincy=True, profile=None,
+                          time_limit=None, lineup=None):
+    """
+    Predicted-FP change that would flip each player's selection
+
+    Within a lineup the captaincy goes to whoever earns the most, so the best
+    objective over XIs containing player p, with p's score moved by d, is
+    max over multipliers m of (A_m + m * d), where A_m is the best objective
+    with p fixed in at multiplier m. Selected players leave once that drops
+    below the best XI without them; the others enter once it beats the
+    optimum. Each A_m is one warm-started search over the shared bound
+    tables (seeded with the best single swap, and cut off at the threshold
+    found so far), so the whole report costs a few full solves.
+
+    lineup (player ids) is the XI the report should describe, e.g. the one
+    returned to the user; ties can make it differ from the XI this search
+    would find. Thresholds only mean something against an optimal XI, so
+    the report is empty when lineup is not one.
+
+    With a time_limit (seconds), players whose searches did not finish in
+    time are left out of the report.
+
+    Returns:
+        dict: {player_id: {'selected', 'fp_change', 'fp_threshold'}} where
+        fp_change is the signed score change that flips the player (None if
+        no score change can) and fp_threshold the score it happens at
+    """
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    profile = profile or DEFAULT_PROFILE
+    multipliers = profile['multipliers'] if captaincy else ()
+    problem = compile_problem(player_data, team1, team2, score_key, multipliers, profile)
+    search = XISearch(problem)
+    scores = problem['scores'].tolist()
+    if lineup is None:
+        best_value, selected = search.search(deadline=deadline)
+        if selected is None or search.timed_out:
+            return {}
+    else:
+        ids = set(lineup)
+        selected = [i for i, p in enumerate(player_data) if p['player_id'] in ids]
+        best_value = team_total([{'s': scores[i]} for i in selected], 's', multipliers)[2]
+        # The given XI must be optimal: nothing may beat it by more than rounding
+        _, better = search.search(lower_bound=best_value + 1e-6, deadline=deadline)
+        if better is not None or search.timed_out:
+            return {}
+
+    credits = problem['credits'].tolist()
+    role_idx = problem['role_idx'].tolist()
+    team_idx = problem['team_idx'].tolist()
+    options = sorted(set([1.0] + list(multipliers)))
+    in_xi = set(selected)
+    outside = [i for i in range(len(player_data)) if i not in in_xi]
+
+    # Role / team counts and credits of the optimal XI, for O(1) swap checks
+    role_counts = [0] * len(problem['role_lo'])
+    team_counts = [0] * len(problem['team_lo'])
+    for i in selected:
+        if role_idx[i] >= 0:
+            role_counts[role_idx[i]] += 1
+        if team_idx[i] >= 0:
+            team_counts[team_idx[i]] += 1
+    total_credits = sum(credits[i] for i in selected)
+
+    def swap_feasible(out_player, in_player):
+        if total_credits - credits[out_player] + credits[in_player] > problem['budget'] + EPS:
+            return False
+        for idx, counts, lo, hi in ((role_idx, role_counts, problem['role_lo'], problem['role_hi']),
+                                    (team_idx, team_counts, problem['team_lo'], problem['team_hi'])):
+            a, b = idx[out_player], idx[in_player]
+            if a == b:
+                continue
+            if a >= 0 and counts[a] - 1 < lo[a]:
+                return False
+            if b >= 0 and counts[b] + 1 > hi[b]:
+                return False
+        return True
+
+    def value(lineup, fixed=None, multiplier=1.0):
+        # Objective of a lineup with the captaincy on its best earners
+        rest = sorted((scores[i] for i in lineup if i != fixed), reverse=True)
+        remaining = list(multipliers)
+        total = 0.0
+        if fixed is not None:
+            total += multiplier * scores[fixed]
+            if multiplier != 1.0:
+                remaining.remove(multiplier)
+        total += sum(rest)
+        for m, score in zip(remaining, rest):
+            total += (m - 1) * score
+        return total
+
+    report = {}
+    for p in range(len(player_data)):
+        if p in in_xi:
+            # Best XI without p, seeded with the best single swap
+            lineup = [i for i in selected if i != p]
+            floor = max((value(lineup + [q]) for q in outside if swap_feasible(p, q)), default=-np.inf)
+            without_p, _ = search.search(excluded=[p], lower_bound=floor, deadline=deadline)
+            if search.timed_out:
+                break
+            if without_p == -np.inf:
+                change = None
+            else:
+                current = next(m for m in options if abs(value(selected, p, m) - best_value) <= 1e-6)
+                drop = (best_value - without_p) / current
+                for m in options:
+                    if m == current:
+                        continue
+                    floor = max(value(selected, p, m), without_p + m * drop)
+                    with_p, _ = search.search(fixed={p: m}, lower_bound=floor, deadline=deadline)
+                    if search.timed_out:
+                        break
+                    drop = max(drop, (with_p - without_p) / m)
+                change = -drop
+        else:
+            swaps = [[i for i in selected if i != q] + [p] for q in selected if swap_feasible(q, p)]
+            rise = np.inf
+            for m in options:
+                floor = max((value(lineup, p, m) for lineup in swaps), default=-np.inf)
+                if rise < np.inf:
+                    floor = max(floor, best_value - m * rise)
+                with_p, _ = search.search(fixed={p: m}, lower_bound=floor, deadline=deadline)
+                if search.timed_out:
+                    break
+                if with_p > -np.inf:
+                    rise = min(rise, max(0.0, (best_value - with_p) / m))
+            change = None if rise == np.inf else rise
+        if search.timed_out:
+            break
+
+        report[player_data[p]['player_id']] = {
+            'selected': p in in_xi,
+            'fp_change': None if change is None else float(change),
+            'fp_threshold': None if change is None else float(scores[p] + change)
+        }
+
+    return report
+
+
+def constraint_signature(multipliers=CAPTAINCY_MULTIPLIERS, profile=None):
+    """Everything besides the candidates that determines a selection (part of cache keys)"""
+    return (profile or DEFAULT_PROFILE)['signature'] + [list(multipliers)]
+
+
+def _players_by_id(player_data, ids):
+    """The caller's player dicts for cached player ids"""
+    by_id = {p['player_id']: p for p in player_data}
+    return [by_id[pid] for pid in ids]
+
+
+def team_total(players, score_key='predicted_fp', multipliers=CAPTAINCY_MULTIPLIERS):
+    """
+    Team score with the multipliers applied to the highest scorers
+
+    The best captaincy for a fixed XI puts the captain on its top scorer and
+    the vice-captain on the next one.
+
+    Returns:
+        tuple: (captain, vice_captain, total) with None for unfilled roles
+    """
+    ranked = sorted(players, key=lambda x: x[score_key], reverse=True)
+    total = sum(p[score_key] for p in ranked)
+    for multiplier, p in zip(multipliers, ranked):
+        total += (multiplier - 1) * p[score_key]
+    captain = ranked[0] if multipliers and ranked else None
+    vice_captain = ranked[1] if len(multipliers) > 1 and len(ranked) > 1 else None
+    return captain, vice_captain, total
+
+
+def build_result(selected_players, team1, team2, score_key, status, multipliers=CAPTAINCY_MULTIPLIERS, profile=None,
+                 pruned=0, bound=None):
+    """
+    Result dict shared by every backend
+
+    bound is a proven upper bound on the objective when the solve was cut
+    short; an optimal lineup is its own bound.
+    """
+    profile = profile or DEFAULT_PROFILE
+    selected_players = list(selected_players)
 
     # Sort by predicted FP
     selected_players.sort(key=lambda x: x[score_key], reverse=True)
@@ -73,26 +364,616 @@ def select_optimal_xi(player_data, team1, team2, score_key='predicted_fp'):
     # Calculate totals
     total_credits = sum(p['credits'] for p in selected_players)
     total_predicted_fp = sum(p[score_key] for p in selected_players)
+    captain, vice_captain, total_with_captaincy = team_total(selected_players, score_key, multipliers)
 
     # Role counts
     role_counts = {}
-    for role in ['WK', 'BAT', 'AR', 'BOWL']:
+    for role in profile['roles']:
         role_counts[role] = sum(1 for p in selected_players if p['role'] == role)
 
+    # Proven bound and relative gap of the objective (total with captaincy)
+    if bound is None and status == 'Optimal':
+        bound = total_with_captaincy
+    gap = None
+    if bound is not None and bound > -np.inf and selected_players:
+        bound = max(bound, total_with_captaincy)
+        gap = (bound - total_with_captaincy) / max(abs(bound), EPS)
+
     # Team counts
     team_counts = {
         team1: sum(1 for p in selected_players if p['team'] == team1),
         team2: sum(1 for p in selected_players if p['team'] == team2)
     }
 
-    feasible = LpStatus[prob.status] == 'Optimal'
-
     return {
         'selected_players': selected_players,
         'total_credits': total_credits,
         'total_predicted_fp': total_predicted_fp,
         'role_counts': role_counts,
         'team_counts': team_counts,
-        'feasible': feasible,
-        'status': LpStatus[prob.status]
+        'captain': captain,
+        'vice_captain': vice_captain,
+        'total_fp_with_captaincy': total_with_captaincy,
+        'multipliers': tuple(multipliers),
+        'profile': profile['name'],
+        'budget': profile['budget'],
+        'pruned_players': pruned,
+        'objective_bound': None if bound is None or bound == -np.inf else float(bound),
+        'optimality_gap': gap,
+        'feasible': status in ('Optimal', 'Feasible'),
+        'status': status
     }
+
+
+def compile_problem(player_data, team1, team2, score_key='predicted_fp', multipliers=(), profile=None):
+    """
+    Arrays describing one selection problem
+
+    The bounds come from the compiled profile (default: the constants
+    above). Role and team bounds are relaxed to (0, squad size) for roles
+    and teams with no players, matching the PuLP model which skips those
+    constraints.
+    multipliers weight the best, second best, ... player of the XI and must
+    be non-increasing and >= 1 (e.g. CAPTAINCY_MULTIPLIERS).
+
+    Returns:
+        dict: scores, credits, role_idx, team_idx (-1 = unconstrained) and
+        the lower/upper bounds per role and team
+    """
+    profile = profile or DEFAULT_PROFILE
+    squad_size = profile['squad_size']
+    role_index = profile['role_index']
+    teams = [team1] if team1 == team2 else [team1, team2]
+
+    role_idx = np.array([role_index.get(p['role'], -1) for p in player_data], dtype=np.int64)
+    team_idx = np.array([teams.index(p['team']) if p['team'] in teams else -1 for p in player_data], dtype=np.int64)
+
+    role_present = np.bincount(role_idx[role_idx >= 0], minlength=len(role_index)) > 0
+    role_lo = [lo if present else 0 for lo, present in zip(profile['role_lo'], role_present)]
+    role_hi = [hi if present else squad_size for hi, present in zip(profile['role_hi'], role_present)]
+
+    team_lo, team_hi = [], []
+    for j in range(len(teams)):
+        present = bool((team_idx == j).any())
+        team_lo.append(profile['min_per_team'] if present else 0)
+        team_hi.append(profile['max_per_team'] if present else squad_size)
+
+    return {
+        'scores': np.array([float(p[score_key]) for p in player_data]),
+        'credits': np.array([float(p['credits']) for p in player_data]),
+        'role_idx': role_idx,
+        'team_idx': team_idx,
+        'role_lo': role_lo,
+        'role_hi': role_hi,
+        'team_lo': team_lo,
+        'team_hi': team_hi,
+        'squad_size': squad_size,
+        'budget': profile['budget'],
+        'multipliers': tuple(float(m) for m in multipliers)
+    }
+
+
+def dominance_prune(problem):
+    """
+    Players that some optimal XI may need, dropping provably dominated ones
+
+    q dominates p when both have the same role and team, q costs no more
+    and scores no less (ties broken by credits, score, then index, so
+    dominance is a strict order). A player with at least as many
+    dominators as the XI can hold from that role and team is dropped: in
+    any XI containing it one dominator is left out, and swapping it in
+    keeps every constraint and does not lower the score, captaincy
+    included. Repeating such swaps ends at an optimal XI free of every
+    dropped player, so the optimum is unchanged.
+
+    Returns:
+        np.ndarray: indices of the kept players, ascending
+    """
+    scores, credits = problem['scores'], problem['credits']
+    role_idx, team_idx = problem['role_idx'], problem['team_idx']
+    squad_size = problem['squad_size']
+    keep = np.ones(len(scores), dtype=bool)
+
+    # Most players an XI can take from one role (team): its upper bound, and
+    # no more than the slots left by the other roles' (teams') minimums
+    role_lo, team_lo = sum(problem['role_lo']), sum(problem['team_lo'])
+    role_cap = [min(hi, squad_size - role_lo + lo) for lo, hi in zip(problem['role_lo'], problem['role_hi'])]
+    team_cap = [min(hi, squad_size - team_lo + lo) for lo, hi in zip(problem['team_lo'], problem['team_hi'])]
+
+    groups = np.unique(np.stack([role_idx, team_idx], axis=1), axis=0) if len(scores) else []
+    for role, team in groups:
+        cap = min(role_cap[role] if role >= 0 else squad_size - role_lo,
+                  team_cap[team] if team >= 0 else squad_size - team_lo)
+        members = np.flatnonzero((role_idx == role) & (team_idx == team))
+        if len(members) <= cap:
+            continue
+        # Cheapest (then highest scoring) first: an earlier member dominates a later one iff it scores no less
+        members = members[np.lexsort((members, -scores[members], credits[members]))]
+        s = scores[members]
+        dominators = np.triu(s[:, None] >= s[None, :], k=1).sum(axis=0)
+        keep[members[dominators >= cap]] = False
+
+    return np.flatnonzero(keep)
+
+
+def restrict_problem(problem, kept):
+    """The compiled problem over the kept players only (bounds unchanged)"""
+    problem = dict(problem)
+    for key in ('scores', 'credits', 'role_idx', 'team_idx'):
+        problem[key] = problem[key][kept]
+    return problem
+
+
+def _budget_multiplier(scores, credits, squad_size, budget):
+    """
+    Lagrange multiplier of the budget constraint that minimises the root bound
+
+    For any lam >= 0, lam * budget + (sum of the best squad_size values of
+    scores - lam * credits) bounds every XI, so a scan over lam picks the
+    tightest one.
+    """
+    if credits.max() <= 0:
+        return 0.0
+    top = max(scores.max(), 1.0) / max(credits[credits > 0].min(), EPS)
+    grid = np.linspace(0.0, top, 200)
+    adjusted = scores[None, :] - grid[:, None] * credits[None, :]
+    k = min(squad_size, len(scores))
+    best = -np.sort(-adjusted, axis=1)[:, :k].sum(axis=1)
+    return float(grid[np.argmin(grid * budget + best)])
+
+
+def _suffix_top_sums(values, squad_size):
+    """table[i][r] = sum of the r largest values[i:] (-inf when fewer than r remain)"""
+    n = len(values)
+    table = np.full((n + 1, squad_size + 1), -np.inf)
+    table[:, 0] = 0.0
+    # Row i holds values[i:] with the earlier entries masked out, sorted in one call
+    suffixes = np.where(np.arange(n)[None, :] >= np.arange(n + 1)[:, None], values[None, :], -np.inf)
+    top = -np.sort(-suffixes, axis=1)[:, :squad_size]
+    table[:, 1:top.shape[1] + 1] = np.cumsum(top, axis=1)
+    return table
+
+
+class XISearch:
+    """
+    Exact depth-first branch-and-bound over a compiled problem
+
+    Players are visited in descending score order, trying "pick" before
+    "skip", so the first complete XI is already the greedy one. A node is
+    pruned when the remaining players cannot satisfy the role/team minimums
+    or the budget, or when an upper bound cannot beat the incumbent: the best
+    remaining scores, the same with the slots owed to role minimums filled
+    from those roles, and the Lagrangian bound with the budget relaxed.
+
+    Because picks are made in descending score order, the k-th pick is the
+    k-th best player of the XI and takes the k-th multiplier, so the XI and
+    its captaincy are optimised together. Each bound adds the largest bonus
+    the remaining multipliers could earn from the remaining players.
+
+    The ordering and bound tables are built once, so repeated solves of the
+    same problem (e.g. with extra lineup cuts) only pay for the search.
+
+    With a deadline the search stops expanding nodes once it passes and
+    there is a lineup to return (a first XI found, or a lower_bound given),
+    so a short deadline can only cost optimality, never the answer. Every
+    node still open is then bounded instead, so after each search
+    self.timed_out tells whether it was cut short and self.bound holds a
+    proven upper bound on the objective (the objective itself otherwise).
+    """
+
+    def __init__(self, problem):
+        scores = problem['scores']
+        credits = problem['credits']
+        self.squad_size = squad_size = problem['squad_size']
+        self.budget = budget = problem['budget']
+        self.n = n = len(scores)
+
+        self.order = order = np.argsort(-scores, kind='mergesort')
+        s = scores[order]
+        c = credits[order]
+        ro = problem['role_idx'][order]
+        te = problem['team_idx'][order]
+        self.role_lo, self.role_hi = list(problem['role_lo']), list(problem['role_hi'])
+        self.team_lo, self.team_hi = list(problem['team_lo']), list(problem['team_hi'])
+        n_roles, n_teams = len(self.role_lo), len(self.team_lo)
+
+        # Players left per role / team from position i onwards
+        suffix_roles = np.zeros((n + 1, n_roles), dtype=np.int64)
+        suffix_teams = np.zeros((n + 1, n_teams), dtype=np.int64)
+        for i in range(n - 1, -1, -1):
+            suffix_roles[i] = suffix_roles[i + 1]
+            suffix_teams[i] = suffix_teams[i + 1]
+            if ro[i] >= 0:
+                suffix_roles[i, ro[i]] += 1
+            if te[i] >= 0:
+                suffix_teams[i, te[i]] += 1
+
+        self.lam = lam = _budget_multiplier(s, c, squad_size, budget) if n else 0.0
+        self.cheapest = (-_suffix_top_sums(-c, squad_size)).tolist()
+        # One column more than needed so a single blocked player can be stepped over
+        self.relaxed = _suffix_top_sums(s - lam * c, squad_size + 1).tolist()
+        self.prefix = np.concatenate([[0.0], np.cumsum(s)]).tolist()
+        self.role_best = [
+            _suffix_top_sums(np.where(ro == j, s, -np.inf), self.role_lo[j] + 1).tolist()
+            for j in range(n_roles)
+        ]
+
+        # Captaincy multipliers, in the order the best picks take them
+        self.multipliers = list(problem.get('multipliers', ()))
+        self._bonus_tables = {}
+
+        # Plain lists are much faster than numpy scalars inside the search
+        self.s, self.c, self.ro, self.te = s.tolist(), c.tolist(), ro.tolist(), te.tolist()
+        self.suffix_roles, self.suffix_teams = suffix_roles.tolist(), suffix_teams.tolist()
+        self.position = {int(p): i for i, p in enumerate(order)}
+        self.timed_out = False
+        self.bound = -np.inf
+
+    def _bonus(self, multipliers):
+        """bonus[k][i]: most the multipliers from pick k on can add when picking from position i"""
+        key = tuple(multipliers)
+        table = self._bonus_tables.get(key)
+        if table is None:
+            s, n = self.s, self.n
+            table = [
+                [
+                    sum((multipliers[j] - 1) * s[i + j - k] for j in range(k, len(multipliers)) if i + j - k < n)
+                    for i in range(n + 1)
+                ]
+                for k in range(len(multipliers))
+            ]
+            self._bonus_tables[key] = table
+        return table
+
+    def solve(self, cuts=(), max_overlap=None, deadline=None):
+        """
+        Best XI, optionally sharing at most max_overlap players with each cut
+
+        Args:
+            cuts: previously selected lineups (indices into the problem arrays)
+            max_overlap: players a new lineup may share with any one cut
+            deadline: time.perf_counter() value to stop searching at
+
+        Returns:
+            tuple: (selected indices into the problem arrays, status) with
+            status 'Optimal' or 'Infeasible', or 'Feasible' (best lineup so
+            far) when the deadline cut the search short
+        """
+        _, chosen = self.search(cuts=cuts, max_overlap=max_overlap, deadline=deadline)
+        if chosen is None:
+            return [], 'Not Solved' if self.timed_out else 'Infeasible'
+        return chosen, 'Feasible' if self.timed_out else 'Optimal'
+
+    def root_bound(self):
+        """Upper bound on the objective from a search stopped at its first lineup (-inf if infeasible)"""
+        self.search(deadline=0.0)
+        return self.bound
+
+    def search(self, cuts=(), max_overlap=None, fixed=None, excluded=(), lower_bound=-np.inf, deadline=None):
+        """
+        Branch-and-bound with optional fixed and excluded players
+
+        Args:
+            cuts, max_overlap: as for solve
+            fixed: {index: multiplier} players forced into the XI with the
+                given multiplier (1.0 = no captaincy); the others share the
+                remaining multipliers
+            excluded: indices that may not be picked
+            lower_bound: objective of a known lineup; only strictly better
+                lineups are returned
+            deadline: time.perf_counter() value to stop searching at, once
+                there is a lineup or a finite lower_bound (sets
+                self.timed_out and self.bound)
+
+        Returns:
+            tuple: (objective, selected indices) - (lower_bound, None) when
+            nothing beats lower_bound
+        """
+        n, squad_size, budget, lam = self.n, self.squad_size, self.budget, self.lam
+        s, c, ro, te = self.s, self.c, self.ro, self.te
+        role_lo, role_hi, team_lo, team_hi = self.role_lo, self.role_hi, self.team_lo, self.team_hi
+        n_roles, n_teams = len(role_lo), len(team_lo)
+        suffix_roles, suffix_teams = self.suffix_roles, self.suffix_teams
+        cheapest, relaxed, prefix, role_best = self.cheapest, self.relaxed, self.prefix, self.role_best
+        fixed = fixed or {}
+        self.timed_out = False
+        self.bound = lower_bound
+        if n < squad_size:
+            return lower_bound, None
+
+        role_counts = [0] * n_roles
+        team_counts = [0] * n_teams
+        blocked = [False] * n
+        start_cost = 0.0
+        start_value = 0.0
+        multipliers = list(self.multipliers)
+        for idx, multiplier in fixed.items():
+            i = self.position[idx]
+            blocked[i] = True
+            if ro[i] >= 0:
+                role_counts[ro[i]] += 1
+            if te[i] >= 0:
+                team_counts[te[i]] += 1
+            start_cost += c[i]
+            start_value += multiplier * s[i]
+            if multiplier != 1.0:
+                multipliers.remove(multiplier)
+        for idx in excluded:
+            blocked[self.position[idx]] = True
+        skipped = sorted(i for i in range(n) if blocked[i])
+        skipped_scores = [s[i] for i in skipped]
+        # next_free[i]: first position >= i that may still be picked
+        next_free = [n] * (n + 2)
+        for i in range(n - 1, -1, -1):
+            next_free[i] = next_free[i + 1] if blocked[i] else i
+
+        # With exactly one blocked player the sorted-sum tables can skip it exactly
+        single = skipped[0] if len(skipped) == 1 else -1
+        single_relaxed = s[single] - lam * c[single] if single >= 0 else 0.0
+        single_role = ro[single] if single >= 0 else -1
+
+        def top_free(i, t):
+            # Sum of the t best scores from position i, stepping over blocked players
+            end = i + t
+            total = 0.0
+            for b, score in zip(skipped, skipped_scores):
+                if i <= b < end:
+                    end += 1
+                    total -= score
+            if end > n:
+                return -np.inf
+            return total + prefix[end] - prefix[i]
+
+        def without_single(row, t, blocked_value):
+            # row[t] (sum of the t largest) with the single blocked value removed
+            if t and blocked_value >= row[t] - row[t - 1]:
+                return row[t + 1] - blocked_value
+            return row[t]
+        slots = squad_size - len(fixed)
+        if (any(role_counts[j] > role_hi[j] for j in range(n_roles))
+                or any(team_counts[j] > team_hi[j] for j in range(n_teams))
+                or start_cost > budget + EPS):
+            return lower_bound, None
+
+        # weights[k]: multiplier of the k-th pick
+        weights = multipliers + [1.0] * max(slots - len(multipliers), 0)
+        bonus = self._bonus(multipliers)
+        n_bonus = len(bonus)
+
+        # Cuts each player belongs to, and how many of each cut are picked so far
+        player_cuts = [[] for _ in range(n)]
+        for q, cut in enumerate(cuts):
+            for idx in cut:
+                player_cuts[self.position[idx]].append(q)
+        overlap = [0] * len(cuts)
+        for idx in fixed:
+            for q in player_cuts[self.position[idx]]:
+                overlap[q] += 1
+        if max_overlap is None:
+            max_overlap = squad_size
+        if any(count > max_overlap for count in overlap):
+            return lower_bound, None
+
+        chosen = []
+        best = {'value': lower_bound, 'chosen': None}
+        # Nodes left until the next deadline check, and the best bound of the nodes left open
+        clock = {'nodes': 0, 'stopped': False, 'open_bound': -np.inf}
+
+        def branch(i, k, cost, value):
+            r = slots - k
+            if r == 0:
+                for j in range(n_roles):
+                    if role_counts[j] < role_lo[j]:
+                        return
+                for j in range(n_teams):
+                    if team_counts[j] < team_lo[j]:
+                        return
+                if value > best['value']:
+                    best['value'] = value
+                    best['chosen'] = list(chosen)
+                return
+            if n - i < r:
+                return
+
+            # Feasibility of the remaining minimums and budget
+            needed = 0
+            left = suffix_roles[i]
+            for j in range(n_roles):
+                missing = role_lo[j] - role_counts[j]
+                if missing > 0:
+                    if left[j] < missing:
+                        return
+                    needed += missing
+            if needed > r:
+                return
+            left = suffix_teams[i]
+            for j in range(n_teams):
+                missing = team_lo[j] - team_counts[j]
+                if missing > 0 and left[j] < missing:
+                    return
+            if cost + cheapest[i][r] > budget + EPS:
+                return
+
+            # Bounds
+            if k >= n_bonus:
+                value_bound = value
+            elif skipped:
+                value_bound = value
+                q = i
+                for m in multipliers[k:]:
+                    q = next_free[q]
+                    if q >= n:
+                        break
+                    value_bound += (m - 1) * s[q]
+                    q += 1
+            else:
+                value_bound = value + bonus[k][i]
+            skip_single = single >= i
+            if skipped:
+                top = top_free(i, r)
+            else:
+                top = prefix[i + r] - prefix[i]
+            node_bound = value_bound + top
+            if node_bound <= best['value'] + EPS:
+                return
+            if needed:
+                # Slots owed to role minimums go to that role's best remaining players
+                if skipped:
+                    bound = value_bound + top_free(i, r - needed)
+                else:
+                    bound = value_bound + prefix[i + r - needed] - prefix[i]
+                for j in range(n_roles):
+                    missing = role_lo[j] - role_counts[j]
+                    if missing > 0:
+                        if skip_single and j == single_role:
+                            bound += without_single(role_best[j][i], missing, s[single])
+                        else:
+                            bound += role_best[j][i][missing]
+                if bound <= best['value'] + EPS:
+                    return
+                node_bound = min(node_bound, bound)
+            if skip_single:
+                top = without_single(relaxed[i], r, single_relaxed)
+            else:
+                top = relaxed[i][r]
+            bound = value_bound + lam * (budget - cost) + top
+            if bound <= best['value'] + EPS:
+                return
+
+            if deadline is not None:
+                clock['nodes'] -= 1
+                # Never stop empty-handed: the clock is only read once there is a lineup to return
+                if clock['nodes'] <= 0 and not clock['stopped'] and best['value'] > -np.inf:
+                    clock['nodes'] = DEADLINE_CHECK_NODES
+                    clock['stopped'] = time.perf_counter() >= deadline
+                if clock['stopped']:
+                    # Out of time: leave the node open, keeping its bound
+                    clock['open_bound'] = max(clock['open_bound'], min(node_bound, bound))
+                    return
+
+            # Pick player i
+            role, team, in_cuts = ro[i], te[i], player_cuts[i]
+            if (not blocked[i]
+                    and (role < 0 or role_counts[role] < role_hi[role])
+                    and (team < 0 or team_counts[team] < team_hi[team])
+                    and cost + c[i] <= budget + EPS
+                    and all(overlap[q] < max_overlap for q in in_cuts)):
+                if role >= 0:
+                    role_counts[role] += 1
+                if team >= 0:
+                    team_counts[team] += 1
+                for q in in_cuts:
+                    overlap[q] += 1
+                chosen.append(i)
+                branch(i + 1, k + 1, cost + c[i], value + weights[k] * s[i])
+                chosen.pop()
+                for q in in_cuts:
+                    overlap[q] -= 1
+                if role >= 0:
+                    role_counts[role] -= 1
+                if team >= 0:
+                    team_counts[team] -= 1
+
+            # Skip player i
+            branch(i + 1, k, cost, value)
+
+        branch(0, 0, start_cost, start_value)
+
+        self.timed_out = clock['stopped']
+        self.bound = max(best['value'], clock['open_bound'])
+        if best['chosen'] is None:
+            return best['value'], None
+        selected = [int(self.order[i]) for i in best['chosen']] + list(fixed)
+        return best['value'], sorted(selected)
+
+
+def _solve_pulp(player_data, team1, team2, score_key='predicted_fp', cuts=(), max_overlap=None, multipliers=(),
+                profile=None, time_limit=None):
+    """
+    Reference backend: the integer program solved with CBC
+
+    Returns:
+        tuple: (indices of the selected players, PuLP status string, or
+        'Feasible' when CBC stopped on time_limit with a lineup)
+    """
+
+    # PuLP is imported on first use so importing this module stays cheap
+    from pulp import LpProblem, LpMaximize, LpVariable, LpStatus, lpSum, PULP_CBC_CMD
+    from pulp import LpSolutionIntegerFeasible, LpSolutionNoSolutionFound
+
+    profile = profile or DEFAULT_PROFILE
+
+    # Create LP problem
+    prob = LpProblem("Dream11_Team_Selection", LpMaximize)
+
+    # Decision variables
+    player_vars = {}
+    for i, player in enumerate(player_data):
+        player_vars[player['player_id']] = LpVariable(f"player_{i}", cat='Binary')
+
+    # Captaincy: one extra binary per player and multiplier, at most one per player
+    bonus_vars = []
+    for j in range(len(multipliers)):
+        bonus_vars.append({
+            p['player_id']: LpVariable(f"bonus_{j}_{i}", cat='Binary')
+            for i, p in enumerate(player_data)
+        })
+
+    # Objective: Maximize predicted FP (with captaincy bonuses)
+    prob += lpSum([player_vars[p['player_id']] * p[score_key] for p in player_data]) + lpSum([
+        bonus_vars[j][p['player_id']] * (multipliers[j] - 1) * p[score_key]
+        for j in range(len(multipliers)) for p in player_data
+    ])
+    for j in range(len(multipliers)):
+        prob += lpSum(bonus_vars[j].values()) == 1
+    for p in player_data:
+        prob += lpSum([bonus_vars[j][p['player_id']] for j in range(len(multipliers))]) <= player_vars[p['player_id']]
+
+    # Constraint 1: Exactly squad_size players (11)
+    prob += lpSum([player_vars[p['player_id']] for p in player_data]) == profile['squad_size']
+
+    # Constraint 2: Budget (<= 100)
+    prob += lpSum([player_vars[p['player_id']] * p['credits'] for p in player_data]) <= profile['budget']
+
+    # Constraint 3: Role constraints
+    for role, min_count, max_count in zip(profile['roles'], profile['role_lo'], profile['role_hi']):
+        role_players = [p for p in player_data if p['role'] == role]
+        if len(role_players) > 0:
+            prob += lpSum([player_vars[p['player_id']] for p in role_players]) >= min_count
+            prob += lpSum([player_vars[p['player_id']] for p in role_players]) <= max_count
+
+    # Constraint 4: Max per team (7)
+    team1_players = [p for p in player_data if p['team'] == team1]
+    team2_players = [p for p in player_data if p['team'] == team2]
+
+    if len(team1_players) > 0:
+        prob += lpSum([player_vars[p['player_id']] for p in team1_players]) <= profile['max_per_team']
+    if len(team2_players) > 0:
+        prob += lpSum([player_vars[p['player_id']] for p in team2_players]) <= profile['max_per_team']
+
+    # Constraint 5: Both teams represented (at least 1 from each)
+    if len(team1_players) > 0:
+        prob += lpSum([player_vars[p['player_id']] for p in team1_players]) >= profile['min_per_team']
+    if len(team2_players) > 0:
+        prob += lpSum([player_vars[p['player_id']] for p in team2_players]) >= profile['min_per_team']
+
+    # Constraint 6: Share at most max_overlap players with each earlier lineup
+    for cut in cuts:
+        prob += lpSum([player_vars[player_data[i]['player_id']] for i in cut]) <= max_overlap
+
+    # Solve
+    prob.solve(PULP_CBC_CMD(msg=0, timeLimit=time_limit))
+
+    # Stopped on the time limit: keep the incumbent if CBC has one
+    if prob.sol_status == LpSolutionIntegerFeasible:
+        return [i for i, player in enumerate(player_data) if player_vars[player['player_id']].varValue == 1], 'Feasible'
+    if prob.sol_status == LpSolutionNoSolutionFound:
+        return [], 'Not Solved'
+
+    # Extract solution
+    selected = []
+    for i, player in enumerate(player_data):
+        if player_vars[player['player_id']].varValue == 1:
+            selected.append(i)
+
+    return selected, LpStatus[prob.status]
@@ -0,0 +1,130 @@
+"""
+Date-indexed venue/team/opponent aggregates for contextual features
+Cumulative count, sum and sum of squares of fantasy points keyed by
+(group, date), so any as-of mean/std is a binary search plus arithmetic
+"""
+import numpy as np
+import pandas as pd
+
+CONTEXT_KINDS = ('venue', 'team', 'opponent')
+
+# Stats used when there is no history at all
+EMPTY_HISTORY_STATS = {'avg_fp': 30, 'std_fp': 25}
+
+
+class ContextAggregates:
+    """
+    As-of fantasy-point aggregates per venue, team and opponent
+
+    Mirrors compute_venue_stats / compute_team_stats /
+    compute_opponent_stats over historical_data[match_date < D]: a group
+    with no rows falls back to the global mean/std, and a group with a
+    single row keeps its mean but takes the global std.
+    """
+
+    def __init__(self, historical_data):
+        n_rows = len(historical_data)
+        if n_rows:
+            dates = pd.to_datetime(historical_data['match_date']).values.astype('datetime64[ns]').astype(np.int64)
+            fp = historical_data['fantasy_points'].values.astype(np.float64)
+        else:
+            dates = np.zeros(0, dtype=np.int64)
+            fp = np.zeros(0)
+
+        self.unique_dates = np.unique(dates)
+        ranks = np.searchsorted(self.unique_dates, dates)
+        self._stride = len(self.unique_dates) + 1
+
+        # Global aggregates by date
+        order = np.argsort(ranks, kind='mergesort')
+        self._global = self._cumulate(ranks[order], fp[order])
+
+        # Per-group aggregates by (group code, date rank)
+        self._groups = {}
+        for kind in CONTEXT_KINDS:
+            if kind not in historical_data.columns or n_rows == 0:
+                self._groups[kind] = ({}, self._cumulate(np.zeros(0, dtype=np.int64), np.zeros(0)))
+                continue
+            codes, labels = pd.factorize(historical_data[kind], sort=False)
+            keys = codes.astype(np.int64) * self._stride + ranks
+            order = np.argsort(keys, kind='mergesort')
+            lookup = {label: code for code, label in enumerate(labels)}
+            self._groups[kind] = (lookup, self._cumulate(keys[order], fp[order]))
+
+    @staticmethod
+    def _cumulate(keys, values):
+        return (
+            keys,
+            np.concatenate([[0.0], np.cumsum(values)]),
+            np.concatenate([[0.0], np.cumsum(values * values)])
+        )
+
+    @staticmethod
+    def _moments(cumulated, start, stop):
+        _, csum, csum_sq = cumulated
+        n = stop - start
+        if n == 0:
+            return 0, np.nan, np.nan
+        total = csum[stop] - csum[start]
+        mean = total / n
+        if n == 1:
+            return 1, mean, np.nan
+        var = (csum_sq[stop] - csum_sq[start] - total * mean) / (n - 1)
+        return n, mean, np.sqrt(max(var, 0.0))
+
+    def date_rank(self, match_date):
+        """Number of distinct history dates strictly before match_date"""
+        return int(np.searchsorted(self.unique_dates, pd.Timestamp(match_date).value, side='left'))
+
+    def global_stats(self, match_date):
+        """
+        Mean and std of every fantasy-point row before match_date
+
+        Returns:
+            tuple: (num_rows, mean, std)
+        """
+        keys = self._global[0]
+        stop = int(np.searchsorted(keys, self.date_rank(match_date), side='left'))
+        return self._moments(self._global, 0, stop)
+
+    def stats(self, kind, value, match_date):
+        """
+        As-of stats for one venue, team or opponent
+
+        Returns:
+            dict: {'avg_fp': ..., 'std_fp': ...}
+        """
+        rank = self.date_rank(match_date)
+        n_global, global_mean, global_std = self.global_stats(match_date)
+        if n_global == 0:
+            return dict(EMPTY_HISTORY_STATS)
+
+        lookup, cumulated = self._groups[kind]
+        code = lookup.get(value)
+        n = 0
+        if code is not None:
+            keys = cumulated[0]
+            start = int(np.searchsorted(keys, code * self._stride, side='left'))
+            stop = int(np.searchsorted(keys, code * self._stride + rank, side='left'))
+            n, mean, std = self._moments(cumulated, start, stop)
+
+        if n == 0:
+            # Use global average
+            return {'avg_fp': global_mean, 'std_fp': global_std}
+
+        return {
+            'avg_fp': mean,
+            'std_fp': std if n > 1 else global_std
+        }
+
+    def venue_stats(self, venue, match_date):
+        """As-of stats for a venue"""
+        return self.stats('venue', venue, match_date)
+
+    def team_stats(self, team, match_date):
+        """As-of stats for a team"""
+        return self.stats('team', team, match_date)
+
+    def opponent_stats(self, opponent, match_date):
+        """As-of stats for an opponent"""
+        return self.stats('opponent', opponent, match_date)
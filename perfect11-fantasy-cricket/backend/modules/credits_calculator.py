@@ -2,49 +2,54 @@
 Calculate credits for all players based on historical performance
 Following the exact specification from the PDF
 """
-import pandas as pd
 import numpy as np
+from modules.history_index import PlayerHistoryIndex
+from modules.role_percentiles import RolePercentileSnapshots
+from modules.role_resolver import RoleResolver
 
-def calculate_credits_for_all(players, match_date, historical_data, roles_by_season, roles_global):
+def calculate_credits_for_all(players, match_date, historical_data, roles_by_season, roles_global,
+                              history_index=None, role_percentiles=None, role_resolver=None):
     """
     Calculate credits for all players
 
+    history_index is a PlayerHistoryIndex over historical_data, role_resolver
+    a RoleResolver over the role tables and role_percentiles a
+    RolePercentileSnapshots over both; pass the ones built at startup to
+    avoid rebuilding them on every call.
+
     Returns:
         dict: {player_id: credits}
     """
     year = match_date.year
     credits_map = {}
 
+    if history_index is None:
+        history_index = PlayerHistoryIndex(historical_data)
+    if role_resolver is None:
+        role_resolver = RoleResolver(roles_by_season, roles_global)
+    if role_percentiles is None:
+        role_percentiles = RolePercentileSnapshots(history_index, role_resolver)
+
     # Get role-specific medians for newcomer clamp
     role_medians = compute_role_medians(historical_data, match_date, roles_by_season, roles_global)
 
-    for player in players:
-        player_id = player['player_id']
+    # Get every player's role in one lookup
+    roles = role_resolver.resolve_roles([p['player_id'] for p in players], year)
 
-        # Get player's role
-        role = get_player_role(player_id, year, roles_by_season, roles_global)
+    for player, role in zip(players, roles):
+        player_id = player['player_id']
         player['role'] = role
 
-        # Get historical matches for this player BEFORE match_date
-        if len(historical_data) == 0:
-            hist = pd.DataFrame()
-        else:
-            hist = historical_data[
-                (historical_data['player_id'] == player_id) &
-                (historical_data['match_date'] < match_date)
-            ].sort_values('match_date')
+        # Last 10 matches for this player BEFORE match_date
+        num_matches, mu_fp_10, std_fp_10 = history_index.last_n_stats(player_id, match_date, 10)
 
-        if len(hist) < 10:
+        if num_matches < 10:
             # Newcomer clamp
             median = role_medians.get(role, 7.5)
             credits = np.clip(median, median - 0.5, median + 0.5)
             credits = round(credits, 2)
         else:
             # Compute composite score
-            last_10 = hist.tail(10)
-            mu_fp_10 = last_10['fantasy_points'].mean()
-            std_fp_10 = last_10['fantasy_points'].std()
-
             if std_fp_10 == 0 or np.isnan(std_fp_10):
                 std_fp_10 = 0
 
@@ -53,7 +58,9 @@ def calculate_credits_for_all(players, match_date, historical_data, roles_by_sea
             # Compute percentile within role
             percentile = compute_percentile_within_role(
                 player_id, role, composite_score,
-                historical_data, match_date, roles_by_season, roles_global
+                historical_data, match_date, roles_by_season, roles_global,
+                history_index=history_index,
+                role_percentiles=role_percentiles
             )
 
             # Map percentile to credits
@@ -74,8 +81,11 @@ def compute_role_medians(historical_data, match_date, roles_by_season, roles_glo
         'BOWL': 7.2
     }
 
-def get_player_role(player_id, year, roles_by_season, roles_global):
+def get_player_role(player_id, year, roles_by_season, roles_global, role_resolver=None):
     """Get player's role with fallback"""
+    if role_resolver is not None:
+        return role_resolver.resolve(player_id, year)
+
     # Try season-specific
     season_role = roles_by_season[
         (roles_by_season['player_id'] == player_id) &
@@ -94,45 +104,16 @@ def get_player_role(player_id, year, roles_by_season, roles_global):
     return 'BAT'
 
 def compute_percentile_within_role(player_id, role, composite_score,
-                                   historical_data, match_date, roles_by_season, roles_global):
+                                   historical_data, match_date, roles_by_season, roles_global,
+                                   history_index=None, role_percentiles=None):
     """Compute player's percentile within their role"""
-    year = match_date.year
+    # Scores of all players in this role with >=10 matches before match_date
+    if role_percentiles is None:
+        if history_index is None:
+            history_index = PlayerHistoryIndex(historical_data)
+        role_percentiles = RolePercentileSnapshots(history_index, RoleResolver(roles_by_season, roles_global))
 
-    # Get all players in this role with >=10 matches before match_date
-    all_player_scores = []
-
-    if len(historical_data) == 0:
-        unique_players = []
-    else:
-        unique_players = historical_data[
-            historical_data['match_date'] < match_date
-        ]['player_id'].unique()
-
-    for pid in unique_players:
-        p_role = get_player_role(pid, year, roles_by_season, roles_global)
-        if p_role != role:
-            continue
-
-        p_hist = historical_data[
-            (historical_data['player_id'] == pid) &
-            (historical_data['match_date'] < match_date)
-        ]
-
-        if len(p_hist) >= 10:
-            last_10 = p_hist.tail(10)
-            mu = last_10['fantasy_points'].mean()
-            std = last_10['fantasy_points'].std()
-            if np.isnan(std):
-                std = 0
-            score = 0.7 * mu + 0.3 * (mu - std)
-            all_player_scores.append(score)
-
-    if len(all_player_scores) == 0:
-        return 50  # Default to median
-
-    # Compute percentile
-    percentile = (np.sum(np.array(all_player_scores) < composite_score) / len(all_player_scores)) * 100
-    return percentile
+    return role_percentiles.percentile(role, match_date, composite_score)
 
 def map_percentile_to_credits(percentile):
     """Map percentile to credits using bands"""
@@ -0,0 +1,133 @@
+"""
+Typed binary snapshot of the historical data and role tables
+A build step writes the CSVs to one uncompressed .npz with dictionary-encoded
+strings; the backend loads it instead of re-parsing the CSVs when its
+content hash still matches the sources.
+
+Build with:
+    python -m modules.data_snapshot [data_dir]
+"""
+import hashlib
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_FORMAT = 1
+
+# Snapshot table name -> (CSV file name, date columns)
+SOURCES = {
+    'matches': ('player_match_base.csv', ['match_date']),
+    'roles_by_season': ('player_roles_by_season.csv', []),
+    'roles_global': ('player_roles_global.csv', [])
+}
+
+SNAPSHOT_FILE = 'snapshot.npz'
+
+
+def source_hash(data_dir):
+    """sha256 over the source CSVs (None if any is missing)"""
+    h = hashlib.sha256()
+    for table in sorted(SOURCES):
+        path = os.path.join(data_dir, SOURCES[table][0])
+        if not os.path.exists(path):
+            return None
+        h.update(table.encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def _encode_frame(table, df, arrays):
+    """Add one DataFrame's columns to arrays, dictionary-encoding strings"""
+    arrays[f'{table}/__columns__'] = np.array(list(df.columns), dtype=str)
+    for col in df.columns:
+        values = df[col]
+        prefix = f'{table}/{col}'
+        if pd.api.types.is_datetime64_any_dtype(values):
+            arrays[f'{prefix}/datetime'] = values.values.astype('datetime64[ns]').astype(np.int64)
+        elif values.dtype == object:
+            codes, categories = pd.factorize(values, sort=True)
+            arrays[f'{prefix}/codes'] = codes.astype(np.int32)
+            arrays[f'{prefix}/categories'] = np.array(categories, dtype=str)
+        else:
+            arrays[f'{prefix}/values'] = values.values
+
+
+def _decode_frame(table, npz):
+    """Rebuild one DataFrame from snapshot arrays"""
+    columns = {}
+    for col in npz[f'{table}/__columns__']:
+        prefix = f'{table}/{col}'
+        if f'{prefix}/datetime' in npz:
+            columns[col] = npz[f'{prefix}/datetime'].astype('datetime64[ns]')
+        elif f'{prefix}/codes' in npz:
+            categories = npz[f'{prefix}/categories'].astype(object)
+            columns[col] = np.asarray(pd.Categorical.from_codes(npz[f'{prefix}/codes'], categories), dtype=object)
+        else:
+            columns[col] = npz[f'{prefix}/values']
+    return pd.DataFrame(columns)
+
+
+def build_snapshot(data_dir='data', snapshot_path=None):
+    """
+    Parse the source CSVs once and write the binary snapshot
+
+    Returns:
+        str: path of the written snapshot
+    """
+    snapshot_path = snapshot_path or os.path.join(data_dir, SNAPSHOT_FILE)
+    digest = source_hash(data_dir)
+    if digest is None:
+        raise FileNotFoundError(f"Missing source CSVs in {data_dir}")
+
+    arrays = {
+        '__format__': np.array(SNAPSHOT_FORMAT),
+        '__source_sha256__': np.array(digest)
+    }
+    for table, (file_name, date_cols) in SOURCES.items():
+        df = pd.read_csv(os.path.join(data_dir, file_name), parse_dates=date_cols or False)
+        _encode_frame(table, df, arrays)
+
+    tmp_path = snapshot_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+def load_snapshot(data_dir='data', snapshot_path=None):
+    """
+    Load the snapshot if it is valid for the current CSVs
+
+    The snapshot is used when its recorded content hash matches the source
+    CSVs, or when the CSVs are not deployed at all.
+
+    Returns:
+        dict: {table: DataFrame} or None when there is no usable snapshot
+    """
+    snapshot_path = snapshot_path or os.path.join(data_dir, SNAPSHOT_FILE)
+    if not os.path.exists(snapshot_path):
+        return None
+
+    try:
+        with np.load(snapshot_path, allow_pickle=False) as npz:
+            if int(npz['__format__']) != SNAPSHOT_FORMAT:
+                print(f"[WARNING] {snapshot_path} has an old format - ignoring it")
+                return None
+
+            digest = source_hash(data_dir)
+            if digest is not None and str(npz['__source_sha256__']) != digest:
+                print(f"[WARNING] {snapshot_path} is stale (CSV content changed) - ignoring it")
+                return None
+
+            return {table: _decode_frame(table, npz) for table in SOURCES}
+    except Exception as e:
+        print(f"[WARNING] Could not read {snapshot_path}: {e}")
+        return None
+
+
+if __name__ == '__main__':
+    path = build_snapshot(sys.argv[1] if len(sys.argv) > 1 else 'data')
+    print(f"[OK] Snapshot written: {path}")
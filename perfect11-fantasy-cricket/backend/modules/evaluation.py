@@ -3,16 +3,21 @@ Evaluation module to compute Dream XI and metrics
 """
 import pandas as pd
 from modules.fantasy_points import calculate_actual_fantasy_points
-from modules.constraints_solver import select_optimal_xi
+from modules.constraints_solver import select_optimal_xi, team_total, CAPTAINCY_MULTIPLIERS
 
-def compute_dream_xi(match_data, players, actual_fp_dict):
+def compute_dream_xi(match_data, players, actual_fp_dict, solver_cache=None, profile=None):
     """
     Compute the Dream XI (best possible 11 based on actual performance)
 
+    The Dream XI is scored like a real entry, with the captain (2x) and
+    vice-captain (1.5x) on its top performers.
+
     Args:
         match_data: Match JSON data
         players: List of player dicts with roles and credits
         actual_fp_dict: Dict of {player_id: actual_fantasy_points}
+        solver_cache: Optional SolverCache shared with the predicted-XI path
+        profile: Compiled constraint profile of the predicted XI (default if None)
 
     Returns:
         dict with dream_xi info
@@ -37,24 +42,30 @@ def compute_dream_xi(match_data, players, actual_fp_dict):
         player_data,
         team1,
         team2,
-        score_key='predicted_fp'  # Using actual FP here
+        score_key='predicted_fp',  # Using actual FP here
+        solver_cache=solver_cache,
+        profile=profile
     )
 
     return dream_xi_result
 
-def compute_ae_team_total(predicted_xi_players, dream_xi_players):
+def compute_ae_team_total(predicted_xi_players, dream_xi_players, multipliers=CAPTAINCY_MULTIPLIERS):
     """
     Compute absolute error between predicted and dream XI total fantasy points
 
+    Both totals apply the captain / vice-captain multipliers to each XI's
+    top two players, as the solver does.
+
     Args:
         predicted_xi_players: List of players in predicted XI with their predicted_fp
         dream_xi_players: List of players in dream XI with their actual FP
+        multipliers: Captaincy multipliers (() for plain sums)
 
     Returns:
         float: absolute error
     """
-    predicted_total = sum(p['predicted_fp'] for p in predicted_xi_players)
-    dream_total = sum(p['predicted_fp'] for p in dream_xi_players)
+    predicted_total = team_total(predicted_xi_players, 'predicted_fp', multipliers)[2]
+    dream_total = team_total(dream_xi_players, 'predicted_fp', multipliers)[2]
 
     ae_total_team = abs(dream_total - predicted_total)
     return ae_total_team
@@ -1,46 +1,179 @@
 """
 Compute SHAP/attribution values for explainability
 """
+import copy
+import time
 import numpy as np
+from modules.flat_forest import FlatForest
 
-def compute_attributions(optimal_xi, player_features, model, feature_cols):
+# Features listed per player in 'top_features'
+TOP_FEATURES = 5
+
+# Attribution modes, most faithful first:
+#   exact          - TreeSHAP over the whole forest
+#   tree_subsample - TreeSHAP over SUBSAMPLE_TREES evenly spaced trees (an
+#                    unbiased estimate, as the forest averages its trees)
+#   path_contrib   - Saabas decision-path contributions, one vectorized walk
+ATTRIBUTION_MODES = ('exact', 'tree_subsample', 'path_contrib')
+SUBSAMPLE_TREES = 20
+
+# Rows timed per mode when the explainer is built, and the weight of each
+# new request's timing in the running per-row cost
+CALIBRATION_ROWS = 4
+COST_SMOOTHING = 0.2
+
+
+class ModelExplainer:
     """
-    Compute SHAP values for selected players
+    Attribution back-ends for one model, built once when it is loaded
+
+    Keeps a running per-row cost of every mode so a request can pick the
+    most faithful mode that fits its latency budget.
+    """
+
+    def __init__(self, model, subsample_trees=SUBSAMPLE_TREES, forest=None):
+        self.backends = {}
+        self.row_ms = {}
+
+        try:
+            import shap
+            exact = shap.TreeExplainer(model)
+            self.backends['exact'] = exact.shap_values
+
+            trees = getattr(model, 'estimators_', None)
+            if trees is not None and len(trees) > subsample_trees:
+                subset = copy.copy(model)
+                subset.estimators_ = [trees[i] for i in np.linspace(0, len(trees) - 1, subsample_trees).astype(int)]
+                subset.n_estimators = subsample_trees
+                self.backends['tree_subsample'] = shap.TreeExplainer(subset).shap_values
+        except Exception as e:
+            print(f"[WARNING] Could not build SHAP explainer: {e}")
+
+        forest = forest or FlatForest.from_model(model)
+        if forest is not None:
+            self.backends['path_contrib'] = lambda X: forest.path_contributions(X)[1]
+
+    @property
+    def modes(self):
+        """Available modes, most faithful first"""
+        return [mode for mode in ATTRIBUTION_MODES if mode in self.backends]
+
+    def calibrate(self, n_features):
+        """Time every mode on CALIBRATION_ROWS rows to seed the cost estimates"""
+        X = np.zeros((CALIBRATION_ROWS, n_features))
+        for mode in self.modes:
+            self.row_ms.pop(mode, None)
+            self.attribute(X, mode)
+
+    def choose_mode(self, n_rows, budget_ms=None):
+        """
+        Most faithful mode expected to explain n_rows within budget_ms
+
+        Without a budget this is the most faithful mode; when none fits
+        (or none has been timed) it is the fastest one.
+        """
+        modes = self.modes
+        if not modes:
+            return None
+        if not budget_ms:
+            return modes[0]
+        for mode in modes:
+            if mode in self.row_ms and self.row_ms[mode] * n_rows <= budget_ms:
+                return mode
+        return modes[-1]
+
+    def attribute(self, X, mode):
+        """
+        Attributions of each row with one mode, timing the call
+
+        Returns:
+            np.ndarray: (n_rows, n_features)
+        """
+        start = time.perf_counter()
+        values = np.asarray(self.backends[mode](X)).reshape(len(X), -1)
+        row_ms = (time.perf_counter() - start) * 1000 / len(X)
+        previous = self.row_ms.get(mode)
+        self.row_ms[mode] = row_ms if previous is None else (1 - COST_SMOOTHING) * previous + COST_SMOOTHING * row_ms
+        return values
+
+    def stats(self):
+        return {
+            'modes': self.modes,
+            'row_ms': {mode: round(ms, 3) for mode, ms in self.row_ms.items()}
+        }
+
+
+def build_explainer(model, n_features=None, forest=None):
+    """
+    Build the attribution back-ends for a model
+
+    Building them walks every tree, so it is done once when the model is
+    loaded and reused by every request. Given n_features, every mode is
+    timed once so budgeted requests can choose between them. forest is the
+    model's FlatForest when the caller already has one.
 
     Returns:
-        dict: {player_id: {feature: importance}}
+        ModelExplainer, or None if no mode can explain the model
     """
-    try:
-        import shap
-        # Create SHAP explainer
-        explainer = shap.TreeExplainer(model)
+    explainer = ModelExplainer(model, forest=forest)
+    if not explainer.modes:
+        return None
+    if n_features:
+        explainer.calibrate(n_features)
+    return explainer
 
-        attributions = {}
+def compute_attributions(optimal_xi, player_features, model, feature_cols, explainer=None, mode=None, budget_ms=None,
+                         cache=None):
+    """
+    Compute SHAP values for selected players
 
-        for player in optimal_xi['selected_players']:
-            player_id = player['player_id']
+    All selected players are explained in one batched call. Pass the
+    explainer from build_explainer; without one it is built here. mode is
+    one of ATTRIBUTION_MODES; by default the most faithful mode expected to
+    finish within budget_ms is used. cache is a RowCache view of the model's
+    version; only rows it has not seen in this mode are explained.
 
-            # Get this player's features
-            player_row = player_features[player_features['player_id'] == player_id]
-            X = player_row[feature_cols].fillna(0)
+    Returns:
+        dict: {player_id: {'top_features': the TOP_FEATURES largest by
+        absolute importance, 'all_features': every feature, sorted the
+        same way, 'mode': the mode used}}
+    """
+    players = optimal_xi['selected_players']
+    empty = {p['player_id']: {'top_features': [], 'all_features': [], 'mode': None} for p in players}
+    try:
+        if explainer is None:
+            explainer = ModelExplainer(model)
+        if mode is not None and mode not in explainer.backends:
+            raise ValueError(f"Attribution mode '{mode}' is not available for this model")
 
-            # Compute SHAP values
-            shap_values = explainer.shap_values(X)
+        # One feature row per selected player, in selection order
+        row_of = {}
+        for position, player_id in enumerate(player_features['player_id']):
+            row_of.setdefault(player_id, position)
+        explained = [p['player_id'] for p in players if p['player_id'] in row_of]
+        if not explained:
+            return empty
+        X = player_features.iloc[[row_of[player_id] for player_id in explained]][feature_cols].fillna(0).values
 
-            # Get top 5 features
-            feature_importance = []
-            for i, feature in enumerate(feature_cols):
-                feature_importance.append({
-                    'feature': feature,
-                    'importance': float(shap_values[0][i])
-                })
+        # Compute SHAP values
+        mode = mode or explainer.choose_mode(len(explained), budget_ms)
+        if cache is not None:
+            keys, values = cache.fetch(f'attribution/{mode}', X)
+            shap_values = cache.fill(keys, values, lambda rows: explainer.attribute(X[rows], mode))
+        else:
+            shap_values = explainer.attribute(X, mode)
+        shap_values = shap_values.reshape(len(explained), len(feature_cols))
 
-            # Sort by absolute importance
-            feature_importance.sort(key=lambda x: abs(x['importance']), reverse=True)
+        # Features by absolute importance (stable, so ties keep model order)
+        order = np.argsort(-np.abs(shap_values), axis=1, kind='stable')
 
+        attributions = dict(empty)
+        for player_id, values, ranked in zip(explained, shap_values.tolist(), order.tolist()):
+            feature_importance = [{'feature': feature_cols[j], 'importance': values[j]} for j in ranked]
             attributions[player_id] = {
-                'top_features': feature_importance[:5],
-                'all_features': feature_importance
+                'top_features': feature_importance[:TOP_FEATURES],
+                'all_features': feature_importance,
+                'mode': mode
             }
 
         return attributions
@@ -48,5 +181,4 @@ def compute_attributions(optimal_xi, player_features, model, feature_cols):
     except Exception as e:
         print(f"Warning: Could not compute SHAP values: {e}")
         # Return empty attributions
-        return {p['player_id']: {'top_features': [], 'all_features': []}
-                for p in optimal_xi['selected_players']}
+        return empty
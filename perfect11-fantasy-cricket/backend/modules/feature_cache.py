@@ -0,0 +1,139 @@
+"""
+Bounded LRU cache of per-player feature vectors
+Keyed by the full match context plus a data version, so re-submitting the
+same fixture skips feature engineering entirely
+"""
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+
+def data_version(historical_data, label_encoders):
+    """
+    Fingerprint of everything a cached feature vector depends on besides its key
+
+    Changes whenever the historical data or the label encoders change.
+    """
+    h = hashlib.sha1()
+    if len(historical_data):
+        h.update(pd.util.hash_pandas_object(historical_data, index=False).values.tobytes())
+    for name in sorted(label_encoders or {}):
+        h.update(name.encode())
+        h.update('\x00'.join(str(c) for c in label_encoders[name].classes_).encode())
+    return h.hexdigest()[:16]
+
+
+def feature_key(player_id, match_date, venue, opponent, team, role, version):
+    """Cache key of one player's feature vector"""
+    return (player_id, pd.Timestamp(match_date), venue, opponent, team, role, version)
+
+
+class FeatureCache:
+    """
+    Thread-safe LRU of feature dicts with an approximate memory cap
+
+    The cache is bound to one data version; set_version with a new
+    fingerprint drops every entry. view(model_version) gives the cache as
+    one model version sees it, so versions served side by side (or before
+    and after a hot swap) never share an entry.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, version=None):
+        self.max_bytes = max_bytes
+        self.version = version
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_version(self, version):
+        """Bind the cache to a data version, invalidating it if the version changed"""
+        with self._lock:
+            if version != self.version:
+                self._clear()
+                self.version = version
+
+    def invalidate(self):
+        """Drop every cached feature vector"""
+        with self._lock:
+            self._clear()
+
+    def key(self, player_id, match_date, venue, opponent, team, role):
+        """Cache key for the current data version"""
+        return feature_key(player_id, match_date, venue, opponent, team, role, self.version)
+
+    def view(self, model_version):
+        """The cache with keys tagged by a model version as well"""
+        return FeatureCacheView(self, model_version)
+
+    def get(self, key):
+        """Cached feature dict (a copy) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, key, feat):
+        """Store a feature dict, evicting least recently used entries over the cap"""
+        feat = dict(feat)
+        size = sys.getsizeof(feat) + sum(sys.getsizeof(v) for v in feat.values())
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= old[1]
+            self._entries[key] = (feat, size)
+            self._nbytes += size
+            while self._nbytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._nbytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        """Size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'version': self.version
+            }
+
+    def _clear(self):
+        self._entries.clear()
+        self._nbytes = 0
+
+
+class FeatureCacheView:
+    """
+    A FeatureCache seen by one model version
+
+    Keys carry (data version, model version); entries of other versions
+    age out through the shared LRU.
+    """
+
+    def __init__(self, cache, model_version):
+        self.cache = cache
+        self.model_version = model_version
+
+    def key(self, player_id, match_date, venue, opponent, team, role):
+        """Cache key for the current data version and this model version"""
+        return feature_key(player_id, match_date, venue, opponent, team, role, (self.cache.version, self.model_version))
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def put(self, key, feat):
+        self.cache.put(key, feat)
@@ -2,14 +2,31 @@
 Feature Engineering for Time-Aware Model (v2.0)
 Creates all 27 features required by the Extra Trees model
 """
+import weakref
 import pandas as pd
 import numpy as np
+from modules.role_resolver import RoleResolver
+from modules.feature_store import PlayerFeatureStore, PLAYER_FEATURES
+from modules.context_aggregates import ContextAggregates
 
 def create_features_for_inference_v2(players, match_date, venue, historical_data,
-                                     roles_by_season, roles_global, label_encoders):
+                                     roles_by_season, roles_global, label_encoders,
+                                     role_resolver=None, feature_store=None,
+                                     context_aggregates=None, feature_cache=None):
     """
     Create 27 features for each player using only historical data
 
+    Players without a 'role' (e.g. credits not computed yet) are resolved in
+    bulk through role_resolver, built from the role tables if not given.
+    Player-history features are as-of lookups in feature_store, a
+    PlayerFeatureStore over historical_data and contextual stats come from
+    context_aggregates, a ContextAggregates over the same data; pass the
+    ones built at startup to avoid rebuilding them on every call.
+
+    With a FeatureCache, players whose (id, date, venue, opponent, team, role)
+    were seen before under the cache's data version are served from it and
+    only the rest are computed.
+
     Required features (from time-aware model):
     - Recent performance: avg_fp_last3, avg_fp_last5, avg_fp_last10, std_fp_last10, recent_form
     - Career: career_avg_fp, career_matches
@@ -20,41 +37,138 @@ def create_features_for_inference_v2(players, match_date, venue, historical_data
     - Temporal: year, month, day_of_week
     - Categorical (encoded): role, team, opponent, venue
     """
+    # Serve repeat players from the cache, compute only the misses
+    features_list = [None] * len(players)
+    keys = []
+    if feature_cache is not None:
+        teams = set(p['team'] for p in players)
+        opponents = {team: get_opponent(players, team) for team in teams}
+        for i, player in enumerate(players):
+            key = feature_cache.key(player['player_id'], match_date, venue, opponents[player['team']],
+                                    player['team'], player.get('role'))
+            keys.append(key)
+            feat = feature_cache.get(key)
+            if feat is not None:
+                feat['player_id'] = player['player_id']
+                feat['player_name'] = player['player_name']
+                features_list[i] = feat
+
+    missing = [i for i, feat in enumerate(features_list) if feat is None]
+    if missing:
+        to_compute = [players[i] for i in missing]
+
+        if context_aggregates is None:
+            context_aggregates = ContextAggregates(historical_data)
+        if role_resolver is None and any('role' not in p for p in to_compute):
+            role_resolver = RoleResolver(roles_by_season, roles_global)
+
+        # Player-history features for everyone in one as-of lookup
+        if feature_store is None:
+            feature_store = PlayerFeatureStore.from_history(historical_data)
+        store_feats, num_matches = feature_store.player_features([p['player_id'] for p in to_compute], match_date)
+
+        rows = build_match_feature_rows(
+            to_compute, match_date, venue, store_feats, num_matches, 0,
+            label_encoders, context_aggregates, role_resolver, all_players=players
+        )
+        for i, feat in zip(missing, rows):
+            features_list[i] = feat
+            if feature_cache is not None:
+                feature_cache.put(keys[i], {k: v for k, v in feat.items() if k not in ('player_id', 'player_name')})
+
+    return pd.DataFrame(features_list)
+
+def create_features_for_batch_v2(matches, historical_data, roles_by_season, roles_global,
+                                 label_encoders, role_resolver=None, feature_store=None,
+                                 context_aggregates=None):
+    """
+    Create the 27 features for every player of many matches at once
+
+    matches is a list of parsed match dicts (parse_match_json output). The
+    player-history features of all matches come from a single vectorized
+    as-of lookup, so the whole batch can be scored in one model call.
+
+    Returns:
+        DataFrame: one row per (match, player), in input order, with the
+        columns of create_features_for_inference_v2 plus match_index (the
+        position in matches) and match_id
+    """
+    if context_aggregates is None:
+        context_aggregates = ContextAggregates(historical_data)
+    if role_resolver is None and any('role' not in p for m in matches for p in m['players']):
+        role_resolver = RoleResolver(roles_by_season, roles_global)
+    if feature_store is None:
+        feature_store = PlayerFeatureStore.from_history(historical_data)
+
+    player_ids = [p['player_id'] for m in matches for p in m['players']]
+    match_dates = [m['match_date'] for m in matches for _ in m['players']]
+    store_feats, num_matches = feature_store.player_features(player_ids, match_dates)
+
     features_list = []
+    offset = 0
+    for match_index, match in enumerate(matches):
+        rows = build_match_feature_rows(
+            match['players'], match['match_date'], match['venue'], store_feats, num_matches, offset,
+            label_encoders, context_aggregates, role_resolver
+        )
+        for feat in rows:
+            feat['match_index'] = match_index
+            feat['match_id'] = match.get('match_id', 'unknown')
+        features_list.extend(rows)
+        offset += len(match['players'])
 
-    # Get global stats from all historical data before this match
-    global_hist = historical_data[historical_data['match_date'] < match_date]
+    return pd.DataFrame(features_list)
 
-    # Compute contextual stats
-    venue_stats = compute_venue_stats(global_hist, venue)
-    team_stats = {team: compute_team_stats(global_hist, team) for team in set(p['team'] for p in players)}
+def build_match_feature_rows(players, match_date, venue, store_feats, num_matches, offset,
+                             label_encoders, context_aggregates, role_resolver, all_players=None):
+    """
+    Assemble the feature rows of one match
+
+    store_feats / num_matches come from PlayerFeatureStore.player_features,
+    with these players starting at row offset. all_players is the full
+    lineup when players is only part of it (opponents are derived from it).
 
-    for player in players:
+    Returns:
+        list: one feature dict per player
+    """
+    features_list = []
+    if all_players is None:
+        all_players = players
+
+    # Compute contextual stats as of this match (each team is the other's opponent)
+    teams = set(p['team'] for p in players)
+    venue_stats = context_aggregates.venue_stats(venue, match_date)
+    team_stats = {team: context_aggregates.team_stats(team, match_date) for team in teams}
+    opponents = {team: get_opponent(all_players, team) for team in teams}
+    opponent_stats = {opp: context_aggregates.opponent_stats(opp, match_date) for opp in set(opponents.values())}
+
+    # Resolve roles only for players that don't carry one already
+    missing = [p['player_id'] for p in players if 'role' not in p]
+    resolved = {}
+    if missing:
+        resolved = dict(zip(missing, role_resolver.resolve_roles(missing, match_date.year)))
+
+    for i, player in enumerate(players, start=offset):
         player_id = player['player_id']
         player_name = player['player_name']
         team = player['team']
-        role = player.get('role', 'AR')  # Default to All-Rounder
+        role = player['role'] if 'role' in player else resolved[player_id]
 
         # Get opponent team
-        opponent = get_opponent(players, team)
-        opponent_stats = compute_opponent_stats(global_hist, opponent)
-
-        # Get player's historical data (before this match)
-        player_hist = global_hist[global_hist['player_id'] == player_id].sort_values('match_date')
-
-        # Extract all 27 features
-        feat = extract_all_features(
-            player_id=player_id,
-            player_hist=player_hist,
-            match_date=match_date,
-            venue=venue,
-            venue_stats=venue_stats,
-            opponent=opponent,
-            opponent_stats=opponent_stats,
-            team=team,
-            team_stats=team_stats.get(team, {'avg_fp': 0, 'std_fp': 0}),
-            role=role
-        )
+        opponent = opponents[team]
+
+        # Assemble all 27 features
+        if num_matches[i] == 0:
+            feat = new_player_features(venue_stats)
+        else:
+            feat = {name: store_feats[name][i] for name in PLAYER_FEATURES}
+            feat['career_matches'] = int(num_matches[i])
+        feat.update(context_features(
+            match_date,
+            venue_stats,
+            opponent_stats[opponent],
+            team_stats.get(team, {'avg_fp': 0, 'std_fp': 0})
+        ))
 
         # Encode categoricals
         feat['role'] = encode_safe(label_encoders['role'], role)
@@ -67,55 +181,69 @@ def create_features_for_inference_v2(players, match_date, venue, historical_data
 
         features_list.append(feat)
 
-    return pd.DataFrame(features_list)
+    return features_list
+
+def new_player_features(venue_stats):
+    """Player-history features for a player with no matches - use global defaults"""
+    return {
+        # Recent performance (5 features)
+        'avg_fp_last3': venue_stats['avg_fp'],
+        'avg_fp_last5': venue_stats['avg_fp'],
+        'avg_fp_last10': venue_stats['avg_fp'],
+        'std_fp_last10': 0,
+        'recent_form': venue_stats['avg_fp'],
+
+        # Career (2 features)
+        'career_avg_fp': venue_stats['avg_fp'],
+        'career_matches': 0,
+
+        # Batting (4 features)
+        'avg_runs_last5': 20,  # Reasonable default
+        'avg_runs_last10': 20,
+        'strike_rate': 120,  # T20 average
+        'boundary_rate': 0.3,
+
+        # Bowling (2 features)
+        'avg_wickets_last5': 0,
+        'avg_wickets_last10': 0,
+
+        # Fielding (1 feature)
+        'avg_catches_last5': 0.2
+    }
+
+def context_features(match_date, venue_stats, opponent_stats, team_stats):
+    """Contextual and temporal features shared by every player in a match"""
+    return {
+        # Contextual (6 features)
+        'venue_avg_fp': venue_stats['avg_fp'],
+        'venue_std_fp': venue_stats['std_fp'],
+        'opponent_avg_fp': opponent_stats['avg_fp'],
+        'opponent_std_fp': opponent_stats['std_fp'],
+        'team_avg_fp': team_stats['avg_fp'],
+        'team_std_fp': team_stats['std_fp'],
+
+        # Temporal (3 features)
+        'year': match_date.year,
+        'month': match_date.month,
+        'day_of_week': match_date.dayofweek
+    }
 
 def extract_all_features(player_id, player_hist, match_date, venue, venue_stats,
                          opponent, opponent_stats, team, team_stats, role):
-    """Extract all 27 features from player history"""
+    """
+    Extract all 27 features from player history
+
+    Row-wise reference for PlayerFeatureStore, which computes the same
+    player features from prefix sums.
+    """
     feat = {}
 
     n = len(player_hist)
 
     if n == 0:
         # New player - use global defaults
-        feat.update({
-            # Recent performance (5 features)
-            'avg_fp_last3': venue_stats['avg_fp'],
-            'avg_fp_last5': venue_stats['avg_fp'],
-            'avg_fp_last10': venue_stats['avg_fp'],
-            'std_fp_last10': 0,
-            'recent_form': venue_stats['avg_fp'],
-
-            # Career (2 features)
-            'career_avg_fp': venue_stats['avg_fp'],
-            'career_matches': 0,
-
-            # Batting (4 features)
-            'avg_runs_last5': 20,  # Reasonable default
-            'avg_runs_last10': 20,
-            'strike_rate': 120,  # T20 average
-            'boundary_rate': 0.3,
-
-            # Bowling (2 features)
-            'avg_wickets_last5': 0,
-            'avg_wickets_last10': 0,
-
-            # Fielding (1 feature)
-            'avg_catches_last5': 0.2,
-
-            # Contextual (6 features)
-            'venue_avg_fp': venue_stats['avg_fp'],
-            'venue_std_fp': venue_stats['std_fp'],
-            'opponent_avg_fp': opponent_stats['avg_fp'],
-            'opponent_std_fp': opponent_stats['std_fp'],
-            'team_avg_fp': team_stats['avg_fp'],
-            'team_std_fp': team_stats['std_fp'],
-
-            # Temporal (3 features)
-            'year': match_date.year,
-            'month': match_date.month,
-            'day_of_week': match_date.dayofweek
-        })
+        feat.update(new_player_features(venue_stats))
+        feat.update(context_features(match_date, venue_stats, opponent_stats, team_stats))
     else:
         # Compute from historical data
         fp = player_hist['fantasy_points'].values
@@ -168,23 +296,18 @@ def extract_all_features(player_id, player_hist, match_date, venue, venue_stats,
         # Fielding stats
         feat['avg_catches_last5'] = np.mean(catches[-5:]) if n >= 5 else np.mean(catches)
 
-        # Contextual stats
-        feat['venue_avg_fp'] = venue_stats['avg_fp']
-        feat['venue_std_fp'] = venue_stats['std_fp']
-        feat['opponent_avg_fp'] = opponent_stats['avg_fp']
-        feat['opponent_std_fp'] = opponent_stats['std_fp']
-        feat['team_avg_fp'] = team_stats['avg_fp']
-        feat['team_std_fp'] = team_stats['std_fp']
-
-        # Temporal features
-        feat['year'] = match_date.year
-        feat['month'] = match_date.month
-        feat['day_of_week'] = match_date.dayofweek
+        # Contextual and temporal features
+        feat.update(context_features(match_date, venue_stats, opponent_stats, team_stats))
 
     return feat
 
 def compute_venue_stats(historical_data, venue):
-    """Compute venue statistics from historical data"""
+    """
+    Compute venue statistics from historical data
+
+    Reference for ContextAggregates.venue_stats, which answers the same
+    query as of a date without filtering the history.
+    """
     if len(historical_data) == 0:
         return {'avg_fp': 30, 'std_fp': 25}
 
@@ -243,9 +366,16 @@ def get_opponent(players, team):
     opponent_teams = [p['team'] for p in players if p['team'] != team]
     return opponent_teams[0] if opponent_teams else team
 
+# {encoder: {class label: code}}, so encoding is a dict lookup per value
+_encoder_lookups = weakref.WeakKeyDictionary()
+
 def encode_safe(encoder, value):
     """Safely encode categorical value"""
     try:
-        return encoder.transform([str(value)])[0]
+        lookup = _encoder_lookups.get(encoder)
+        if lookup is None:
+            lookup = {label: code for code, label in enumerate(encoder.classes_)}
+            _encoder_lookups[encoder] = lookup
+        return lookup.get(str(value), 0)
     except:
         return 0
@@ -0,0 +1,146 @@
+"""
+Columnar rolling-window feature store for the time-aware model (v2.0)
+Per-player prefix sums over the history index turn every player feature
+into an as-of lookup instead of a filter, sort and recompute per request
+"""
+import numpy as np
+from modules.history_index import PlayerHistoryIndex
+
+# Columns whose prefix sums (and sums of squares) back the player features
+STORE_COLUMNS = ['fantasy_points', 'runs', 'wickets', 'catches', 'balls_faced', 'fours', 'sixes']
+
+# Player-history features in the order extract_all_features produces them
+PLAYER_FEATURES = [
+    'avg_fp_last3', 'avg_fp_last5', 'avg_fp_last10', 'std_fp_last10', 'recent_form',
+    'career_avg_fp', 'career_matches',
+    'avg_runs_last5', 'avg_runs_last10', 'strike_rate', 'boundary_rate',
+    'avg_wickets_last5', 'avg_wickets_last10',
+    'avg_catches_last5'
+]
+
+# Weights of the exponentially weighted recent form over the last 5 matches
+FORM_WINDOW = 5
+FORM_WEIGHTS = np.exp(np.linspace(-1, 0, FORM_WINDOW))
+FORM_WEIGHTS /= FORM_WEIGHTS.sum()
+
+
+class PlayerFeatureStore:
+    """
+    As-of player features backed by a PlayerHistoryIndex
+
+    Registers prefix sums for STORE_COLUMNS plus per-row derived values
+    (strike rate, boundary rate, recent form ending at each row) on the
+    index, so every feature is a couple of searchsorted calls and O(1)
+    arithmetic per player.
+    """
+
+    def __init__(self, history_index):
+        self.index = history_index
+        data = history_index.data
+        n_rows = len(data)
+
+        def column(col):
+            if col in data.columns:
+                return data[col].values.astype(np.float64)
+            return np.zeros(n_rows)
+
+        for col in STORE_COLUMNS:
+            if col not in history_index.csum:
+                history_index.add_prefix_sums(col, column(col))
+
+        runs = column('runs')
+        balls = column('balls_faced')
+        fours = column('fours')
+        sixes = column('sixes')
+        fp = column('fantasy_points')
+
+        # Strike rate only counts matches where the player faced a ball
+        faced = balls > 0
+        strike_rate = np.zeros(n_rows)
+        strike_rate[faced] = runs[faced] / balls[faced] * 100
+        history_index.add_prefix_sums('strike_rate_row', strike_rate)
+        history_index.add_prefix_sums('faced_row', faced.astype(np.float64))
+
+        boundary_runs = fours * 4 + sixes * 6
+        history_index.add_prefix_sums('boundary_rate_row', boundary_runs / (runs + 0.1))
+
+        # Weighted form over the 5 matches ending at each row (nan if fewer)
+        offsets = np.arange(n_rows) - np.repeat(history_index.starts, history_index.ends - history_index.starts)
+        form = np.full(n_rows, np.nan)
+        full = np.flatnonzero(offsets >= FORM_WINDOW - 1)
+        if len(full):
+            acc = np.zeros(len(full))
+            for j in range(FORM_WINDOW):
+                acc += fp[full - (FORM_WINDOW - 1) + j] * FORM_WEIGHTS[j]
+            form[full] = acc / FORM_WEIGHTS.sum()
+        self.form_at_row = form
+
+    @classmethod
+    def from_history(cls, historical_data):
+        """Build a store together with its own history index"""
+        return cls(PlayerHistoryIndex(historical_data))
+
+    def _mean_last(self, col, starts, stops, k=None):
+        """Mean of col over the last min(k, n) rows of each range (all rows if k is None)"""
+        lo = starts if k is None else np.maximum(starts, stops - k)
+        csum = self.index.csum[col]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (csum[stops] - csum[lo]) / (stops - lo)
+
+    def player_features(self, player_ids, match_dates):
+        """
+        Player-history features for each player as of the paired match date
+
+        match_dates may be a single date shared by all players.
+
+        Returns:
+            tuple: (features, num_matches) where features maps each name in
+            PLAYER_FEATURES to an array aligned with player_ids; rows with
+            num_matches == 0 are undefined and need the caller's defaults
+        """
+        index = self.index
+        starts, stops = index.spans_for(player_ids, match_dates)
+        n = stops - starts
+        feats = {}
+
+        # Recent performance
+        feats['avg_fp_last3'] = self._mean_last('fantasy_points', starts, stops, 3)
+        feats['avg_fp_last5'] = self._mean_last('fantasy_points', starts, stops, 5)
+        feats['avg_fp_last10'] = self._mean_last('fantasy_points', starts, stops, 10)
+
+        # Population std of the last 10 matches, 0 until 10 are available
+        lo10 = np.maximum(starts, stops - 10)
+        total = index.csum['fantasy_points'][stops] - index.csum['fantasy_points'][lo10]
+        total_sq = index.csum_sq['fantasy_points'][stops] - index.csum_sq['fantasy_points'][lo10]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var = (total_sq - total * (total / 10)) / 10
+        feats['std_fp_last10'] = np.where(n >= 10, np.sqrt(np.maximum(var, 0.0)), 0)
+
+        career_avg = self._mean_last('fantasy_points', starts, stops)
+        last_row = np.maximum(stops - 1, 0)
+        form = self.form_at_row[last_row] if len(self.form_at_row) else np.full(len(n), np.nan)
+        feats['recent_form'] = np.where(n >= FORM_WINDOW, form, career_avg)
+
+        # Career stats
+        feats['career_avg_fp'] = career_avg
+        feats['career_matches'] = n
+
+        # Batting stats
+        feats['avg_runs_last5'] = self._mean_last('runs', starts, stops, 5)
+        feats['avg_runs_last10'] = self._mean_last('runs', starts, stops, 10)
+
+        lo5 = np.maximum(starts, stops - 5)
+        faced = index.csum['faced_row'][stops] - index.csum['faced_row'][lo5]
+        sr_total = index.csum['strike_rate_row'][stops] - index.csum['strike_rate_row'][lo5]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            feats['strike_rate'] = np.where(faced > 0, sr_total / faced, 120)
+        feats['boundary_rate'] = self._mean_last('boundary_rate_row', starts, stops, 5)
+
+        # Bowling stats
+        feats['avg_wickets_last5'] = self._mean_last('wickets', starts, stops, 5)
+        feats['avg_wickets_last10'] = self._mean_last('wickets', starts, stops, 10)
+
+        # Fielding stats
+        feats['avg_catches_last5'] = self._mean_last('catches', starts, stops, 5)
+
+        return feats, n
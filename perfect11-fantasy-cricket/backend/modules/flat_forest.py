@@ -0,0 +1,232 @@
+"""
+Tree ensemble packed into flat NumPy arrays
+Every tree's nodes are concatenated into one set of contiguous arrays
+(split feature, threshold, children, node value), so a batch of rows walks
+all trees at once: one vectorized step per tree level instead of sklearn's
+per-estimator dispatch and input validation. A build step saves the arrays
+as .npy files next to the pickled model; the backend memory-maps them
+while the model's content hash still matches.
+
+Build with:
+    python -m modules.flat_forest [model_path]
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import numpy as np
+
+FOREST_FORMAT = 1
+
+# Arrays saved in the artifact directory, one .npy each
+ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots')
+
+# Levels walked between dropping the rows that have reached a leaf
+COMPACT_EVERY = 4
+
+
+class FlatForest:
+    """
+    Regression forest (or single tree) as contiguous node arrays
+
+    Node ids are global: tree t's nodes start at roots[t]. Node i's children
+    are children[2i] (x > threshold) and children[2i + 1] (x <= threshold);
+    a leaf is its own child. Predictions are the mean of the reached
+    leaves' values, as in sklearn.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.n_features = n_features
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        Pack a fitted sklearn forest regressor or tree regressor
+
+        Returns:
+            FlatForest, or None if the model does not average sklearn trees
+        """
+        from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor
+        from sklearn.tree import BaseDecisionTree
+
+        if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+            trees = [estimator.tree_ for estimator in model.estimators_]
+        elif isinstance(model, BaseDecisionTree) and hasattr(model, 'tree_'):
+            trees = [model.tree_]
+        else:
+            return None
+        if any(tree.n_outputs != 1 or tree.value.shape[2] != 1 for tree in trees):
+            return None
+
+        roots = np.cumsum([0] + [tree.node_count for tree in trees[:-1]]).astype(np.intp)
+        feature, threshold, children = [], [], []
+        for root, tree in zip(roots, trees):
+            node = np.arange(tree.node_count) + root
+            is_leaf = tree.children_left < 0
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+            right = np.where(is_leaf, node, tree.children_right + root)
+            left = np.where(is_leaf, node, tree.children_left + root)
+            children.append(np.stack([right, left], axis=1).ravel())
+        return cls(
+            feature=np.concatenate(feature).astype(np.intp),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            children=np.concatenate(children).astype(np.intp),
+            value=np.concatenate([tree.value[:, 0, 0] for tree in trees]).astype(np.float64),
+            roots=roots,
+            n_features=int(trees[0].n_features)
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _walk(self, X, contributions=False):
+        """
+        Route every row down every tree together
+
+        Rows are compared as float32 like sklearn, so splits land identically.
+        With contributions, each step's value change is credited to the
+        split feature (Saabas).
+
+        Returns:
+            tuple: (leaf node ids (n_rows, n_trees), summed contributions
+            (n_rows, n_features) or None)
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32).ravel()
+        n = len(X) // self.n_features
+        # Offset of each (row, tree) pair's row in X, and in the contributions
+        offsets = np.repeat(np.arange(n) * self.n_features, self.n_trees)
+        node = np.tile(self.roots, n)
+        totals = np.zeros(n * self.n_features) if contributions else None
+
+        active = np.arange(len(node))
+        level = 0
+        while len(active):
+            at = node[active]
+            cell = offsets[active] + self.feature[at]
+            child = self.children[2 * at + (X[cell] <= self.threshold[at])]
+            if contributions:
+                totals += np.bincount(cell, weights=self.value[child] - self.value[at], minlength=len(totals))
+            node[active] = child
+            level += 1
+            if level % COMPACT_EVERY == 0:
+                active = active[self.children[2 * child] != child]
+
+        if contributions:
+            totals = totals.reshape(n, self.n_features)
+        return node.reshape(n, self.n_trees), totals
+
+    def tree_predictions(self, X):
+        """Every tree's prediction for every row, as (n_rows, n_trees)"""
+        leaves, _ = self._walk(X)
+        return self.value[leaves]
+
+    def predict(self, X):
+        """Mean leaf value over the trees per row"""
+        return self.tree_predictions(X).mean(axis=1)
+
+    def path_contributions(self, X):
+        """
+        Saabas decision-path attributions
+
+        Each split on a row's path credits its feature with the change in
+        node value, averaged over the trees, so per row
+        bias + contributions.sum() equals the prediction.
+
+        Returns:
+            tuple: (bias (n_rows,), contributions (n_rows, n_features))
+        """
+        _, totals = self._walk(X, contributions=True)
+        bias = np.full(len(totals), self.value[self.roots].mean())
+        return bias, totals / self.n_trees
+
+
+def model_hash(model_path):
+    """sha256 of the pickled model file (None if it is missing)"""
+    if not os.path.exists(model_path):
+        return None
+    h = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def forest_path_for(model_path):
+    """Default artifact directory of a pickled model"""
+    return os.path.splitext(model_path)[0] + '.forest'
+
+
+def build_forest(model_path='model_artifacts/ProductUI_Model.pkl', forest_path=None):
+    """
+    Pack the pickled model's trees and write them as .npy arrays
+
+    Returns:
+        str: path of the written artifact directory
+    """
+    import pickle
+
+    forest_path = forest_path or forest_path_for(model_path)
+    digest = model_hash(model_path)
+    if digest is None:
+        raise FileNotFoundError(f"Missing model {model_path}")
+
+    with open(model_path, 'rb') as f:
+        package = pickle.load(f)
+    forest = FlatForest.from_model(package['model'] if isinstance(package, dict) else package)
+    if forest is None:
+        raise ValueError(f"{model_path} is not a forest or tree regressor")
+
+    tmp_path = forest_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name in ARRAYS:
+        np.save(os.path.join(tmp_path, f'{name}.npy'), getattr(forest, name))
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump({'format': FOREST_FORMAT, 'model_sha256': digest, 'n_features': forest.n_features}, f)
+
+    shutil.rmtree(forest_path, ignore_errors=True)
+    os.replace(tmp_path, forest_path)
+    return forest_path
+
+
+def load_forest(model_path='model_artifacts/ProductUI_Model.pkl', forest_path=None):
+    """
+    Memory-map the packed forest if it is valid for the current model
+
+    Returns:
+        FlatForest, or None when there is no usable artifact
+    """
+    forest_path = forest_path or forest_path_for(model_path)
+    meta_path = os.path.join(forest_path, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta['format'] != FOREST_FORMAT:
+            print(f"[WARNING] {forest_path} has an old format - ignoring it")
+            return None
+        if meta['model_sha256'] != model_hash(model_path):
+            print(f"[WARNING] {forest_path} is stale (model changed) - ignoring it")
+            return None
+
+        # Plain ndarray views of the maps: indexing an np.memmap pays for the subclass on every call
+        arrays = {name: np.asarray(np.load(os.path.join(forest_path, f'{name}.npy'), mmap_mode='r')) for name in ARRAYS}
+        return FlatForest(n_features=int(meta['n_features']), **arrays)
+    except Exception as e:
+        print(f"[WARNING] Could not read {forest_path}: {e}")
+        return None
+
+
+if __name__ == '__main__':
+    path = build_forest(sys.argv[1] if len(sys.argv) > 1 else 'model_artifacts/ProductUI_Model.pkl')
+    print(f"[OK] Packed forest written: {path}")
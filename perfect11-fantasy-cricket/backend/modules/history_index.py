@@ -0,0 +1,191 @@
+"""
+Per-player as-of history index
+Built once from historical data so "last N matches before date D" is a
+searchsorted plus a slice instead of a boolean mask over the full table
+"""
+import numpy as np
+import pandas as pd
+
+
+def to_date_value(match_date):
+    """Convert a date-like value to the int64 nanosecond form used by the index"""
+    return pd.Timestamp(match_date).value
+
+
+class PlayerHistoryIndex:
+    """
+    Each player's rows stored contiguously and sorted by match_date, with
+    prefix sums over the numeric columns
+
+    Rows for player p live in [starts[k], ends[k]) of every array, where
+    k = positions[p]. Prefix sums are global, so the sum of a column over
+    any slice of one player's rows is csum[stop] - csum[start].
+    """
+
+    def __init__(self, historical_data, prefix_cols=('fantasy_points',)):
+        if len(historical_data) == 0:
+            data = pd.DataFrame({'player_id': pd.Series([], dtype=object),
+                                 'match_date': pd.Series([], dtype='datetime64[ns]')})
+        else:
+            data = historical_data.sort_values(['player_id', 'match_date'], kind='mergesort')
+        data = data.reset_index(drop=True)
+
+        self.data = data
+        self.dates = pd.to_datetime(data['match_date']).values.astype('datetime64[ns]').astype(np.int64)
+
+        player_ids = data['player_id'].values
+        if len(data):
+            boundaries = np.flatnonzero(player_ids[1:] != player_ids[:-1]) + 1
+            self.starts = np.concatenate([[0], boundaries]).astype(np.int64)
+            self.ends = np.concatenate([boundaries, [len(data)]]).astype(np.int64)
+        else:
+            self.starts = np.zeros(0, dtype=np.int64)
+            self.ends = np.zeros(0, dtype=np.int64)
+        self.player_ids = player_ids[self.starts]
+        self.positions = {pid: k for k, pid in enumerate(self.player_ids)}
+
+        # (player, date rank) keys let one searchsorted find every player's
+        # as-of boundary at once
+        self.unique_dates = np.unique(self.dates)
+        self._date_ranks = np.searchsorted(self.unique_dates, self.dates)
+        self._rank_stride = len(self.unique_dates) + 1
+        player_codes = np.repeat(np.arange(len(self.starts), dtype=np.int64), self.ends - self.starts)
+        self._keys = player_codes * self._rank_stride + self._date_ranks
+
+        self.columns = {}
+        self.csum = {}
+        self.csum_sq = {}
+        for col in prefix_cols:
+            if col not in data.columns:
+                continue
+            self.add_prefix_sums(col)
+
+    def __len__(self):
+        return len(self.data)
+
+    def add_prefix_sums(self, col, values=None):
+        """Register a column (or derived per-row values) and build its prefix sums"""
+        if values is None:
+            values = self.data[col].values
+        values = np.asarray(values, dtype=np.float64)
+        self.columns[col] = values
+        self.csum[col] = np.concatenate([[0.0], np.cumsum(values)])
+        self.csum_sq[col] = np.concatenate([[0.0], np.cumsum(values * values)])
+
+    def span(self, player_id, match_date):
+        """
+        Row range of a player's matches strictly before match_date
+
+        Returns:
+            tuple: (start, stop); empty when the player has no history
+        """
+        k = self.positions.get(player_id)
+        if k is None:
+            return 0, 0
+        start, end = self.starts[k], self.ends[k]
+        stop = start + np.searchsorted(self.dates[start:end], to_date_value(match_date), side='left')
+        return int(start), int(stop)
+
+    def date_rank(self, match_date):
+        """Number of distinct history dates strictly before match_date"""
+        return int(np.searchsorted(self.unique_dates, to_date_value(match_date), side='left'))
+
+    def spans_before(self, match_date):
+        """
+        Row ranges of every player's matches strictly before match_date
+
+        Returns:
+            tuple: (starts, stops) arrays aligned with player_ids
+        """
+        queries = np.arange(len(self.starts), dtype=np.int64) * self._rank_stride + self.date_rank(match_date)
+        stops = np.searchsorted(self._keys, queries, side='left')
+        return self.starts, stops
+
+    def spans_for(self, player_ids, match_dates):
+        """
+        Row ranges of each player's matches strictly before the paired date
+
+        match_dates may be a single date shared by all players. Players
+        missing from the index get an empty range.
+
+        Returns:
+            tuple: (starts, stops) arrays aligned with player_ids
+        """
+        codes = np.array([self.positions.get(pid, -1) for pid in player_ids], dtype=np.int64)
+        date_values = pd.to_datetime(pd.Series(match_dates) if np.ndim(match_dates) else [match_dates])
+        date_values = date_values.values.astype('datetime64[ns]').astype(np.int64)
+        ranks = np.searchsorted(self.unique_dates, date_values, side='left')
+
+        known = codes >= 0
+        starts = np.zeros(len(codes), dtype=np.int64)
+        stops = np.zeros(len(codes), dtype=np.int64)
+        starts[known] = self.starts[codes[known]]
+        queries = codes * self._rank_stride + ranks
+        stops[known] = np.searchsorted(self._keys, queries[known], side='left')
+        return starts, stops
+
+    def windows_stats(self, starts, stops, col='fantasy_points', ddof=1):
+        """Vectorized window_stats over aligned arrays of row ranges"""
+        n = stops - starts
+        total = self.csum[col][stops] - self.csum[col][starts]
+        total_sq = self.csum_sq[col][stops] - self.csum_sq[col][starts]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(n > 0, total / n, np.nan)
+            var = np.where(n > ddof, (total_sq - total * mean) / (n - ddof), np.nan)
+        return mean, np.sqrt(np.maximum(var, 0.0))
+
+    def last_n_stats_all(self, match_date, n, col='fantasy_points', ddof=1):
+        """
+        Vectorized last_n_stats for every player in the index
+
+        Returns:
+            tuple: (num_matches_before, mean, std) arrays aligned with player_ids
+        """
+        starts, stops = self.spans_before(match_date)
+        mean, std = self.windows_stats(np.maximum(starts, stops - n), stops, col=col, ddof=ddof)
+        return stops - starts, mean, std
+
+    def players_before(self, match_date):
+        """Ids of players with at least one match before match_date"""
+        first_dates = self.dates[self.starts]
+        return self.player_ids[first_dates < to_date_value(match_date)]
+
+    def count_before(self, player_id, match_date):
+        """Number of matches a player has played before match_date"""
+        start, stop = self.span(player_id, match_date)
+        return stop - start
+
+    def last_n(self, player_id, match_date, n, col='fantasy_points'):
+        """Values of col for the player's last n matches before match_date (oldest first)"""
+        start, stop = self.span(player_id, match_date)
+        return self.columns[col][max(start, stop - n):stop]
+
+    def window_stats(self, start, stop, col='fantasy_points', ddof=1):
+        """
+        Mean and std of col over rows [start, stop) using prefix sums
+
+        Returns:
+            tuple: (mean, std); (nan, nan) for an empty window and std nan
+            when the window has no more than ddof rows
+        """
+        n = stop - start
+        if n <= 0:
+            return np.nan, np.nan
+        total = self.csum[col][stop] - self.csum[col][start]
+        total_sq = self.csum_sq[col][stop] - self.csum_sq[col][start]
+        mean = total / n
+        if n <= ddof:
+            return mean, np.nan
+        var = (total_sq - total * mean) / (n - ddof)
+        return mean, np.sqrt(max(var, 0.0))
+
+    def last_n_stats(self, player_id, match_date, n, col='fantasy_points', ddof=1):
+        """
+        Count, mean and std of col over the player's last n matches before match_date
+
+        Returns:
+            tuple: (num_matches_before, mean, std)
+        """
+        start, stop = self.span(player_id, match_date)
+        mean, std = self.window_stats(max(start, stop - n), stop, col=col, ddof=ddof)
+        return stop - start, mean, std
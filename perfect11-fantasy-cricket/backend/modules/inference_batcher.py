@@ -0,0 +1,183 @@
+"""
+Cross-request micro-batching of model inference
+Concurrent /predict threads hand their feature rows to one dispatcher
+thread, which scores every queued request for the same model in a single
+call and hands each caller its slice back. A lone request is dispatched at
+once; the dispatcher only lingers (up to max_wait_ms) for more rows while
+requests are actually arriving together, so batching does not add latency
+at low load
+"""
+import threading
+import time
+from collections import deque
+import numpy as np
+
+# Upper edges of the batch-size histogram buckets (requests per batch)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16)
+
+# Seconds a waiting caller sleeps between checks that the dispatcher is alive
+DISPATCHER_CHECK_S = 1.0
+
+
+class InferenceBatcher:
+    """
+    Queue of inference requests served by one dispatcher thread
+
+    Requests with the same key (one model, one output kind) are
+    concatenated and evaluated with the first request's function; keys
+    never mix in one call.
+    """
+
+    def __init__(self, max_wait_ms=2.0, max_rows=512):
+        self.max_wait_ms = max_wait_ms
+        self.max_rows = max_rows
+        self._queue = deque()
+        self._queued_rows = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._last_batch_requests = 1
+        self.dispatcher_restarts = 0
+
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = {f'<={edge}': 0 for edge in BATCH_SIZE_BUCKETS}
+        self.batch_sizes[f'>{BATCH_SIZE_BUCKETS[-1]}'] = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.compute_ms_total = 0.0
+
+    def submit(self, key, X, fn):
+        """
+        Evaluate fn on X as part of a batch
+
+        Args:
+            key: Requests sharing a key are scored together
+            X: (n_rows, n_features) array
+            fn: Scores a stacked (rows, n_features) array, returning one
+                output row per input row
+
+        Returns:
+            np.ndarray: fn's output rows for X
+        """
+        request = {'key': key, 'X': np.asarray(X), 'fn': fn, 'done': threading.Event(),
+                   'result': None, 'error': None, 'enqueued': time.perf_counter()}
+        with self._cond:
+            self._ensure_dispatcher()
+            self._queue.append(request)
+            self._queued_rows += len(request['X'])
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._cond.notify()
+
+        # Never wait on a dead dispatcher: a queued request restarts it, one
+        # it had already taken can no longer be answered
+        while not request['done'].wait(DISPATCHER_CHECK_S):
+            with self._cond:
+                if request['done'].is_set() or self._thread.is_alive():
+                    continue
+                if any(queued is request for queued in self._queue):
+                    self._ensure_dispatcher()
+                    continue
+            raise RuntimeError("Inference dispatcher stopped before scoring this request")
+        if request['error'] is not None:
+            raise request['error']
+        return request['result']
+
+    def _ensure_dispatcher(self):
+        """Start the dispatcher thread if it is not running (call holding self._cond)"""
+        # Also restarts it in a forked child, where the parent's thread does not exist
+        if self._thread is None or not self._thread.is_alive():
+            if self._thread is not None:
+                self.dispatcher_restarts += 1
+                print("[WARNING] Inference dispatcher was not running - restarting it")
+            self._thread = threading.Thread(target=self._dispatch, name='inference-batcher', daemon=True)
+            self._thread.start()
+
+    def _take_batch(self):
+        """Wait for work, linger for more if requests are arriving together, then dequeue a batch"""
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+
+            if self._last_batch_requests > 1 and self.max_wait_ms > 0:
+                deadline = self._queue[0]['enqueued'] + self.max_wait_ms / 1000
+                while self._queued_rows < self.max_rows:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            batch = [self._queue.popleft()]
+            rows = len(batch[0]['X'])
+            while self._queue and rows + len(self._queue[0]['X']) <= self.max_rows:
+                request = self._queue.popleft()
+                rows += len(request['X'])
+                batch.append(request)
+            self._queued_rows -= rows
+            self._last_batch_requests = len(batch)
+            return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self._run_batch(batch)
+            finally:
+                # Every caller of the batch is woken, even if the dispatcher is dying
+                for request in batch:
+                    if request['result'] is None and request['error'] is None:
+                        request['error'] = RuntimeError("Inference batch did not complete")
+                    request['done'].set()
+
+    def _run_batch(self, batch):
+        """Score one batch, one fn call per key, and record its stats"""
+        started = time.perf_counter()
+
+        groups = {}
+        for request in batch:
+            groups.setdefault(request['key'], []).append(request)
+        for requests in groups.values():
+            try:
+                outputs = requests[0]['fn'](np.concatenate([request['X'] for request in requests]))
+                bounds = np.cumsum([0] + [len(request['X']) for request in requests])
+                for request, start, stop in zip(requests, bounds[:-1], bounds[1:]):
+                    request['result'] = outputs[start:stop]
+            except Exception as e:
+                for request in requests:
+                    request['error'] = e
+
+        finished = time.perf_counter()
+        with self._cond:
+            self.batches += 1
+            self.requests += len(batch)
+            self.rows += sum(len(request['X']) for request in batch)
+            bucket = next((f'<={edge}' for edge in BATCH_SIZE_BUCKETS if len(batch) <= edge),
+                          f'>{BATCH_SIZE_BUCKETS[-1]}')
+            self.batch_sizes[bucket] += 1
+            for request in batch:
+                wait_ms = (started - request['enqueued']) * 1000
+                self.wait_ms_total += wait_ms
+                self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            self.compute_ms_total += (finished - started) * 1000
+
+    def stats(self):
+        """Queue depth, batch sizes and timings"""
+        with self._cond:
+            return {
+                'max_wait_ms': self.max_wait_ms,
+                'max_rows': self.max_rows,
+                'queue_depth': len(self._queue),
+                'queued_rows': self._queued_rows,
+                'max_queue_depth': self.max_queue_depth,
+                'dispatcher_restarts': self.dispatcher_restarts,
+                'requests': self.requests,
+                'rows': self.rows,
+                'batches': self.batches,
+                'mean_batch_requests': round(self.requests / self.batches, 3) if self.batches else 0.0,
+                'mean_batch_rows': round(self.rows / self.batches, 2) if self.batches else 0.0,
+                'batch_sizes': dict(self.batch_sizes),
+                'mean_wait_ms': round(self.wait_ms_total / self.requests, 3) if self.requests else 0.0,
+                'max_wait_ms_seen': round(self.wait_ms_max, 3),
+                'mean_compute_ms': round(self.compute_ms_total / self.batches, 3) if self.batches else 0.0
+            }
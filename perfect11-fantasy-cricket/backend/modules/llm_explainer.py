@@ -2,21 +2,33 @@
 LLM-powered explanations using OpenAI API for predictions and calculations
 """
 import os
+import threading
 from typing import Dict, List
-from openai import OpenAI
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
-# Initialize OpenAI client
+# OpenAI client, created on first use so importing this module stays cheap
 client = None
-try:
-    api_key = os.getenv('OPENAI_API_KEY')
-    if api_key:
-        client = OpenAI(api_key=api_key)
-except Exception as e:
-    print(f"Warning: OpenAI initialization failed: {e}")
+_client_initialized = False
+_client_lock = threading.Lock()
+
+def get_client():
+    """Create the OpenAI client on first call (None if not configured)"""
+    global client, _client_initialized
+    with _client_lock:
+        if _client_initialized:
+            return client
+        _client_initialized = True
+        try:
+            from dotenv import load_dotenv
+
+            # Load environment variables
+            load_dotenv()
+            api_key = os.getenv('OPENAI_API_KEY')
+            if api_key:
+                from openai import OpenAI
+                client = OpenAI(api_key=api_key)
+        except Exception as e:
+            print(f"Warning: OpenAI initialization failed: {e}")
+    return client
 
 def call_openai(system_prompt: str, user_prompt: str, max_tokens: int = 600) -> str:
     """
@@ -30,6 +42,7 @@ def call_openai(system_prompt: str, user_prompt: str, max_tokens: int = 600) ->
     Returns:
         str: Generated explanation
     """
+    client = get_client()
     if not client:
         return "OpenAI API not configured. Please set OPENAI_API_KEY in .env file."
 
@@ -0,0 +1,216 @@
+"""
+Registry of loaded model versions
+One version serves by default (active); a candidate can be loaded next to
+it and given a share of the traffic for A/B comparison. A new package is
+loaded and warmed (packed forest, timed explainer) in a background thread,
+then swapped in with one reference assignment: requests in flight finish on
+the version they started with, and caches that do not depend on the model
+stay warm
+"""
+import hashlib
+import pickle
+import random
+import threading
+import time
+from modules.flat_forest import FlatForest, load_forest
+from modules.explainer import build_explainer
+
+ARMS = ('active', 'candidate')
+
+# Routing keys are hashed into this many buckets; the candidate gets the
+# first candidate_percent of them
+ROUTE_BUCKETS = 10000
+
+
+def load_model_version(path):
+    """
+    Load a pickled model package and build what serving it needs
+
+    The version id is a prefix of the package file's sha256, so reloading
+    an unchanged file gives the same version (and reuses its cache entries).
+
+    Returns:
+        dict: version, path, name, package, forest (FlatForest or None),
+        explainer (ModelExplainer or None) and loaded_at
+    """
+    with open(path, 'rb') as f:
+        payload = f.read()
+    package = pickle.loads(payload)
+    for key in ('model', 'feature_cols', 'label_encoders'):
+        if key not in package:
+            raise ValueError(f"{path} is not a model package (no '{key}')")
+
+    forest = load_forest(path)
+    if forest is not None:
+        print(f"[OK] Using packed forest artifact for {path}")
+    else:
+        forest = FlatForest.from_model(package['model'])
+
+    return {
+        'version': hashlib.sha256(payload).hexdigest()[:12],
+        'path': path,
+        'name': package.get('model_name', 'unknown'),
+        'package': package,
+        'forest': forest,
+        'explainer': build_explainer(package['model'], len(package['feature_cols']), forest=forest),
+        'loaded_at': time.time()
+    }
+
+
+def describe(version):
+    """JSON-safe summary of a loaded version (None for no version)"""
+    if version is None:
+        return None
+    return {
+        'version': version['version'],
+        'name': version['name'],
+        'path': version['path'],
+        'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(version['loaded_at'])),
+        'attribution': version['explainer'].stats() if version['explainer'] else None
+    }
+
+
+class ModelRegistry:
+    """
+    Active and candidate model versions with atomic swaps
+
+    Readers take self.active / self.candidate once per request and use that
+    version throughout; writers replace the references under the lock.
+    """
+
+    def __init__(self, loader=load_model_version):
+        self.loader = loader
+        self.active = None
+        self.candidate = None
+        self.candidate_percent = 0.0
+        self.served = {arm: 0 for arm in ARMS}
+        self.last_load = None
+        self._loading = False
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def load(self, path, arm='active', percent=None, background=True):
+        """
+        Load a model package into an arm
+
+        In the background the current versions keep serving until the new
+        one is ready; a failed load leaves them in place. percent sets the
+        candidate's traffic share once it is installed.
+
+        Returns:
+            bool: False if another load is still running
+        """
+        if arm not in ARMS:
+            raise ValueError(f"arm must be one of {', '.join(ARMS)}")
+        with self._lock:
+            if self._loading:
+                return False
+            self._loading = True
+            self.last_load = {'path': path, 'arm': arm, 'status': 'loading', 'started_at': time.time()}
+
+        if background:
+            threading.Thread(target=self._load, args=(path, arm, percent), name='model-load', daemon=True).start()
+        else:
+            self._load(path, arm, percent)
+        return True
+
+    def _load(self, path, arm, percent):
+        status = {'status': 'failed'}
+        try:
+            version = self.loader(path)
+            with self._lock:
+                self._install(version, arm, percent)
+            status = {'status': 'loaded', 'version': version['version']}
+            print(f"[OK] Model {version['version']} ({version['name']}) is now {arm}")
+        except Exception as e:
+            status['error'] = str(e)
+            print(f"[WARNING] Could not load model {path}: {e}")
+        finally:
+            with self._lock:
+                self.last_load = dict(self.last_load, finished_at=time.time(), **status)
+                self._loading = False
+
+    def _install(self, version, arm, percent):
+        if arm == 'active':
+            self.active = version
+        else:
+            self.candidate = version
+            if percent is not None:
+                self.candidate_percent = float(percent)
+        self._loaded = {v['version']: v for v in (self.active, self.candidate) if v is not None}
+
+    def promote(self):
+        """Make the candidate the active version; False if there is none"""
+        with self._lock:
+            if self.candidate is None:
+                return False
+            self.active, self.candidate, self.candidate_percent = self.candidate, None, 0.0
+            self._loaded = {self.active['version']: self.active}
+            return True
+
+    def drop_candidate(self):
+        """Stop serving the candidate"""
+        with self._lock:
+            self.candidate, self.candidate_percent = None, 0.0
+            self._loaded = {v['version']: v for v in (self.active,) if v is not None}
+
+    def set_percent(self, percent):
+        """Share of routed traffic (0-100) served by the candidate"""
+        percent = float(percent)
+        if not 0 <= percent <= 100:
+            raise ValueError("percent must be between 0 and 100")
+        with self._lock:
+            self.candidate_percent = percent
+
+    def route(self, key=None):
+        """
+        Version serving one request
+
+        key is the routing header: 'active' or 'candidate' picks that arm,
+        any other value is hashed so the same key always lands on the same
+        arm; without one the arm is drawn at random.
+
+        Returns:
+            tuple: (arm, version)
+        """
+        with self._lock:
+            active, candidate, percent = self.active, self.candidate, self.candidate_percent
+        if candidate is None:
+            arm = 'active'
+        elif key in ARMS:
+            arm = key
+        else:
+            if key:
+                bucket = int(hashlib.sha1(key.encode()).hexdigest()[:8], 16) % ROUTE_BUCKETS
+            else:
+                bucket = random.randrange(ROUTE_BUCKETS)
+            arm = 'candidate' if bucket < percent * ROUTE_BUCKETS / 100 else 'active'
+        with self._lock:
+            self.served[arm] += 1
+        return arm, candidate if arm == 'candidate' else active
+
+    def resolve(self, version_id, path):
+        """
+        A version by id, loading it from path if this process lacks it
+
+        Batch workers forked before a swap use this to catch up.
+        """
+        version = self._loaded.get(version_id)
+        if version is None:
+            version = self.loader(path)
+            if version['version'] != version_id:
+                raise RuntimeError(f"{path} is no longer model version {version_id}")
+            self._loaded = {v['version']: v for v in (self.active, self.candidate, version) if v is not None}
+        return version
+
+    def stats(self):
+        """Loaded versions, traffic split, requests served per arm and the last load"""
+        with self._lock:
+            return {
+                'active': describe(self.active),
+                'candidate': describe(self.candidate),
+                'candidate_percent': self.candidate_percent,
+                'served': dict(self.served),
+                'loading': self._loading,
+                'last_load': self.last_load
+            }
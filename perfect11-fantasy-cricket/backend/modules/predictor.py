@@ -2,23 +2,94 @@
 ML model inference
 """
 import numpy as np
+import pandas as pd
+from modules.flat_forest import FlatForest
 
-def predict_fantasy_points(player_features, model, feature_cols):
+# Percentiles of the per-tree predictions reported as a player's interval
+INTERVAL_PERCENTILES = (10, 90)
+
+def _predict_rows(values, model, feature_cols, forest, intervals):
+    """Per row: [mean] or with intervals [mean, std, p10, p90], as an (n, 1|4) array"""
+    if forest is not None:
+        per_tree = forest.tree_predictions(values)
+        predictions = per_tree.mean(axis=1)
+    else:
+        predictions = model.predict(pd.DataFrame(values, columns=feature_cols))
+        per_tree = predictions[:, None]
+    if not intervals:
+        return predictions[:, None]
+    low, high = np.percentile(per_tree, INTERVAL_PERCENTILES, axis=1)
+    return np.column_stack([predictions, per_tree.std(axis=1), low, high])
+
+
+def predict_fantasy_points(player_features, model, feature_cols, intervals=False, forest=None, cache=None,
+                           batcher=None):
     """
     Predict fantasy points for all players
 
+    Given the model's FlatForest (built or memory-mapped at load), every
+    tree is evaluated in one vectorized walk instead of model.predict; the
+    result matches sklearn to float tolerance. With intervals, also return
+    the spread of the ensemble's trees for every player (the forest is
+    packed here if none is passed). Models that are not tree ensembles get
+    zero spread. cache is a RowCache view of the model's version; only rows
+    it has not seen are evaluated. With an InferenceBatcher those rows are
+    scored in one call together with other requests' rows.
+
     Returns:
-        dict: {player_id: predicted_fp}
+        dict: {player_id: predicted_fp}, or with intervals a tuple of that
+        and {player_id: {'std', 'p10', 'p90'}}
     """
     # Ensure correct column order
     X = player_features[feature_cols].fillna(0)
 
     # Predict
-    predictions = model.predict(X)
+    if forest is None and intervals:
+        forest = FlatForest.from_model(model)
+
+    def evaluate(values):
+        if batcher is None:
+            return _predict_rows(values, model, feature_cols, forest, intervals)
+        return batcher.submit((id(model), intervals), values,
+                              lambda batch: _predict_rows(batch, model, feature_cols, forest, intervals))
+
+    values = X.values.astype(np.float64)
+    if cache is not None:
+        keys, cached = cache.fetch('prediction/intervals' if intervals else 'prediction', values)
+        outputs = cache.fill(keys, cached, lambda rows: evaluate(values[rows]))
+    else:
+        outputs = evaluate(values)
 
     # Map back to player_ids
     prediction_map = {}
     for idx, player_id in enumerate(player_features['player_id']):
-        prediction_map[player_id] = float(predictions[idx])
+        prediction_map[player_id] = float(outputs[idx, 0])
+
+    if not intervals:
+        return prediction_map
+
+    interval_map = {}
+    for player_id, (_, s, lo, hi) in zip(player_features['player_id'], outputs.tolist()):
+        interval_map[player_id] = {'std': s, 'p10': lo, 'p90': hi}
+
+    return prediction_map, interval_map
+
+
+def predict_fantasy_points_by_match(player_features, model, feature_cols, forest=None):
+    """
+    Predict fantasy points for a multi-match feature matrix in one model call
+
+    player_features is the output of create_features_for_batch_v2. forest
+    is the model's FlatForest, as for predict_fantasy_points.
+
+    Returns:
+        dict: {match_index: {player_id: predicted_fp}}
+    """
+    X = player_features[feature_cols].fillna(0)
+    predictions = forest.predict(X.values) if forest is not None else model.predict(X)
+
+    prediction_maps = {}
+    for match_index, player_id, pred in zip(player_features['match_index'], player_features['player_id'], predictions):
+        prediction_maps.setdefault(match_index, {})[player_id] = float(pred)
 
-    return prediction_map
+    return prediction_maps
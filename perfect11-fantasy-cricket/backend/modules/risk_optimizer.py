@@ -0,0 +1,158 @@
+"""
+Risk-aware XI selection with Monte Carlo scenarios
+The mean-optimal XI ignores how volatile its players are. Here every
+player's FP is sampled from its predicted mean and recent spread
+(std_fp_last10) in one vectorized pass, candidate lineups come from the
+exact solver, and the lineup with the best risk objective over the joint
+scenarios is returned
+"""
+import time
+import numpy as np
+from modules.constraints_solver import select_top_k_xis, build_result, team_total, DEFAULT_PROFILE
+
+RISK_OBJECTIVES = ('quantile', 'prob_above')
+
+DEFAULT_SCENARIOS = 10000
+DEFAULT_QUANTILE = 0.2
+
+# Spread assumed when a player has no std (std_fp_last10 is 0 below 10
+# matches): the median std/mean ratio of players with 10+ matches is ~0.9
+FALLBACK_CV = 0.9
+
+# Lowest FP a player scores in the history (a duck)
+FP_FLOOR = -4.0
+
+# Share of a player's variance common to the whole team in a match
+# (conditions, batting first, collapses)
+TEAM_CORRELATION = 0.15
+
+# Candidate lineups: the best by mean, plus the best few by mean + tilt * std
+# for each tilt, which reach the safe (tilt < 0) and upside (tilt > 0) XIs
+MEAN_CANDIDATES = 10
+TILTS = (-1.5, -1.0, -0.5, 0.5, 1.0, 1.5)
+TILT_CANDIDATES = 5
+
+
+def sample_scenarios(means, stds, teams, n_scenarios=DEFAULT_SCENARIOS, seed=0):
+    """
+    Joint FP scenarios for a set of players
+
+    Each player's FP is normal around its mean with a team-level factor
+    shared by team-mates, floored at FP_FLOOR. Zero spreads fall back to
+    FALLBACK_CV * mean.
+
+    Returns:
+        np.ndarray: (n_scenarios, n_players) float32 scenario matrix
+    """
+    means = np.asarray(means, dtype=np.float64)
+    stds = np.asarray(stds, dtype=np.float64)
+    stds = np.where(stds > 0, stds, FALLBACK_CV * np.abs(means))
+    _, team_idx = np.unique(np.asarray(teams, dtype=str), return_inverse=True)
+
+    rng = np.random.default_rng(seed)
+    shocks = rng.standard_normal((n_scenarios, len(means) + team_idx.max() + 1), dtype=np.float32)
+    z = np.sqrt(1 - TEAM_CORRELATION) * shocks[:, :len(means)] + np.sqrt(TEAM_CORRELATION) * shocks[:, len(means) + team_idx]
+    return np.maximum(means + stds * z, FP_FLOOR).astype(np.float32)
+
+
+def risk_objective(totals, objective='quantile', quantile=DEFAULT_QUANTILE, threshold=None):
+    """
+    Objective of each candidate's scenario totals (higher is better)
+
+    Args:
+        totals: (n_scenarios, n_candidates) team scores
+        objective: 'quantile' (the given quantile of the team score) or
+            'prob_above' (probability the team score beats threshold)
+
+    Returns:
+        np.ndarray: one value per candidate
+    """
+    if objective == 'quantile':
+        return np.quantile(totals, quantile, axis=0)
+    if objective == 'prob_above':
+        return (totals > threshold).mean(axis=0)
+    raise ValueError(f"Unknown risk objective: {objective}")
+
+
+def select_risk_aware_xi(player_data, team1, team2, objective='quantile', quantile=DEFAULT_QUANTILE, threshold=None,
+                         n_scenarios=DEFAULT_SCENARIOS, std_key='std_fp', score_key='predicted_fp', seed=0,
+                         profile=None, solver_cache=None, time_limit=None):
+    """
+    XI with the best risk objective over Monte Carlo scenarios
+
+    Candidates are exact top-K lineups for the mean and for mean +/- std
+    tilted scores; all of them are scored on the same scenarios in one
+    matrix product, captain and vice-captain on each lineup's top two by
+    mean (as picked before the match). With a time_limit (seconds) the
+    candidate search stops when it runs out and the best candidate found
+    so far is returned.
+
+    Returns:
+        dict: result as from select_optimal_xi plus 'risk' with the
+        objective value, the mean XI's value, and the chosen XI's expected
+        FP and P10/P90 over the scenarios
+    """
+    if objective not in RISK_OBJECTIVES:
+        raise ValueError(f"Unknown risk objective: {objective}")
+    if objective == 'quantile' and not 0 < quantile < 1:
+        raise ValueError("quantile must be between 0 and 1")
+    if objective == 'prob_above' and threshold is None:
+        raise ValueError("prob_above needs a threshold")
+
+    profile = profile or DEFAULT_PROFILE
+    multipliers = profile['multipliers']
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    lineups = select_top_k_xis(player_data, team1, team2, k=MEAN_CANDIDATES, score_key=score_key,
+                               solver_cache=solver_cache, profile=profile, time_limit=time_limit)
+    if not lineups:
+        timed_out = deadline is not None and time.perf_counter() >= deadline
+        return build_result([], team1, team2, score_key, 'Not Solved' if timed_out else 'Infeasible', multipliers, profile)
+
+    means = np.array([float(p[score_key]) for p in player_data])
+    stds = np.array([float(p.get(std_key) or 0.0) for p in player_data])
+    stds = np.where(stds > 0, stds, FALLBACK_CV * np.abs(means))
+    for tilt in TILTS:
+        remaining = None if deadline is None else deadline - time.perf_counter()
+        if remaining is not None and remaining <= 0:
+            break
+        tilted = [dict(p, risk_score=float(m + tilt * s)) for p, m, s in zip(player_data, means, stds)]
+        lineups += select_top_k_xis(tilted, team1, team2, k=TILT_CANDIDATES, score_key='risk_score', profile=profile,
+                                    time_limit=remaining)
+
+    # One weight row per distinct lineup: 1 per player, the multipliers on its top scorers by mean
+    position = {p['player_id']: i for i, p in enumerate(player_data)}
+    candidates, weights, seen = [], [], set()
+    for lineup in lineups:
+        ids = frozenset(p['player_id'] for p in lineup['selected_players'])
+        if ids in seen:
+            continue
+        seen.add(ids)
+        players = [player_data[position[pid]] for pid in ids]
+        captain, vice_captain, _ = team_total(players, score_key, multipliers)
+        row = np.zeros(len(player_data), dtype=np.float32)
+        row[[position[pid] for pid in ids]] = 1.0
+        for multiplier, leader in zip(multipliers, (captain, vice_captain)):
+            row[position[leader['player_id']]] = multiplier
+        candidates.append(players)
+        weights.append(row)
+
+    scenarios = sample_scenarios(means, stds, [p['team'] for p in player_data], n_scenarios, seed)
+    totals = scenarios @ np.array(weights).T
+    values = risk_objective(totals, objective, quantile, threshold)
+    best = int(np.argmax(values))
+
+    status = 'Optimal' if all(lineup['status'] == 'Optimal' for lineup in lineups) else 'Feasible'
+    result = build_result(candidates[best], team1, team2, score_key, status, multipliers, profile)
+    result['risk'] = {
+        'objective': objective,
+        'quantile': quantile if objective == 'quantile' else None,
+        'threshold': threshold if objective == 'prob_above' else None,
+        'n_scenarios': n_scenarios,
+        'candidates': len(candidates),
+        'value': float(values[best]),
+        'mean_xi_value': float(values[0]),
+        'expected_fp': float(totals[:, best].mean()),
+        'p10_fp': float(np.quantile(totals[:, best], 0.1)),
+        'p90_fp': float(np.quantile(totals[:, best], 0.9))
+    }
+    return result
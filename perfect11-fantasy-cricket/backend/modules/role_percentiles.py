@@ -0,0 +1,130 @@
+"""
+Materialized role-percentile snapshots for credits calculation
+Sorted composite-score arrays per (role, as-of date), built lazily and kept
+in a memory-bounded LRU cache so a percentile is a bisection
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+def composite_scores(mu, std):
+    """Composite score used for credits: rewards form, penalizes volatility"""
+    std = np.where(np.isnan(std), 0, std)
+    return 0.7 * mu + 0.3 * (mu - std)
+
+
+class RolePercentileSnapshots:
+    """
+    Cache of sorted composite scores of every player with >= min_matches
+    matches before an as-of date, split by role
+
+    Snapshots are keyed by (role, year, date rank), where the date rank is the
+    number of distinct history dates before the as-of date, so any two dates
+    with the same prior history share a snapshot. The year is part of the key
+    because role assignment is per season.
+    """
+
+    def __init__(self, history_index, role_resolver,
+                 min_matches=10, max_bytes=16 * 1024 * 1024, max_snapshots=4096):
+        self.history_index = history_index
+        self.role_resolver = role_resolver
+        self.min_matches = min_matches
+        self.max_bytes = max_bytes
+        self.max_snapshots = max_snapshots
+
+        self._snapshots = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, role, match_date):
+        return role, pd.Timestamp(match_date).year, self.history_index.date_rank(match_date)
+
+    def scores(self, role, match_date):
+        """Sorted composite scores for role as of match_date"""
+        key = self._key(role, match_date)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                self._snapshots.move_to_end(key)
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+
+        by_role = self._materialize(match_date)
+        if role not in by_role:
+            # Remember that the role has no eligible players at this date
+            empty = np.zeros(0)
+            with self._lock:
+                self._store(key, empty)
+            return empty
+        return by_role[role]
+
+    def percentile(self, role, match_date, composite_score):
+        """
+        Percentage of same-role players whose composite score is strictly lower
+
+        Returns:
+            float: percentile, or 50 when the role has no eligible players
+        """
+        scores = self.scores(role, match_date)
+        if len(scores) == 0:
+            return 50  # Default to median
+        below = np.searchsorted(scores, composite_score, side='left')
+        return (below / len(scores)) * 100
+
+    def precompute(self, match_dates):
+        """Materialize snapshots for every role at each of match_dates"""
+        for match_date in match_dates:
+            self._materialize(match_date)
+
+    def precompute_season(self, year):
+        """Materialize snapshots for every match date in the history for a calendar year"""
+        dates = pd.to_datetime(self.history_index.unique_dates)
+        self.precompute(dates[dates.year == int(year)])
+
+    def stats(self):
+        """Cache size and hit/miss counters"""
+        with self._lock:
+            return {
+                'snapshots': len(self._snapshots),
+                'bytes': self._nbytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _materialize(self, match_date):
+        """Build and cache the snapshots of every role at match_date"""
+        by_role = self._build(match_date)
+        _, year, rank = self._key(None, match_date)
+        with self._lock:
+            for role, arr in by_role.items():
+                self._store((role, year, rank), arr)
+        return by_role
+
+    def _build(self, match_date):
+        """Composite scores of all eligible players as of match_date, grouped by role"""
+        index = self.history_index
+        year = pd.Timestamp(match_date).year
+        num_matches, mu, std = index.last_n_stats_all(match_date, self.min_matches)
+        eligible = num_matches >= self.min_matches
+
+        player_ids = index.player_ids[eligible]
+        scores = composite_scores(mu[eligible], std[eligible])
+        roles = self.role_resolver.resolve_roles(player_ids, year)
+
+        return {role: np.sort(scores[roles == role]) for role in np.unique(roles)}
+
+    def _store(self, key, arr):
+        old = self._snapshots.pop(key, None)
+        if old is not None:
+            self._nbytes -= old.nbytes
+        self._snapshots[key] = arr
+        self._nbytes += arr.nbytes
+        while len(self._snapshots) > 1 and (self._nbytes > self.max_bytes or
+                                            len(self._snapshots) > self.max_snapshots):
+            _, evicted = self._snapshots.popitem(last=False)
+            self._nbytes -= evicted.nbytes
@@ -0,0 +1,56 @@
+"""
+Player role resolution backed by hash indexes
+Built once from the role CSVs so lookups don't filter DataFrames per call
+"""
+import numpy as np
+
+
+class RoleResolver:
+    """
+    Resolve a player's role for a season with a global fallback
+
+    Mirrors get_player_role: the first (player_id, season) row wins, then the
+    first global row for the player, then default_role.
+    """
+
+    def __init__(self, roles_by_season, roles_global, default_role='BAT'):
+        self.default_role = default_role
+
+        self.season_roles = {}
+        if len(roles_by_season):
+            for pid, season, role in zip(roles_by_season['player_id'].values,
+                                         roles_by_season['season'].values,
+                                         roles_by_season['role'].values):
+                self.season_roles.setdefault((pid, int(season)), role)
+
+        self.global_roles = {}
+        if len(roles_global):
+            for pid, role in zip(roles_global['player_id'].values, roles_global['role'].values):
+                self.global_roles.setdefault(pid, role)
+
+    def resolve(self, player_id, year):
+        """Role of a single player for a season"""
+        role = self.season_roles.get((player_id, int(year)))
+        if role is None:
+            role = self.global_roles.get(player_id, self.default_role)
+        return role
+
+    def resolve_roles(self, player_ids, year):
+        """
+        Roles of many players for one season
+
+        Returns:
+            np.ndarray: object array of roles aligned with player_ids
+        """
+        year = int(year)
+        season_roles = self.season_roles
+        global_roles = self.global_roles
+        default_role = self.default_role
+
+        roles = np.empty(len(player_ids), dtype=object)
+        for i, pid in enumerate(player_ids):
+            role = season_roles.get((pid, year))
+            if role is None:
+                role = global_roles.get(pid, default_role)
+            roles[i] = role
+        return roles
@@ -0,0 +1,99 @@
+"""
+Content-addressed cache of XI selections
+The solver is deterministic for a given candidate list and constraint set,
+so a canonical hash of both maps to the selected player ids, which are
+turned back into a result with the caller's own player dicts
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# Rounding applied before hashing, so float noise does not split entries
+SCORE_DECIMALS = 6
+CREDIT_DECIMALS = 4
+
+
+def problem_key(player_data, team1, team2, score_key, constraints):
+    """
+    Canonical hash of one selection problem
+
+    Players are sorted by id so the input order does not matter.
+
+    Returns:
+        str: hex digest, or None when player ids are not unique
+    """
+    rows = sorted(
+        (
+            str(p['player_id']),
+            round(float(p[score_key]), SCORE_DECIMALS),
+            round(float(p['credits']), CREDIT_DECIMALS),
+            str(p['role']),
+            str(p['team'])
+        )
+        for p in player_data
+    )
+    if len({row[0] for row in rows}) != len(rows):
+        return None
+    payload = json.dumps([rows, str(team1), str(team2), constraints], separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class SolverCache:
+    """
+    Thread-safe LRU of solver outcomes bounded by entry count
+
+    Each entry is (lineups, status) where lineups is a tuple of player-id
+    tuples - one for select_optimal_xi, up to k for select_top_k_xis.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Cached (lineups, status) or None"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, lineups, status):
+        """Store the selected player ids of every lineup"""
+        if key is None:
+            return
+        entry = (tuple(tuple(lineup) for lineup in lineups), status)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every cached selection"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
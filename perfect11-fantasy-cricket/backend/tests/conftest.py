@@ -0,0 +1,33 @@
+"""
+Shared fixtures for the backend tests
+Run from the backend folder with: python -m pytest tests
+"""
+import os
+import sys
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'data')
+
+# Tests import the backend modules the way app.py does ("from modules...")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope='session')
+def historical_data():
+    path = os.path.join(DATA_DIR, 'player_match_base.csv')
+    if not os.path.exists(path):
+        pytest.skip(f"{path} not found")
+    return pd.read_csv(path, parse_dates=['match_date'])
+
+
+@pytest.fixture(scope='session')
+def roles():
+    """(roles_by_season, roles_global) tables"""
+    by_season = os.path.join(DATA_DIR, 'player_roles_by_season.csv')
+    global_ = os.path.join(DATA_DIR, 'player_roles_global.csv')
+    if not (os.path.exists(by_season) and os.path.exists(global_)):
+        pytest.skip("role tables not found")
+    return pd.read_csv(by_season), pd.read_csv(global_)
@@ -0,0 +1,125 @@
+"""
+Binary data snapshot against the CSVs it replaces
+
+load_snapshot must return, frame for frame, what app.py's pd.read_csv calls
+return, and must stop being used as soon as a source CSV changes.
+"""
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import DATA_DIR
+from modules.data_snapshot import build_snapshot, load_snapshot, source_hash, SOURCES, SNAPSHOT_FILE
+
+
+def read_sources(data_dir):
+    """The frames the backend reads without a snapshot"""
+    return {table: pd.read_csv(os.path.join(data_dir, file_name), parse_dates=date_cols or False)
+            for table, (file_name, date_cols) in SOURCES.items()}
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A writable copy of the source CSVs"""
+    for file_name, _ in SOURCES.values():
+        path = os.path.join(DATA_DIR, file_name)
+        if not os.path.exists(path):
+            pytest.skip(f"{path} not found")
+        shutil.copy(path, tmp_path / file_name)
+    return str(tmp_path)
+
+
+def assert_same_frames(snapshot, frames):
+    assert set(snapshot) == set(frames)
+    for table, frame in frames.items():
+        pd.testing.assert_frame_equal(snapshot[table], frame, check_exact=True, obj=table)
+
+
+def test_round_trip_matches_the_csvs(data_dir):
+    path = build_snapshot(data_dir)
+    assert path == os.path.join(data_dir, SNAPSHOT_FILE)
+    assert not os.path.exists(path + '.tmp')
+    assert_same_frames(load_snapshot(data_dir), read_sources(data_dir))
+
+
+def test_round_trip_of_awkward_columns(tmp_path):
+    """Missing strings and numbers, floats, booleans, an empty table and a string column that looks numeric"""
+    frames = {
+        'matches': pd.DataFrame({
+            'match_date': pd.to_datetime(['2024-04-01', '2024-04-03', '2024-04-01']),
+            'player_id': ['p2', 'p1', 'p2'],
+            'venue': ['Eden Gardens', None, 'Wankhede Stadium, Mumbai'],
+            'season': ['2023/24', '2024', '2024'],
+            'fantasy_points': [12.5, -4.0, np.nan],
+            'runs': [10, 0, 51],
+            'dismissed': [True, False, True]
+        }),
+        'roles_by_season': pd.DataFrame({'player_id': ['p1', 'p2'], 'season': [2024, 2024], 'role': ['WK', 'BAT']}),
+        'roles_global': pd.DataFrame({'player_id': pd.Series([], dtype=object), 'role': pd.Series([], dtype=object)})
+    }
+    for table, (file_name, _) in SOURCES.items():
+        frames[table].to_csv(tmp_path / file_name, index=False)
+
+    build_snapshot(str(tmp_path))
+    assert_same_frames(load_snapshot(str(tmp_path)), read_sources(str(tmp_path)))
+
+
+@pytest.mark.parametrize('file_name', [file_name for file_name, _ in SOURCES.values()])
+def test_changed_csv_forces_a_rebuild(data_dir, file_name, capsys):
+    build_snapshot(data_dir)
+    old_hash = source_hash(data_dir)
+
+    # Append a row that repeats the last one, so every column keeps its type
+    path = os.path.join(data_dir, file_name)
+    with open(path) as f:
+        last_line = f.read().rstrip('\n').rsplit('\n', 1)[-1]
+    with open(path, 'a') as f:
+        f.write(last_line + '\n')
+    assert source_hash(data_dir) != old_hash
+
+    # The stale snapshot is ignored (the caller falls back to the CSVs) ...
+    assert load_snapshot(data_dir) is None
+    assert 'is stale' in capsys.readouterr().out
+
+    # ... until it is rebuilt from the changed CSVs
+    build_snapshot(data_dir)
+    snapshot = load_snapshot(data_dir)
+    frames = read_sources(data_dir)
+    assert_same_frames(snapshot, frames)
+    table = next(table for table, (name, _) in SOURCES.items() if name == file_name)
+    assert len(snapshot[table]) == len(pd.read_csv(os.path.join(DATA_DIR, file_name))) + 1
+
+
+def test_snapshot_used_without_the_csvs(data_dir, tmp_path_factory):
+    """A deployment that ships only the snapshot still loads it"""
+    snapshot_path = str(tmp_path_factory.mktemp('deploy') / SNAPSHOT_FILE)
+    build_snapshot(data_dir, snapshot_path=snapshot_path)
+    frames = read_sources(data_dir)
+    os.remove(os.path.join(data_dir, SOURCES['matches'][0]))
+    assert source_hash(data_dir) is None
+    assert_same_frames(load_snapshot(data_dir, snapshot_path=snapshot_path), frames)
+
+
+def test_unusable_snapshots_are_ignored(data_dir, capsys):
+    assert load_snapshot(data_dir) is None
+
+    path = build_snapshot(data_dir)
+    with np.load(path) as npz:
+        arrays = dict(npz)
+    arrays['__format__'] = np.array(-1)
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+    assert load_snapshot(data_dir) is None
+    assert 'old format' in capsys.readouterr().out
+
+    with open(path, 'wb') as f:
+        f.write(b'not a snapshot')
+    assert load_snapshot(data_dir) is None
+    assert 'Could not read' in capsys.readouterr().out
+
+
+def test_build_needs_every_csv(data_dir):
+    os.remove(os.path.join(data_dir, SOURCES['roles_global'][0]))
+    with pytest.raises(FileNotFoundError):
+        build_snapshot(data_dir)
@@ -0,0 +1,226 @@
+"""
+Attributions: batched SHAP, Saabas path contributions and the budgeted choice of mode
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+from modules.flat_forest import FlatForest
+from modules.explainer import build_explainer, compute_attributions, SUBSAMPLE_TREES
+
+pytest.importorskip('shap')
+
+FEATURE_COLS = ['avg_fp_last5', 'venue_avg_fp', 'strike_rate', 'role', 'team', 'career_matches']
+
+
+def training_frame(seed=0, n=400):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(30, 15, (n, len(FEATURE_COLS))), columns=FEATURE_COLS)
+    X['role'] = rng.integers(0, 4, n)
+    y = 0.6 * X['avg_fp_last5'] + 0.3 * X['venue_avg_fp'] + 5 * X['role'] + rng.normal(0, 5, n)
+    return X, y
+
+
+@pytest.fixture(scope='module')
+def model():
+    X, y = training_frame()
+    return ExtraTreesRegressor(n_estimators=2 * SUBSAMPLE_TREES, min_samples_leaf=2, random_state=0).fit(X, y)
+
+
+@pytest.fixture(scope='module')
+def explainer(model):
+    return build_explainer(model, n_features=len(FEATURE_COLS))
+
+
+def lineup(seed=1, n=11):
+    """An XI and its feature rows, as run_prediction passes them"""
+    X, _ = training_frame(seed, n)
+    X['player_id'] = [f'p{i}' for i in range(n)]
+    return {'selected_players': [{'player_id': pid} for pid in X['player_id']]}, X
+
+
+@pytest.mark.parametrize('estimator', [
+    ExtraTreesRegressor(n_estimators=25, random_state=0),
+    RandomForestRegressor(n_estimators=25, max_depth=10, random_state=0),
+    DecisionTreeRegressor(random_state=0)
+], ids=['extra_trees', 'random_forest', 'decision_tree'])
+@pytest.mark.parametrize('n_rows', [1, 11, 300])
+def test_saabas_additivity(estimator, n_rows):
+    """bias + sum(contributions) equals the prediction on every row"""
+    X, y = training_frame()
+    estimator.fit(X, y)
+    forest = FlatForest.from_model(estimator)
+    rows = training_frame(seed=n_rows, n=n_rows)[0]
+
+    bias, contributions = forest.path_contributions(rows.values)
+    assert bias.shape == (n_rows,) and contributions.shape == (n_rows, len(FEATURE_COLS))
+    assert np.allclose(bias + contributions.sum(axis=1), estimator.predict(rows), rtol=0, atol=1e-9)
+    # The bias is the forest's mean root value, the same for every row
+    assert np.allclose(bias, forest.value[forest.roots].mean())
+
+
+def test_saabas_unused_feature_gets_nothing(model):
+    """A feature no tree splits on is never credited"""
+    forest = FlatForest.from_model(model)
+    unused = sorted(set(range(len(FEATURE_COLS))) - set(forest.feature[np.isfinite(forest.threshold)].tolist()))
+    _, contributions = forest.path_contributions(training_frame(seed=2, n=50)[0].values)
+    assert np.all(contributions[:, unused] == 0)
+
+
+def test_path_contrib_mode_is_the_saabas_split(model, explainer):
+    optimal_xi, features = lineup()
+    bias, expected = FlatForest.from_model(model).path_contributions(features[FEATURE_COLS].values)
+    attributions = compute_attributions(optimal_xi, features, model, FEATURE_COLS, explainer=explainer,
+                                        mode='path_contrib')
+    for row, player in enumerate(optimal_xi['selected_players']):
+        block = attributions[player['player_id']]
+        assert block['mode'] == 'path_contrib'
+        got = {f['feature']: f['importance'] for f in block['all_features']}
+        assert [got[c] for c in FEATURE_COLS] == pytest.approx(expected[row].tolist(), abs=1e-12)
+        assert bias[row] + sum(got.values()) == pytest.approx(model.predict(features[FEATURE_COLS].iloc[[row]])[0])
+
+
+def test_explainer_modes(explainer):
+    assert explainer.modes == ['exact', 'tree_subsample', 'path_contrib']
+    assert set(explainer.row_ms) == set(explainer.modes)
+
+
+# Per-row costs in ms used to drive the mode choice deterministically
+COSTS = {'exact': 10.0, 'tree_subsample': 1.0, 'path_contrib': 0.05}
+
+
+@pytest.mark.parametrize('budget_ms, expected', [
+    (None, 'exact'),
+    (0, 'exact'),
+    (500, 'exact'),
+    (110, 'exact'),
+    (109, 'tree_subsample'),
+    (11, 'tree_subsample'),
+    (10, 'path_contrib'),
+    (0.55, 'path_contrib'),
+    (0.01, 'path_contrib')
+])
+def test_choose_mode_under_budget(explainer, budget_ms, expected):
+    """As the budget for 11 rows shrinks: exact, then tree_subsample, then path_contrib"""
+    explainer.row_ms.update(COSTS)
+    assert explainer.choose_mode(11, budget_ms) == expected
+
+
+def test_choose_mode_untimed(model):
+    """Modes that were never timed are skipped under a budget; the fastest is the fallback"""
+    explainer = build_explainer(model)
+    assert explainer.row_ms == {}
+    assert explainer.choose_mode(11) == 'exact'
+    assert explainer.choose_mode(11, 1000) == 'path_contrib'
+
+
+@pytest.mark.parametrize('budget_ms, expected', [(500, 'exact'), (50, 'tree_subsample'), (2, 'path_contrib')])
+def test_budget_mode_reported_per_player(model, explainer, budget_ms, expected):
+    """The mode chosen for the budget is the one named in every player's attribution block"""
+    explainer.row_ms.update(COSTS)
+    optimal_xi, features = lineup()
+    attributions = compute_attributions(optimal_xi, features, model, FEATURE_COLS, explainer=explainer,
+                                        budget_ms=budget_ms)
+    assert [attributions[p['player_id']]['mode'] for p in optimal_xi['selected_players']] == [expected] * 11
+    assert all(len(block['all_features']) == len(FEATURE_COLS) for block in attributions.values())
+
+
+def test_attribute_updates_cost(explainer):
+    explainer.row_ms['path_contrib'] = 1000.0
+    explainer.attribute(np.zeros((4, len(FEATURE_COLS))), 'path_contrib')
+    assert explainer.row_ms['path_contrib'] < 1000.0
+    assert set(explainer.stats()['row_ms']) == set(explainer.modes)
+
+
+def test_unknown_mode_gives_empty_attributions(model, explainer):
+    optimal_xi, features = lineup()
+    attributions = compute_attributions(optimal_xi, features, model, FEATURE_COLS, explainer=explainer, mode='lime')
+    assert all(block == {'top_features': [], 'all_features': [], 'mode': None} for block in attributions.values())
+
+
+def reference_attributions(optimal_xi, player_features, model, feature_cols):
+    """The per-request path the batched one replaced: a new explainer, one shap_values call per player"""
+    import shap
+    explainer = shap.TreeExplainer(model)
+    attributions = {}
+    for player in optimal_xi['selected_players']:
+        player_row = player_features[player_features['player_id'] == player['player_id']]
+        shap_values = explainer.shap_values(player_row[feature_cols].fillna(0))
+        feature_importance = [{'feature': feature, 'importance': float(shap_values[0][i])}
+                              for i, feature in enumerate(feature_cols)]
+        feature_importance.sort(key=lambda x: abs(x['importance']), reverse=True)
+        attributions[player['player_id']] = {'top_features': feature_importance[:5], 'all_features': feature_importance}
+    return attributions
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_batched_exact_matches_per_player(model, explainer, seed):
+    """One 11-row call gives every player the SHAP values, and order, of the one-row-at-a-time path"""
+    optimal_xi, features = lineup(seed=10 + seed)
+    # Selection order differs from the feature frame's row order
+    optimal_xi['selected_players'].reverse()
+    expected = reference_attributions(optimal_xi, features, model, FEATURE_COLS)
+    attributions = compute_attributions(optimal_xi, features, model, FEATURE_COLS, explainer=explainer)
+
+    assert set(attributions) == set(expected)
+    for player_id, block in attributions.items():
+        assert block['mode'] == 'exact'
+        for field in ('top_features', 'all_features'):
+            assert [f['feature'] for f in block[field]] == [f['feature'] for f in expected[player_id][field]]
+            assert ([f['importance'] for f in block[field]]
+                    == pytest.approx([f['importance'] for f in expected[player_id][field]], rel=1e-9, abs=1e-9))
+
+
+def test_all_features_sorted_by_magnitude(model, explainer):
+    """all_features keeps the documented order in every mode: |importance| descending, ties in model order"""
+    optimal_xi, features = lineup(seed=20)
+    for mode in explainer.modes:
+        for block in compute_attributions(optimal_xi, features, model, FEATURE_COLS, explainer=explainer,
+                                          mode=mode).values():
+            magnitudes = [abs(f['importance']) for f in block['all_features']]
+            assert magnitudes == sorted(magnitudes, reverse=True)
+            assert sorted(f['feature'] for f in block['all_features']) == sorted(FEATURE_COLS)
+            assert block['top_features'] == block['all_features'][:5]
+
+
+def test_explainer_built_once_per_model_version(tmp_path, monkeypatch):
+    """TreeExplainers are built when a version loads, never per request"""
+    import pickle
+    import shap
+    from modules.model_registry import ModelRegistry
+    from modules.row_cache import RowCache
+
+    built = []
+    tree_explainer = shap.TreeExplainer
+
+    def counting(*args, **kwargs):
+        built.append(args[0])
+        return tree_explainer(*args, **kwargs)
+
+    monkeypatch.setattr(shap, 'TreeExplainer', counting)
+
+    X, y = training_frame()
+    path = str(tmp_path / 'model.pkl')
+    with open(path, 'wb') as f:
+        pickle.dump({'model': ExtraTreesRegressor(n_estimators=2 * SUBSAMPLE_TREES, random_state=1).fit(X, y),
+                     'feature_cols': FEATURE_COLS, 'label_encoders': {}}, f)
+
+    registry = ModelRegistry()
+    registry.load(path, background=False)
+    per_version = len(built)
+    assert per_version == 2  # exact and tree_subsample
+
+    cache = RowCache()
+    for seed in range(5):
+        _, version = registry.route()
+        optimal_xi, features = lineup(seed=30 + seed)
+        for budget_ms in (None, 1e-6):
+            compute_attributions(optimal_xi, features, version['package']['model'], FEATURE_COLS,
+                                 explainer=version['explainer'], budget_ms=budget_ms,
+                                 cache=cache.view(version['version']))
+    assert len(built) == per_version
+
+    # A second version builds its own, once
+    registry.load(path, arm='candidate', percent=50, background=False)
+    assert len(built) == 2 * per_version
@@ -0,0 +1,208 @@
+"""
+Parity of the v2 inference features with the row-wise reference
+
+create_features_for_inference_v2 serves player-history features from
+PlayerFeatureStore prefix sums and contextual stats from ContextAggregates.
+reference_features below is the per-request implementation they replaced
+(filter the history before the match, sort each player's rows, then
+extract_all_features), built from the reference functions kept in
+feature_engineer_v2. Every column must match it.
+"""
+import glob
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder
+from conftest import DATA_DIR
+from modules.json_parser import parse_match_json
+from modules.role_resolver import RoleResolver
+from modules.feature_store import PlayerFeatureStore
+from modules.context_aggregates import ContextAggregates
+from modules.feature_cache import FeatureCache
+from modules.feature_engineer_v2 import (
+    create_features_for_inference_v2,
+    create_features_for_batch_v2,
+    extract_all_features,
+    compute_venue_stats,
+    compute_opponent_stats,
+    compute_team_stats,
+    get_opponent,
+    encode_safe
+)
+
+# Intentional dtype change: the store yields float64 for every player with
+# history, where the reference used a plain int default (std 0 below 10
+# matches, strike rate 120 with no balls faced). A column holding only those
+# defaults was int64 and is now float64, with equal values.
+FLOAT_DEFAULTS = {'std_fp_last10', 'strike_rate'}
+
+
+def reference_features(players, match_date, venue, historical_data, label_encoders, role_resolver):
+    """The per-request feature computation the store replaced"""
+    return pd.DataFrame(reference_records(players, match_date, venue, historical_data, label_encoders, role_resolver))
+
+
+def reference_records(players, match_date, venue, historical_data, label_encoders, role_resolver):
+    """reference_features as a list of feature dicts"""
+    global_hist = historical_data[historical_data['match_date'] < match_date]
+    venue_stats = compute_venue_stats(global_hist, venue)
+    team_stats = {team: compute_team_stats(global_hist, team) for team in set(p['team'] for p in players)}
+    roles = dict(zip([p['player_id'] for p in players],
+                     role_resolver.resolve_roles([p['player_id'] for p in players], match_date.year)))
+
+    features_list = []
+    for player in players:
+        team = player['team']
+        opponent = get_opponent(players, team)
+        player_hist = global_hist[global_hist['player_id'] == player['player_id']].sort_values('match_date')
+        feat = extract_all_features(
+            player_id=player['player_id'],
+            player_hist=player_hist,
+            match_date=match_date,
+            venue=venue,
+            venue_stats=venue_stats,
+            opponent=opponent,
+            opponent_stats=compute_opponent_stats(global_hist, opponent),
+            team=team,
+            team_stats=team_stats.get(team, {'avg_fp': 0, 'std_fp': 0}),
+            role=roles[player['player_id']]
+        )
+        feat['role'] = encode_safe(label_encoders['role'], roles[player['player_id']])
+        feat['team'] = encode_safe(label_encoders['team'], team)
+        feat['opponent'] = encode_safe(label_encoders['opponent'], opponent)
+        feat['venue'] = encode_safe(label_encoders['venue'], venue)
+        feat['player_id'] = player['player_id']
+        feat['player_name'] = player['player_name']
+        features_list.append(feat)
+
+    return features_list
+
+
+def history_matches(historical_data, n=12, seed=1):
+    """Lineups of past matches (both teams), as parse_match_json returns them"""
+    rng = np.random.default_rng(seed)
+    keys = historical_data[['match_date', 'venue']].drop_duplicates()
+    matches = []
+    for i in rng.choice(len(keys), n, replace=False):
+        match_date, venue = keys.iloc[i]
+        rows = historical_data[(historical_data['match_date'] == match_date) & (historical_data['venue'] == venue)]
+        matches.append({
+            'match_id': f'history-{i}',
+            'match_date': match_date,
+            'venue': venue,
+            'players': [{'player_id': r.player_id, 'player_name': r.player_name, 'team': r.team}
+                        for r in rows.itertuples()]
+        })
+    return matches
+
+
+def newcomer_match():
+    """Players and a venue the history has never seen"""
+    return {
+        'match_id': 'newcomers',
+        'match_date': pd.Timestamp('2015-04-20'),
+        'venue': 'Unknown Ground',
+        'players': [{'player_id': f'new{i}', 'player_name': f'New {i}', 'team': 'Team A' if i < 11 else 'Team B'}
+                    for i in range(22)]
+    }
+
+
+@pytest.fixture(scope='module')
+def label_encoders(historical_data, roles):
+    encoders = {}
+    for name, values in (('role', roles[1]['role']), ('team', historical_data['team']),
+                         ('opponent', historical_data['opponent']), ('venue', historical_data['venue'])):
+        encoders[name] = LabelEncoder().fit(values.astype(str))
+    return encoders
+
+
+@pytest.fixture(scope='module')
+def matches(historical_data):
+    samples = [parse_match_json(json.load(open(path)))
+               for path in sorted(glob.glob(os.path.join(DATA_DIR, 'sample', '*.json')))]
+    return samples + history_matches(historical_data) + [newcomer_match()]
+
+
+@pytest.fixture(scope='module')
+def serving(historical_data, roles):
+    """The structures app.py builds at startup"""
+    return {
+        'role_resolver': RoleResolver(*roles),
+        'feature_store': PlayerFeatureStore.from_history(historical_data),
+        'context_aggregates': ContextAggregates(historical_data)
+    }
+
+
+def assert_same_features(actual, expected):
+    assert list(actual.columns) == list(expected.columns)
+    assert list(actual['player_id']) == list(expected['player_id'])
+    for col in expected.columns:
+        if col in FLOAT_DEFAULTS and expected[col].dtype == np.int64:
+            assert actual[col].dtype in (np.int64, np.float64), col
+        else:
+            assert actual[col].dtype == expected[col].dtype, col
+        if expected[col].dtype == object:
+            assert list(actual[col]) == list(expected[col]), col
+        else:
+            # Prefix-sum differences round differently from np.mean over a slice
+            np.testing.assert_allclose(actual[col].astype(float), expected[col].astype(float),
+                                       rtol=1e-9, atol=1e-9, err_msg=col)
+
+
+def test_inference_features_match_reference(matches, historical_data, roles, label_encoders, serving):
+    for match in matches:
+        expected = reference_features(match['players'], match['match_date'], match['venue'],
+                                      historical_data, label_encoders, serving['role_resolver'])
+        actual = create_features_for_inference_v2(
+            match['players'], match['match_date'], match['venue'], historical_data,
+            *roles, label_encoders, **serving
+        )
+        assert_same_features(actual, expected)
+
+
+def test_cached_features_match_reference(matches, historical_data, roles, label_encoders, serving):
+    cache = FeatureCache()
+    cache.set_version('test')
+    for _ in range(2):
+        for match in matches:
+            expected = reference_features(match['players'], match['match_date'], match['venue'],
+                                          historical_data, label_encoders, serving['role_resolver'])
+            actual = create_features_for_inference_v2(
+                match['players'], match['match_date'], match['venue'], historical_data,
+                *roles, label_encoders, feature_cache=cache, **serving
+            )
+            assert_same_features(actual, expected)
+    assert cache.stats()['hits'] > 0
+
+
+def test_batch_features_match_reference(matches, historical_data, roles, label_encoders, serving):
+    batch = create_features_for_batch_v2(matches, historical_data, *roles, label_encoders, **serving)
+    # One frame over all matches, so mixed int/float columns upcast as in the batch
+    expected = pd.DataFrame([
+        feat for match in matches
+        for feat in reference_records(match['players'], match['match_date'], match['venue'],
+                                      historical_data, label_encoders, serving['role_resolver'])
+    ])
+    assert list(batch['match_index']) == [i for i, match in enumerate(matches) for _ in match['players']]
+    assert_same_features(batch.drop(columns=['match_index', 'match_id']), expected)
+
+
+def test_short_history_std_is_float_zero(historical_data, roles, label_encoders, serving):
+    """Players with 1-9 matches: std_fp_last10 is 0.0 (float64) where the reference had int 0"""
+    match_date = pd.Timestamp('2012-04-01')
+    prior = historical_data[historical_data['match_date'] < match_date]
+    counts = prior.groupby('player_id').size()
+    short = prior.drop_duplicates('player_id').set_index('player_id').loc[counts[counts < 10].index]
+    players = [{'player_id': player_id, 'player_name': row.player_name, 'team': 'Team A' if i < 11 else 'Team B'}
+               for i, (player_id, row) in enumerate(short.head(22).iterrows())]
+
+    expected = reference_features(players, match_date, 'Wankhede Stadium', historical_data,
+                                  label_encoders, serving['role_resolver'])
+    actual = create_features_for_inference_v2(players, match_date, 'Wankhede Stadium', historical_data,
+                                              *roles, label_encoders, **serving)
+    assert expected['std_fp_last10'].dtype == np.int64
+    assert actual['std_fp_last10'].dtype == np.float64
+    assert (actual['std_fp_last10'] == 0).all()
+    assert_same_features(actual, expected)
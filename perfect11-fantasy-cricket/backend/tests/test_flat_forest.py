@@ -0,0 +1,181 @@
+"""
+FlatForest against sklearn's own predict
+
+The packed forest must give the same predictions as the estimator it was
+built from, to float tolerance, for forests and single trees, in memory and
+memory-mapped from a built artifact.
+"""
+import json
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor, GradientBoostingRegressor
+from sklearn.linear_model import Ridge
+from sklearn.tree import DecisionTreeRegressor
+from modules.flat_forest import FlatForest, build_forest, load_forest, forest_path_for, FOREST_FORMAT
+from modules.predictor import predict_fantasy_points, predict_fantasy_points_by_match
+
+N_FEATURES = 8
+FEATURE_COLS = [f'f{i}' for i in range(N_FEATURES)]
+
+ESTIMATORS = {
+    'extra_trees': lambda: ExtraTreesRegressor(n_estimators=30, min_samples_leaf=2, random_state=0),
+    'random_forest': lambda: RandomForestRegressor(n_estimators=30, max_depth=12, random_state=0),
+    'decision_tree': lambda: DecisionTreeRegressor(random_state=0)
+}
+
+
+def training_data(seed=0, n=600):
+    """Features on mixed scales, with a few repeated values so splits fall between ties"""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, N_FEATURES)) * np.array([1, 10, 100, 0.1, 1, 5, 50, 1])
+    X[:, 4] = rng.integers(0, 5, n)
+    y = X[:, 0] * 3 + X[:, 1] - 0.02 * X[:, 2] + 4 * X[:, 4] + rng.normal(0, 1, n)
+    return X, y
+
+
+def fit(name):
+    X, y = training_data()
+    return ESTIMATORS[name]().fit(pd.DataFrame(X, columns=FEATURE_COLS), y)
+
+
+def sk_predict(model, X):
+    return model.predict(pd.DataFrame(X, columns=FEATURE_COLS))
+
+
+def threshold_rows(forest, seed=1, n=300):
+    """
+    Rows with one feature exactly on a split threshold (as float64, and
+    rounded to float32), or one float32 step either side of it, so both
+    sides of the <= comparison and the float32 rounding are exercised
+    """
+    rng = np.random.default_rng(seed)
+    internal = np.flatnonzero(np.isfinite(forest.threshold))
+    picks = rng.choice(internal, n)
+    X = training_data(seed, n)[0]
+    at = forest.threshold[picks].astype(np.float32)
+    values = np.select([np.arange(n) % 4 == k for k in range(4)], [
+        forest.threshold[picks],
+        at,
+        np.nextafter(at, np.float32(np.inf)),
+        np.nextafter(at, np.float32(-np.inf))
+    ])
+    X[np.arange(n), forest.feature[picks]] = values
+    return X
+
+
+@pytest.fixture(scope='module', params=sorted(ESTIMATORS))
+def fitted(request):
+    return fit(request.param)
+
+
+@pytest.mark.parametrize('n_rows', [1, 22, 500])
+def test_matches_sklearn(fitted, n_rows):
+    forest = FlatForest.from_model(fitted)
+    X = training_data(seed=n_rows, n=n_rows)[0]
+    assert np.allclose(forest.predict(X), sk_predict(fitted, X), rtol=0, atol=1e-9)
+
+
+def test_matches_sklearn_on_thresholds(fitted):
+    forest = FlatForest.from_model(fitted)
+    X = threshold_rows(forest)
+    assert np.allclose(forest.predict(X), sk_predict(fitted, X), rtol=0, atol=1e-9)
+
+
+def test_tree_predictions_are_the_estimators(fitted):
+    forest = FlatForest.from_model(fitted)
+    X = training_data(seed=5, n=50)[0]
+    if hasattr(fitted, 'estimators_'):
+        expected = np.column_stack([est.predict(X) for est in fitted.estimators_])
+    else:
+        expected = sk_predict(fitted, X)[:, None]
+    assert np.allclose(forest.tree_predictions(X), expected, rtol=0, atol=1e-9)
+
+
+def test_unsupported_models():
+    X, y = training_data(n=100)
+    assert FlatForest.from_model(Ridge().fit(X, y)) is None
+    assert FlatForest.from_model(GradientBoostingRegressor(n_estimators=5).fit(X, y)) is None
+    assert FlatForest.from_model(DecisionTreeRegressor().fit(X, np.column_stack([y, y]))) is None
+
+
+def test_predictor_uses_forest(fitted):
+    """predict_fantasy_points and the batch variant give sklearn's numbers through the forest"""
+    forest = FlatForest.from_model(fitted)
+    X = training_data(seed=7, n=22)[0]
+    features = pd.DataFrame(X, columns=FEATURE_COLS)
+    features['player_id'] = [f'p{i}' for i in range(len(X))]
+    features['match_index'] = np.arange(len(X)) % 2
+    expected = dict(zip(features['player_id'], sk_predict(fitted, X)))
+
+    for predictions in (predict_fantasy_points(features, fitted, FEATURE_COLS, forest=forest),
+                        predict_fantasy_points(features, fitted, FEATURE_COLS)):
+        assert predictions == pytest.approx(expected, abs=1e-9)
+    by_match = predict_fantasy_points_by_match(features, fitted, FEATURE_COLS, forest=forest)
+    assert {pid: fp for preds in by_match.values() for pid, fp in preds.items()} == pytest.approx(expected, abs=1e-9)
+
+
+def save_model(path, model):
+    with open(path, 'wb') as f:
+        pickle.dump({'model': model, 'feature_cols': FEATURE_COLS}, f)
+
+
+def test_artifact_round_trip(tmp_path, fitted):
+    model_path = str(tmp_path / 'model.pkl')
+    save_model(model_path, fitted)
+    assert build_forest(model_path) == forest_path_for(model_path)
+
+    loaded = load_forest(model_path)
+    assert loaded is not None
+    assert isinstance(loaded.threshold.base, np.memmap) and type(loaded.threshold) is np.ndarray
+    assert loaded.n_features == N_FEATURES
+    X = np.vstack([training_data(seed=3, n=200)[0], threshold_rows(loaded)])
+    assert np.allclose(loaded.predict(X), sk_predict(fitted, X), rtol=0, atol=1e-9)
+    assert np.array_equal(loaded.predict(X), FlatForest.from_model(fitted).predict(X))
+
+
+def test_stale_artifact_is_ignored(tmp_path):
+    model_path = str(tmp_path / 'model.pkl')
+    save_model(model_path, fit('decision_tree'))
+    build_forest(model_path)
+
+    # A retrained model at the same path no longer matches the recorded hash
+    save_model(model_path, fit('random_forest'))
+    assert load_forest(model_path) is None
+    build_forest(model_path)
+    assert load_forest(model_path) is not None
+
+    os.remove(model_path)
+    assert load_forest(model_path) is None
+
+
+def test_mismatched_artifact_is_ignored(tmp_path):
+    model_path = str(tmp_path / 'model.pkl')
+    save_model(model_path, fit('decision_tree'))
+    forest_path = build_forest(model_path)
+    meta_path = os.path.join(forest_path, 'meta.json')
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    with open(meta_path, 'w') as f:
+        json.dump(dict(meta, format=FOREST_FORMAT + 1), f)
+    assert load_forest(model_path) is None
+
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    os.remove(os.path.join(forest_path, 'value.npy'))
+    assert load_forest(model_path) is None
+
+    assert load_forest(model_path, forest_path=str(tmp_path / 'missing.forest')) is None
+
+
+def test_build_rejects_unsupported_model(tmp_path):
+    model_path = str(tmp_path / 'model.pkl')
+    X, y = training_data(n=100)
+    save_model(model_path, Ridge().fit(X, y))
+    with pytest.raises(ValueError):
+        build_forest(model_path)
+    with pytest.raises(FileNotFoundError):
+        build_forest(str(tmp_path / 'missing.pkl'))
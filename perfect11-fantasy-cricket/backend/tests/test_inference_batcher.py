@@ -0,0 +1,269 @@
+"""
+InferenceBatcher under concurrent callers
+
+A gate (a first request whose fn blocks until released) holds the
+dispatcher busy so later requests pile up in the queue and are taken as one
+batch, which keeps these tests deterministic.
+"""
+import threading
+import time
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.tree import DecisionTreeRegressor
+import modules.inference_batcher as inference_batcher
+from modules.inference_batcher import InferenceBatcher
+
+N_FEATURES = 5
+
+# Seconds any single wait in these tests may take before it counts as a hang
+TIMEOUT = 10
+
+
+@pytest.fixture(scope='module')
+def models():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, N_FEATURES))
+    y = X @ rng.normal(size=N_FEATURES) + rng.normal(0, 0.1, 300)
+    return {
+        'forest': ExtraTreesRegressor(n_estimators=10, random_state=0).fit(X, y),
+        'tree': DecisionTreeRegressor(max_depth=6, random_state=0).fit(X, y)
+    }
+
+
+def run_in_thread(fn, *args):
+    """Start fn in a thread; returns (thread, outcome dict with 'result' or 'error')"""
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = fn(*args)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def hold_dispatcher(batcher):
+    """Occupy the dispatcher with a blocking request; returns the Event that releases it"""
+    entered, gate = threading.Event(), threading.Event()
+
+    def blocked(X):
+        entered.set()
+        gate.wait(TIMEOUT)
+        return X
+
+    thread, _ = run_in_thread(batcher.submit, 'gate', np.zeros((1, N_FEATURES)), blocked)
+    assert entered.wait(TIMEOUT)
+    return gate, thread
+
+
+def wait_for_queue(batcher, depth):
+    deadline = time.perf_counter() + TIMEOUT
+    while batcher.stats()['queue_depth'] < depth:
+        assert time.perf_counter() < deadline, "requests never reached the queue"
+        time.sleep(0.001)
+
+
+def queue_in_order(batcher, requests):
+    """Submit (key, X, fn) requests from their own threads, each queued before the next starts"""
+    callers = []
+    for key, X, fn in requests:
+        callers.append(run_in_thread(batcher.submit, key, X, fn))
+        wait_for_queue(batcher, len(callers))
+    return callers
+
+
+@pytest.mark.parametrize('max_wait_ms', [0, 2])
+def test_concurrent_callers_get_their_own_rows(models, max_wait_ms):
+    """Threads submitting frames of different sizes to two models each get exactly model.predict of their rows"""
+    batcher = InferenceBatcher(max_wait_ms=max_wait_ms, max_rows=64)
+    n_threads, rounds = 12, 15
+    start = threading.Barrier(n_threads)
+    failures, rows_sent = [], []
+
+    def caller(index):
+        rng = np.random.default_rng(index)
+        start.wait(TIMEOUT)
+        for r in range(rounds):
+            name = 'forest' if (index + r) % 2 else 'tree'
+            model = models[name]
+            X = rng.normal(size=(int(rng.integers(1, 40)), N_FEATURES))
+            # Mark the rows with the caller so a misrouted slice cannot pass by accident
+            X[:, 0] = index * 1000 + r
+            result = batcher.submit(name, X, model.predict)
+            rows_sent.append(len(X))
+            if result.shape != (len(X),) or not np.array_equal(result, model.predict(X)):
+                failures.append((index, r, name))
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT * 3)
+    assert not any(thread.is_alive() for thread in threads)
+    assert failures == []
+
+    stats = batcher.stats()
+    assert stats['requests'] == n_threads * rounds
+    assert stats['rows'] == sum(rows_sent)
+    assert stats['batches'] <= stats['requests']
+    assert sum(stats['batch_sizes'].values()) == stats['batches']
+    assert stats['queue_depth'] == 0 and stats['queued_rows'] == 0
+
+
+def test_keys_never_share_a_call(models):
+    """Requests for two models taken in one batch are scored by their own fn"""
+    batcher = InferenceBatcher(max_wait_ms=0)
+    calls = []
+
+    def scorer(name):
+        def fn(X):
+            calls.append((name, len(X)))
+            return models[name].predict(X)
+        return fn
+
+    gate, _ = hold_dispatcher(batcher)
+    rng = np.random.default_rng(1)
+    frames = [('forest', rng.normal(size=(3, N_FEATURES))), ('tree', rng.normal(size=(4, N_FEATURES))),
+              ('forest', rng.normal(size=(5, N_FEATURES)))]
+    callers = queue_in_order(batcher, [(name, X, scorer(name)) for name, X in frames])
+    gate.set()
+    for (name, X), (thread, outcome) in zip(frames, callers):
+        thread.join(TIMEOUT)
+        assert np.array_equal(outcome['result'], models[name].predict(X))
+    assert sorted(calls) == [('forest', 8), ('tree', 4)]
+
+
+def test_error_in_one_key_spares_the_others(models):
+    """A model call that raises fails its own callers only, even within the same batch"""
+    batcher = InferenceBatcher(max_wait_ms=0)
+
+    def broken(X):
+        raise ValueError("model exploded")
+
+    gate, _ = hold_dispatcher(batcher)
+    X = np.random.default_rng(2).normal(size=(6, N_FEATURES))
+    *bad, good = queue_in_order(batcher, [('bad', X[:2], broken), ('bad', X[2:4], broken),
+                                          ('forest', X, models['forest'].predict)])
+    gate.set()
+
+    for thread, outcome in bad + [good]:
+        thread.join(TIMEOUT)
+        assert not thread.is_alive()
+    for _, outcome in bad:
+        assert isinstance(outcome['error'], ValueError)
+    assert np.array_equal(good[1]['result'], models['forest'].predict(X))
+    # All three were one batch, and the dispatcher carries on afterwards
+    assert batcher.stats()['batch_sizes']['<=4'] == 1
+    assert np.array_equal(batcher.submit('tree', X, models['tree'].predict), models['tree'].predict(X))
+
+
+def test_metrics_track_queue_and_batches():
+    batcher = InferenceBatcher(max_wait_ms=0, max_rows=10)
+    assert batcher.stats()['requests'] == 0 and batcher.stats()['mean_batch_requests'] == 0.0
+
+    gate, gate_thread = hold_dispatcher(batcher)
+    sizes = [2, 3, 4, 6, 1]
+    callers = queue_in_order(batcher, [('k', np.full((n, N_FEATURES), float(n)), lambda X: X[:, :1]) for n in sizes])
+    stats = batcher.stats()
+    assert stats['queue_depth'] == len(sizes)
+    assert stats['queued_rows'] == sum(sizes)
+    assert stats['max_queue_depth'] >= len(sizes)
+
+    gate.set()
+    gate_thread.join(TIMEOUT)
+    for n, (thread, outcome) in zip(sizes, callers):
+        thread.join(TIMEOUT)
+        assert np.array_equal(outcome['result'], np.full((n, 1), float(n)))
+
+    stats = batcher.stats()
+    assert stats['queue_depth'] == 0 and stats['queued_rows'] == 0
+    # The gate alone, then the queue in arrival order split at max_rows=10: 2+3+4, 6+1
+    assert stats['batches'] == 3
+    assert stats['requests'] == 1 + len(sizes)
+    assert stats['rows'] == 1 + sum(sizes)
+    assert stats['batch_sizes'] == {'<=1': 1, '<=2': 1, '<=4': 1, '<=8': 0, '<=16': 0, '>16': 0}
+    assert stats['mean_batch_requests'] == pytest.approx(6 / 3)
+    assert stats['max_wait_ms_seen'] > 0
+
+
+def test_oversized_request_is_its_own_batch():
+    batcher = InferenceBatcher(max_wait_ms=0, max_rows=4)
+    result = batcher.submit('k', np.ones((9, N_FEATURES)), lambda X: X.sum(axis=1))
+    assert np.array_equal(result, np.full(9, float(N_FEATURES)))
+    assert batcher.stats()['batches'] == 1
+
+
+@pytest.fixture
+def fast_liveness_check(monkeypatch):
+    monkeypatch.setattr(inference_batcher, 'DISPATCHER_CHECK_S', 0.02)
+
+
+def crash(*args):
+    raise RuntimeError("dispatcher crashed")
+
+
+# The dispatcher thread dying is the point of these tests
+kills_dispatcher = pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+
+
+@kills_dispatcher
+def test_dead_dispatcher_restarted_for_queued_request(fast_liveness_check):
+    """A dispatcher that dies before taking a request is restarted by the waiting caller"""
+    batcher = InferenceBatcher(max_wait_ms=0)
+    take_batch, calls = batcher._take_batch, []
+
+    def dies_once():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.05)
+            crash()
+        return take_batch()
+
+    batcher._take_batch = dies_once
+    thread, outcome = run_in_thread(batcher.submit, 'k', np.ones((2, N_FEATURES)), lambda X: X[:, 0] + 1)
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), "submit hung on a dead dispatcher"
+    assert np.array_equal(outcome['result'], [2.0, 2.0])
+    assert batcher.stats()['dispatcher_restarts'] == 1
+
+
+@kills_dispatcher
+def test_dead_dispatcher_raises_for_taken_request(fast_liveness_check):
+    """A request lost with the dispatcher raises instead of hanging; later ones are served"""
+    batcher = InferenceBatcher(max_wait_ms=0)
+    take_batch, calls = batcher._take_batch, []
+
+    def loses_request():
+        calls.append(1)
+        if len(calls) == 1:
+            with batcher._cond:
+                while not batcher._queue:
+                    batcher._cond.wait()
+                batcher._queue.popleft()
+                batcher._queued_rows = 0
+            crash()
+        return take_batch()
+
+    batcher._take_batch = loses_request
+    thread, outcome = run_in_thread(batcher.submit, 'k', np.ones((1, N_FEATURES)), lambda X: X)
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), "submit hung on a dead dispatcher"
+    assert 'stopped before scoring' in str(outcome['error'])
+
+    assert np.array_equal(batcher.submit('k', np.ones((1, N_FEATURES)), lambda X: X * 3), np.full((1, N_FEATURES), 3.0))
+    assert batcher.stats()['dispatcher_restarts'] == 1
+
+
+@kills_dispatcher
+def test_dispatcher_dying_mid_batch_wakes_its_callers(fast_liveness_check):
+    """An exception escaping the batch run still answers every caller of that batch"""
+    batcher = InferenceBatcher(max_wait_ms=0)
+    batcher._run_batch = crash
+    thread, outcome = run_in_thread(batcher.submit, 'k', np.ones((1, N_FEATURES)), lambda X: X)
+    thread.join(TIMEOUT)
+    assert not thread.is_alive()
+    assert 'did not complete' in str(outcome['error'])
@@ -0,0 +1,291 @@
+"""
+Model registry routing and swaps, and the per-version caches
+"""
+import pickle
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.preprocessing import LabelEncoder
+from modules.model_registry import ModelRegistry, load_model_version
+from modules.row_cache import RowCache
+from modules.feature_cache import FeatureCache
+from modules.predictor import predict_fantasy_points
+from modules.explainer import compute_attributions
+from modules.role_resolver import RoleResolver
+from modules.feature_engineer_v2 import create_features_for_inference_v2
+
+FEATURE_COLS = ['avg_fp_last5', 'venue_avg_fp', 'strike_rate', 'role']
+
+# Seconds any wait on a background load may take
+TIMEOUT = 10
+
+
+def fake_version(version):
+    """A loaded version as load_model_version returns it, without a model"""
+    return {'version': version, 'name': f'model {version}', 'path': f'{version}.pkl', 'package': {},
+            'forest': None, 'explainer': None, 'loaded_at': time.time()}
+
+
+def registry_with(active='a1', candidate=None, percent=0.0, loader=None):
+    registry = ModelRegistry(loader=loader or fake_version)
+    registry.load(active, background=False)
+    if candidate:
+        registry.load(candidate, arm='candidate', percent=percent, background=False)
+    return registry
+
+
+def wait_for_load(registry):
+    deadline = time.perf_counter() + TIMEOUT
+    while registry.stats()['loading']:
+        assert time.perf_counter() < deadline, "load never finished"
+        time.sleep(0.001)
+
+
+@pytest.mark.parametrize('percent', [0, 5, 20, 50, 100])
+def test_sticky_routing_share(percent):
+    """The same key always lands on the same arm, and keys split close to the configured share"""
+    registry = registry_with(candidate='c1', percent=percent)
+    keys = [f'user-{i}' for i in range(20000)]
+    arms = [registry.route(key)[0] for key in keys]
+    assert [registry.route(key)[0] for key in keys] == arms
+
+    share = arms.count('candidate') / len(keys)
+    assert share == pytest.approx(percent / 100, abs=0.015)
+    if percent in (0, 100):
+        assert share == percent / 100
+
+    # sha1 buckets, not Python's salted hash: another process routes the same way
+    other = registry_with(active='a2', candidate='c2', percent=percent)
+    assert [other.route(key)[0] for key in keys[:2000]] == arms[:2000]
+
+
+def test_route_returns_the_arms_version():
+    registry = registry_with(candidate='c1', percent=30)
+    for key in ('user-1', 'user-2', 'user-3', None):
+        arm, version = registry.route(key)
+        assert version['version'] == {'active': 'a1', 'candidate': 'c1'}[arm]
+    assert registry.route('candidate')[1]['version'] == 'c1'
+    assert registry.route('active')[1]['version'] == 'a1'
+    assert sum(registry.stats()['served'].values()) == 6
+
+
+def test_no_candidate_always_active():
+    registry = registry_with()
+    assert {registry.route(key)[0] for key in ('candidate', 'user-1', None)} == {'active'}
+
+
+def test_set_percent_bounds():
+    registry = registry_with(candidate='c1', percent=10)
+    with pytest.raises(ValueError):
+        registry.set_percent(101)
+    with pytest.raises(ValueError):
+        registry.set_percent(-1)
+    assert registry.candidate_percent == 10
+
+
+@pytest.mark.parametrize('arm', ['active', 'candidate'])
+def test_failed_background_load_changes_nothing(arm):
+    def loader(path):
+        if path == 'broken.pkl':
+            raise ValueError("broken.pkl is not a model package (no 'model')")
+        return fake_version(path)
+
+    registry = registry_with(candidate='c1', percent=25, loader=loader)
+    active, candidate = registry.active, registry.candidate
+
+    assert registry.load('broken.pkl', arm=arm, percent=90) is True
+    wait_for_load(registry)
+    assert registry.active is active and registry.candidate is candidate
+    assert registry.candidate_percent == 25
+    last_load = registry.stats()['last_load']
+    assert last_load['status'] == 'failed' and 'not a model package' in last_load['error']
+    assert registry.route('candidate')[1] is candidate
+
+
+def test_invalid_package_fails_to_load(tmp_path):
+    path = tmp_path / 'model.pkl'
+    path.write_bytes(pickle.dumps({'model': None, 'feature_cols': []}))
+    registry = ModelRegistry()
+    registry.load(str(path), background=False)
+    assert registry.active is None
+    assert "no 'label_encoders'" in registry.stats()['last_load']['error']
+
+
+def test_one_load_at_a_time():
+    """The serving versions stay in place while a load runs, and a second load is refused"""
+    release = threading.Event()
+
+    def slow_loader(path):
+        if path == 'slow.pkl':
+            release.wait(TIMEOUT)
+        return fake_version(path)
+
+    registry = registry_with(loader=slow_loader)
+    active = registry.active
+    assert registry.load('slow.pkl') is True
+    assert registry.load('other.pkl') is False
+    assert registry.route()[1] is active
+    release.set()
+    wait_for_load(registry)
+    assert registry.active['version'] == 'slow.pkl'
+    assert registry.load('other.pkl', background=False) is True
+
+
+def test_promote_swaps_atomically():
+    """Readers see either the old pair or the promoted one, never a mix or a gap"""
+    registry = registry_with(candidate='c1', percent=50)
+    old_active, candidate = registry.active, registry.candidate
+    stop, seen, errors = threading.Event(), [], []
+
+    def reader(index):
+        while not stop.is_set():
+            arm, version = registry.route(f'user-{index}')
+            seen.append((arm, version['version']))
+            stats = registry.stats()
+            pair = (stats['active']['version'], (stats['candidate'] or {}).get('version'), stats['candidate_percent'])
+            if pair not in (('a1', 'c1', 50.0), ('c1', None, 0.0)):
+                errors.append(pair)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    assert registry.promote() is True
+    time.sleep(0.05)
+    stop.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+
+    assert errors == []
+    assert set(seen) <= {('active', 'a1'), ('candidate', 'c1'), ('active', 'c1')}
+    assert registry.active is candidate and registry.candidate is None and registry.candidate_percent == 0
+    assert registry.route('candidate') == ('active', candidate)
+    assert registry.promote() is False
+    # The retired version can still be resolved (reloaded) by a worker that was serving it
+    assert registry.resolve('a1', 'a1')['version'] == old_active['version']
+
+
+def save_package(path, seed):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(30, 10, (200, len(FEATURE_COLS))), columns=FEATURE_COLS)
+    y = X['avg_fp_last5'] * rng.uniform(0.3, 1.5) + rng.normal(0, 5, 200)
+    with open(path, 'wb') as f:
+        pickle.dump({'model': ExtraTreesRegressor(n_estimators=30, random_state=seed).fit(X, y),
+                     'feature_cols': FEATURE_COLS, 'label_encoders': {}}, f)
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def two_versions(tmp_path_factory):
+    """Two genuinely different model versions, loaded as the registry loads them"""
+    folder = tmp_path_factory.mktemp('models')
+    return [load_model_version(save_package(folder / f'model{seed}.pkl', seed)) for seed in (1, 2)]
+
+
+def feature_frame(seed=3, n=11):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(rng.normal(30, 10, (n, len(FEATURE_COLS))), columns=FEATURE_COLS)
+    frame['player_id'] = [f'p{i}' for i in range(n)]
+    return frame
+
+
+def test_versions_differ(two_versions):
+    a, b = two_versions
+    assert a['version'] != b['version']
+    X = feature_frame()[FEATURE_COLS]
+    assert not np.allclose(a['package']['model'].predict(X), b['package']['model'].predict(X))
+
+
+@pytest.mark.parametrize('intervals', [False, True])
+def test_prediction_cache_is_per_version(two_versions, intervals):
+    """Rows cached under one version are recomputed, not served, for another"""
+    cache = RowCache()
+    features = feature_frame()
+    for _ in range(2):
+        for version in two_versions:
+            model = version['package']['model']
+            cached = predict_fantasy_points(features, model, FEATURE_COLS, intervals=intervals,
+                                            forest=version['forest'], cache=cache.view(version['version']))
+            direct = predict_fantasy_points(features, model, FEATURE_COLS, intervals=intervals,
+                                            forest=version['forest'])
+            assert cached == direct
+    # Each version missed once per row, then hit once per row
+    stats = cache.stats()
+    assert stats['misses'] == stats['hits'] == 2 * len(features)
+    assert stats['entries'] == 2 * len(features)
+
+
+@pytest.mark.parametrize('mode', ['exact', 'path_contrib'])
+def test_attribution_cache_is_per_version(two_versions, mode):
+    cache = RowCache()
+    features = feature_frame(seed=4)
+    optimal_xi = {'selected_players': [{'player_id': pid} for pid in features['player_id']]}
+    for _ in range(2):
+        for version in two_versions:
+            args = (optimal_xi, features, version['package']['model'], FEATURE_COLS)
+            cached = compute_attributions(*args, explainer=version['explainer'], mode=mode,
+                                          cache=cache.view(version['version']))
+            direct = compute_attributions(*args, explainer=version['explainer'], mode=mode)
+            for pid, block in direct.items():
+                assert cached[pid]['mode'] == mode
+                assert [f['feature'] for f in cached[pid]['all_features']] == [f['feature'] for f in block['all_features']]
+                assert ([f['importance'] for f in cached[pid]['all_features']]
+                        == pytest.approx([f['importance'] for f in block['all_features']], abs=1e-12))
+    assert cache.stats()['hits'] == 2 * len(features)
+
+
+def test_prediction_and_attribution_entries_never_mix(two_versions):
+    """One version's rows under different kinds are separate entries"""
+    version = two_versions[0]
+    view = RowCache().view(version['version'])
+    X = feature_frame()[FEATURE_COLS].values
+    keys, _ = view.fetch('prediction', X)
+    view.fill(keys, [None] * len(X), lambda rows: np.ones((len(rows), 1)))
+    assert all(value is None for value in view.fetch('attribution/exact', X)[1])
+    assert all(value is None for value in RowCache().view('other').fetch('prediction', X)[1])
+    assert all(value is not None for value in view.fetch('prediction', X)[1])
+
+
+def test_feature_cache_view_keys_are_per_version():
+    cache = FeatureCache()
+    cache.set_version('data-1')
+    a, b = cache.view('model-a'), cache.view('model-b')
+    key_a = a.key('p1', '2024-04-01', 'Wankhede Stadium', 'Team B', 'Team A', 'BAT')
+    key_b = b.key('p1', '2024-04-01', 'Wankhede Stadium', 'Team B', 'Team A', 'BAT')
+    assert key_a != key_b
+    a.put(key_a, {'team': 3})
+    assert b.get(key_b) is None
+    assert a.get(key_a) == {'team': 3}
+
+
+def test_feature_cache_serves_each_version_its_encoding(historical_data, roles):
+    """Two versions with different label encoders never read each other's cached features"""
+    encoders = []
+    for reverse in (False, True):
+        version_encoders = {}
+        for name, values in (('role', roles[1]['role']), ('team', historical_data['team']),
+                             ('opponent', historical_data['opponent']), ('venue', historical_data['venue'])):
+            classes = sorted(values.astype(str).unique(), reverse=reverse)
+            encoder = LabelEncoder()
+            encoder.classes_ = np.array(classes)
+            version_encoders[name] = encoder
+        encoders.append(version_encoders)
+
+    match = historical_data[historical_data['match_date'] == historical_data['match_date'].max()]
+    players = [{'player_id': r.player_id, 'player_name': r.player_name, 'team': r.team} for r in match.itertuples()]
+    match_date, venue = match['match_date'].iloc[0], match['venue'].iloc[0]
+    resolver = RoleResolver(*roles)
+
+    cache = FeatureCache()
+    cache.set_version('data-1')
+    for _ in range(2):
+        for version, version_encoders in zip(('model-a', 'model-b'), encoders):
+            args = (players, match_date, venue, historical_data, *roles, version_encoders)
+            cached = create_features_for_inference_v2(*args, role_resolver=resolver,
+                                                      feature_cache=cache.view(version))
+            direct = create_features_for_inference_v2(*args, role_resolver=resolver)
+            pd.testing.assert_frame_equal(cached, direct)
+    assert cache.stats()['hits'] == 2 * len(players)
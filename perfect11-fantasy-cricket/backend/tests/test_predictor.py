@@ -0,0 +1,100 @@
+"""
+Per-tree prediction intervals from predict_fantasy_points
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+from modules.flat_forest import FlatForest
+from modules.inference_batcher import InferenceBatcher
+from modules.predictor import predict_fantasy_points, INTERVAL_PERCENTILES
+from modules.row_cache import RowCache
+
+FEATURE_COLS = ['avg_fp_last5', 'venue_avg_fp', 'strike_rate', 'role', 'team']
+
+
+def training_frame(seed=0, n=400):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(30, 15, (n, len(FEATURE_COLS))), columns=FEATURE_COLS)
+    X['role'] = rng.integers(0, 4, n)
+    y = 0.6 * X['avg_fp_last5'] + 0.3 * X['venue_avg_fp'] + 5 * X['role'] + rng.normal(0, 8, n)
+    return X, y
+
+
+def player_features(seed=1, n=22):
+    X, _ = training_frame(seed, n)
+    X.loc[0, 'strike_rate'] = np.nan
+    X['player_id'] = [f'p{i}' for i in range(n)]
+    return X
+
+
+@pytest.fixture(scope='module', params=['extra_trees', 'random_forest'])
+def model(request):
+    X, y = training_frame()
+    if request.param == 'extra_trees':
+        return ExtraTreesRegressor(n_estimators=40, min_samples_leaf=2, random_state=0).fit(X, y)
+    return RandomForestRegressor(n_estimators=40, max_depth=10, random_state=0).fit(X, y)
+
+
+def expected_intervals(model, features):
+    """The mean from model.predict and the spread of the per-estimator predictions"""
+    X = features[FEATURE_COLS].fillna(0)
+    per_tree = np.array([tree.predict(X.values) for tree in model.estimators_])
+    low, high = np.percentile(per_tree, INTERVAL_PERCENTILES, axis=0)
+    return model.predict(X), per_tree.std(axis=0), low, high
+
+
+def assert_intervals(predictions, intervals, model, features):
+    mean, std, low, high = expected_intervals(model, features)
+    ids = list(features['player_id'])
+    assert [predictions[pid] for pid in ids] == pytest.approx(mean.tolist(), abs=1e-9)
+    assert [intervals[pid]['std'] for pid in ids] == pytest.approx(std.tolist(), abs=1e-9)
+    assert [intervals[pid]['p10'] for pid in ids] == pytest.approx(low.tolist(), abs=1e-9)
+    assert [intervals[pid]['p90'] for pid in ids] == pytest.approx(high.tolist(), abs=1e-9)
+    for pid in ids:
+        assert intervals[pid]['p10'] <= intervals[pid]['p90']
+    # A forest's trees disagree, so the intervals are not all collapsed onto the mean
+    assert any(intervals[pid]['p90'] - intervals[pid]['p10'] > 0 for pid in ids)
+
+
+def test_intervals_from_estimators(model):
+    features = player_features()
+    predictions, intervals = predict_fantasy_points(features, model, FEATURE_COLS, intervals=True)
+    assert_intervals(predictions, intervals, model, features)
+
+
+def test_intervals_with_packed_forest(model):
+    features = player_features(seed=2)
+    predictions, intervals = predict_fantasy_points(features, model, FEATURE_COLS, intervals=True,
+                                                    forest=FlatForest.from_model(model))
+    assert_intervals(predictions, intervals, model, features)
+
+
+def test_intervals_through_cache_and_batcher(model):
+    """Cached and micro-batched rows report the same mean and bounds"""
+    cache, batcher, forest = RowCache(), InferenceBatcher(max_wait_ms=0), FlatForest.from_model(model)
+    features = player_features(seed=3)
+    for _ in range(2):
+        predictions, intervals = predict_fantasy_points(features, model, FEATURE_COLS, intervals=True, forest=forest,
+                                                        cache=cache.view('v1'), batcher=batcher)
+        assert_intervals(predictions, intervals, model, features)
+    assert cache.stats()['hits'] == len(features)
+
+
+def test_intervals_match_plain_predictions(model):
+    features = player_features(seed=4)
+    plain = predict_fantasy_points(features, model, FEATURE_COLS)
+    predictions, _ = predict_fantasy_points(features, model, FEATURE_COLS, intervals=True)
+    assert predictions == pytest.approx(plain, abs=1e-9)
+
+
+def test_non_tree_model_has_zero_spread():
+    X, y = training_frame()
+    model = Ridge().fit(X, y)
+    features = player_features(seed=5)
+    predictions, intervals = predict_fantasy_points(features, model, FEATURE_COLS, intervals=True)
+    expected = model.predict(features[FEATURE_COLS].fillna(0))
+    assert [predictions[pid] for pid in features['player_id']] == pytest.approx(expected.tolist())
+    for pid in features['player_id']:
+        assert intervals[pid] == {'std': 0.0, 'p10': predictions[pid], 'p90': predictions[pid]}
@@ -0,0 +1,179 @@
+"""
+Monte Carlo risk-aware XI selection
+"""
+import numpy as np
+import pytest
+from scipy.stats import norm
+from modules.constraints_solver import select_optimal_xi, team_total, DEFAULT_PROFILE
+from modules.risk_optimizer import (
+    select_risk_aware_xi,
+    sample_scenarios,
+    risk_objective,
+    FALLBACK_CV,
+    FP_FLOOR,
+    TEAM_CORRELATION
+)
+
+SQUAD_ROLES = ['WK', 'BAT', 'BAT', 'BOWL', 'AR', 'BAT', 'BOWL', 'BOWL', 'AR', 'BAT', 'BOWL']
+
+
+def random_pool(seed, per_team=11):
+    """Two squads with random credits, predicted FP and std_fp (some zero, as below 10 matches)"""
+    rng = np.random.default_rng(seed)
+    players = []
+    for team in ('A', 'B'):
+        for i in range(per_team):
+            mean = round(float(rng.gamma(4.0, 9.0)), 2)
+            players.append({
+                'player_id': f'{team}{i}',
+                'player_name': f'{team} Player {i}',
+                'team': team,
+                'role': SQUAD_ROLES[i % len(SQUAD_ROLES)],
+                'credits': float(rng.integers(8, 23)) / 2,
+                'predicted_fp': mean,
+                'std_fp': 0.0 if rng.random() < 0.2 else round(float(mean * rng.uniform(0.2, 1.6)), 2)
+            })
+    return players
+
+
+def censored_moments(mean, std, floor):
+    """Mean and std of max(N(mean, std), floor)"""
+    a = (floor - mean) / std
+    below, density = norm.cdf(a), norm.pdf(a)
+    first = floor * below + mean * (1 - below) + std * density
+    second = floor ** 2 * below + (mean ** 2 + std ** 2) * (1 - below) + std * (mean + floor) * density
+    return first, np.sqrt(second - first ** 2)
+
+
+OBJECTIVES = [
+    {'objective': 'quantile', 'quantile': 0.05},
+    {'objective': 'quantile', 'quantile': 0.2},
+    {'objective': 'quantile', 'quantile': 0.8},
+    {'objective': 'prob_above', 'threshold': 400.0},
+    {'objective': 'prob_above', 'threshold': 550.0}
+]
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('risk', OBJECTIVES, ids=lambda risk: f"{risk['objective']}-{list(risk.values())[1]}")
+def test_never_worse_than_the_mean_xi(seed, risk):
+    """The mean-optimal XI is candidate 0, so the chosen XI's value is at least its value"""
+    players = random_pool(seed, per_team=14)
+    result = select_risk_aware_xi(players, 'A', 'B', n_scenarios=4000, seed=seed, **risk)
+    assert result['status'] == 'Optimal'
+    assert len(result['selected_players']) == DEFAULT_PROFILE['squad_size']
+    assert result['total_credits'] <= DEFAULT_PROFILE['budget']
+    assert result['risk']['value'] >= result['risk']['mean_xi_value']
+    assert result['risk']['candidates'] >= 1
+
+    # mean_xi_value is the objective of select_optimal_xi's XI on the same scenarios
+    mean_xi = select_optimal_xi(players, 'A', 'B')['selected_players']
+    position = {p['player_id']: i for i, p in enumerate(players)}
+    captain, vice_captain, _ = team_total(mean_xi, 'predicted_fp', DEFAULT_PROFILE['multipliers'])
+    weights = np.zeros(len(players))
+    weights[[position[p['player_id']] for p in mean_xi]] = 1.0
+    for multiplier, leader in zip(DEFAULT_PROFILE['multipliers'], (captain, vice_captain)):
+        weights[position[leader['player_id']]] = multiplier
+    means = [p['predicted_fp'] for p in players]
+    stds = [p['std_fp'] for p in players]
+    scenarios = sample_scenarios(means, stds, [p['team'] for p in players], 4000, seed)
+    expected = risk_objective((scenarios @ weights.astype(np.float32))[:, None], risk['objective'],
+                              risk.get('quantile', 0.2), risk.get('threshold'))[0]
+    assert result['risk']['mean_xi_value'] == pytest.approx(expected, rel=1e-5)
+
+
+def test_seeded_selection_is_repeatable():
+    players = random_pool(11, per_team=14)
+    first = select_risk_aware_xi(players, 'A', 'B', n_scenarios=3000, seed=5)
+    again = select_risk_aware_xi(players, 'A', 'B', n_scenarios=3000, seed=5)
+    assert first['risk'] == again['risk']
+    assert [p['player_id'] for p in first['selected_players']] == [p['player_id'] for p in again['selected_players']]
+
+
+@pytest.mark.parametrize('quantile', [0, 1, -0.1, 1.5, float('nan')])
+def test_quantile_must_be_inside_zero_one(quantile):
+    with pytest.raises(ValueError):
+        select_risk_aware_xi(random_pool(1), 'A', 'B', objective='quantile', quantile=quantile, n_scenarios=100)
+
+
+def test_prob_above_needs_a_threshold():
+    with pytest.raises(ValueError):
+        select_risk_aware_xi(random_pool(1), 'A', 'B', objective='prob_above', n_scenarios=100)
+
+
+def test_unknown_objective():
+    with pytest.raises(ValueError):
+        select_risk_aware_xi(random_pool(1), 'A', 'B', objective='cvar', n_scenarios=100)
+    with pytest.raises(ValueError):
+        risk_objective(np.zeros((10, 2)), objective='cvar')
+
+
+def test_risk_objective_values():
+    totals = np.arange(1, 101, dtype=np.float64)[:, None] * np.array([1.0, 2.0])
+    assert risk_objective(totals, 'quantile', quantile=0.5) == pytest.approx([50.5, 101.0])
+    assert risk_objective(totals, 'prob_above', threshold=90) == pytest.approx([0.10, 0.55])
+
+
+def test_infeasible_pool_returns_no_lineup():
+    players = random_pool(2)
+    for p in players:
+        p['credits'] = 12.0
+    result = select_risk_aware_xi(players, 'A', 'B', n_scenarios=100)
+    assert result['status'] == 'Infeasible' and result['selected_players'] == []
+
+
+N_SCENARIOS = 200000
+
+# Players far from the floor, near it, below it, and with no std (fallback spread)
+MEANS = np.array([60.0, 35.0, 8.0, 2.0, -10.0, 40.0, 5.0, 0.0])
+STDS = np.array([12.0, 30.0, 10.0, 6.0, 5.0, 0.0, 0.0, 0.0])
+TEAMS = ['A', 'A', 'A', 'B', 'B', 'B', 'A', 'B']
+
+
+@pytest.fixture(scope='module')
+def scenarios():
+    return sample_scenarios(MEANS, STDS, TEAMS, N_SCENARIOS, seed=3).astype(np.float64)
+
+
+def test_scenario_shape_and_seed(scenarios):
+    assert scenarios.shape == (N_SCENARIOS, len(MEANS))
+    small = sample_scenarios(MEANS, STDS, TEAMS, 1000, seed=3)
+    assert small.dtype == np.float32
+    assert np.array_equal(small, sample_scenarios(MEANS, STDS, TEAMS, 1000, seed=3))
+    assert not np.array_equal(small, sample_scenarios(MEANS, STDS, TEAMS, 1000, seed=4))
+
+
+def test_scenario_floor(scenarios):
+    """Nobody scores below FP_FLOOR; players whose mean is below it sit there most of the time"""
+    assert scenarios.min() >= FP_FLOOR
+    assert (scenarios[:, 4] == FP_FLOOR).mean() > 0.8
+    assert (scenarios[:, 0] == FP_FLOOR).mean() == 0
+
+
+def test_scenario_marginals(scenarios):
+    """Each player's draws match the floored normal around (mean, std), FALLBACK_CV * |mean| for zero std"""
+    spreads = np.where(STDS > 0, STDS, FALLBACK_CV * np.abs(MEANS))
+    for j, (mean, std) in enumerate(zip(MEANS, spreads)):
+        column = scenarios[:, j]
+        if std == 0:
+            # Zero mean and zero std: no spread to fall back on
+            assert np.all(column == max(mean, FP_FLOOR))
+            continue
+        expected_mean, expected_std = censored_moments(mean, std, FP_FLOOR)
+        assert column.mean() == pytest.approx(expected_mean, abs=5 * std / np.sqrt(N_SCENARIOS)), j
+        assert column.std() == pytest.approx(expected_std, rel=0.02), j
+
+
+def test_fallback_spread_when_std_is_zero(scenarios):
+    """A zero std is replaced by FALLBACK_CV * mean rather than a constant score"""
+    assert scenarios[:, 5].std() > 0.5 * FALLBACK_CV * MEANS[5]
+    _, expected_std = censored_moments(MEANS[5], FALLBACK_CV * MEANS[5], FP_FLOOR)
+    assert scenarios[:, 5].std() == pytest.approx(expected_std, rel=0.02)
+
+
+def test_team_correlation(scenarios):
+    """Team-mates share TEAM_CORRELATION of their variance; opponents are independent"""
+    # Players 0 and 1 (team A) and 5 (team B) are rarely floored
+    correlation = np.corrcoef(scenarios[:, [0, 1, 5]].T)
+    assert correlation[0, 1] == pytest.approx(TEAM_CORRELATION, abs=0.03)
+    assert correlation[0, 2] == pytest.approx(0, abs=0.01)
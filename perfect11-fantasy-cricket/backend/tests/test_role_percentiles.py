@@ -0,0 +1,160 @@
+"""
+Role-percentile snapshots against the per-call loop they replaced
+
+reference_percentile is the compute_percentile_within_role loop that
+RolePercentileSnapshots replaced: for every player seen before the match,
+resolve the role with the table lookup of get_player_role, take the last
+10 rows of their earlier history, score them and count the strictly lower scores. The old loop relied on the CSV being in
+date order within each player (tail(10)); the index sorts by date itself, so
+a shuffled history must give the same percentiles.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from modules.credits_calculator import get_player_role
+from modules.history_index import PlayerHistoryIndex
+from modules.role_percentiles import RolePercentileSnapshots
+from modules.role_resolver import RoleResolver
+
+ROLES = ['WK', 'BAT', 'AR', 'BOWL']
+
+
+def reference_scores(match_date, historical_data, roles_by_season, roles_global):
+    """
+    Composite scores of every player with >= 10 matches before match_date,
+    by role, as the old loop built them
+
+    One pass per date instead of one per (role, date); each player's rows
+    keep the CSV order the old mask kept.
+    """
+    year = match_date.year
+    prior = historical_data[historical_data['match_date'] < match_date]
+    scores = {role: [] for role in ROLES}
+    for pid, p_hist in prior.groupby('player_id', sort=False):
+        if len(p_hist) < 10:
+            continue
+        p_role = get_player_role(pid, year, roles_by_season, roles_global)
+        scores.setdefault(p_role, []).append(reference_composite(p_hist))
+    return scores
+
+
+def reference_composite(p_hist):
+    last_10 = p_hist.tail(10)
+    mu = last_10['fantasy_points'].mean()
+    std = last_10['fantasy_points'].std()
+    if np.isnan(std):
+        std = 0
+    return 0.7 * mu + 0.3 * (mu - std)
+
+
+def reference_percentile(scores, composite_score):
+    if len(scores) == 0:
+        return 50  # Default to median
+    return (np.sum(np.array(scores) < composite_score) / len(scores)) * 100
+
+
+def probe_scores(scores):
+    """
+    Scores below, above and between the role's scores
+
+    Scores equal to one in the role are checked per player in
+    test_each_players_own_percentile: the index sums in a different order,
+    so a reference score can sit an ulp away from the snapshot's copy.
+    """
+    probes = [-100.0, 0.0, 200.0]
+    ordered = sorted(set(scores))
+    probes += [(a + b) / 2 for a, b in zip(ordered[:-1], ordered[1:])]
+    return probes
+
+
+@pytest.fixture(scope='module')
+def match_dates(historical_data):
+    """The first date anyone could have 10 matches, a few dates across the seasons and one after the data"""
+    dates = pd.to_datetime(np.unique(historical_data['match_date']))
+    picks = [dates[0], dates[10], dates[len(dates) // 3], dates[len(dates) // 2], dates[-1]]
+    return picks + [dates[-1] + pd.Timedelta(days=30)]
+
+
+@pytest.fixture(scope='module')
+def reference(historical_data, roles, match_dates):
+    """{match_date: {role: scores}} from the old loop"""
+    return {match_date: reference_scores(match_date, historical_data, *roles) for match_date in match_dates}
+
+
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_percentiles_match_the_reference_loop(historical_data, roles, match_dates, reference, shuffle):
+    data = historical_data
+    if shuffle:
+        data = historical_data.sample(frac=1.0, random_state=0)
+    snapshots = RolePercentileSnapshots(PlayerHistoryIndex(data), RoleResolver(*roles))
+
+    checked = 0
+    for match_date in match_dates:
+        for role in ROLES:
+            scores = reference[match_date][role]
+            assert snapshots.scores(role, match_date) == pytest.approx(sorted(scores), abs=1e-9)
+            for composite_score in probe_scores(scores):
+                assert (snapshots.percentile(role, match_date, composite_score)
+                        == pytest.approx(reference_percentile(scores, composite_score), abs=1e-9))
+                checked += 1
+    assert checked > 100
+
+
+def test_each_players_own_percentile(historical_data, roles, match_dates, reference):
+    """
+    The percentile credits uses: the player's own score from the index
+    against the snapshot, and the old loop's score against its own list
+    """
+    index = PlayerHistoryIndex(historical_data)
+    resolver = RoleResolver(*roles)
+    snapshots = RolePercentileSnapshots(index, resolver)
+
+    checked = 0
+    for match_date in match_dates:
+        prior = historical_data[historical_data['match_date'] < match_date]
+        for pid, p_hist in prior.groupby('player_id', sort=False):
+            if len(p_hist) < 10:
+                continue
+            role = resolver.resolve(pid, match_date.year)
+            expected = reference_percentile(reference[match_date][role], reference_composite(p_hist))
+
+            _, mu, std = index.last_n_stats(pid, match_date, 10)
+            if np.isnan(std):
+                std = 0
+            composite_score = 0.7 * mu + 0.3 * (mu - std)
+            assert snapshots.percentile(role, match_date, composite_score) == pytest.approx(expected, abs=1e-9), pid
+            checked += 1
+    assert checked > 100
+
+
+def test_empty_role_and_early_date_default_to_median(historical_data, roles):
+    snapshots = RolePercentileSnapshots(PlayerHistoryIndex(historical_data), RoleResolver(*roles))
+    first = historical_data['match_date'].min()
+    for match_date, role in ((first, 'BAT'), (first + pd.Timedelta(days=400), 'XX')):
+        assert reference_scores(match_date, historical_data, *roles).get(role, []) == []
+        assert snapshots.percentile(role, match_date, 30.0) == 50
+
+
+def test_small_fixture_against_reference():
+    """Exactly 10 matches, more than 10, fewer than 10, a constant scorer (zero std) and a season role change"""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2023-03-01', periods=14, freq='7D').append(pd.date_range('2024-03-01', periods=4, freq='7D'))
+    rows = []
+    for pid, n in (('p1', 10), ('p2', 14), ('p3', 9), ('p4', 12), ('p5', 18), ('p6', 11)):
+        for k in range(n):
+            points = 25.0 if pid == 'p4' else float(rng.integers(0, 90))
+            rows.append({'player_id': pid, 'match_date': dates[k], 'fantasy_points': points})
+    historical_data = pd.DataFrame(rows)
+    roles_by_season = pd.DataFrame({'player_id': ['p1', 'p2', 'p5', 'p5', 'p6'],
+                                    'season': [2023, 2023, 2023, 2024, 2024],
+                                    'role': ['BAT', 'BAT', 'BAT', 'BOWL', 'AR']})
+    roles_global = pd.DataFrame({'player_id': ['p3', 'p4', 'p6'], 'role': ['BAT', 'BAT', 'BOWL']})
+    snapshots = RolePercentileSnapshots(PlayerHistoryIndex(historical_data),
+                                        RoleResolver(roles_by_season, roles_global))
+
+    for match_date in list(dates[9:]) + [dates[-1] + pd.Timedelta(days=1)]:
+        for role in ('BAT', 'BOWL', 'AR'):
+            scores = reference_scores(match_date, historical_data, roles_by_season, roles_global).get(role, [])
+            for composite_score in probe_scores(scores):
+                assert (snapshots.percentile(role, match_date, composite_score)
+                        == pytest.approx(reference_percentile(scores, composite_score), abs=1e-9))
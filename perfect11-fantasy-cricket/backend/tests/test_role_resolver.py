@@ -0,0 +1,75 @@
+"""
+RoleResolver against the DataFrame lookup it replaced
+
+get_player_role without a resolver still filters the role tables per call
+(season row, then global row, then 'BAT'); resolve and resolve_roles must
+give the same role for every player and season.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from modules.credits_calculator import get_player_role
+from modules.role_resolver import RoleResolver
+
+
+@pytest.fixture(scope='module')
+def every_player(historical_data, roles):
+    """Every id in the history and role tables, plus ids in neither"""
+    roles_by_season, roles_global = roles
+    ids = set(historical_data['player_id']) | set(roles_by_season['player_id']) | set(roles_global['player_id'])
+    return sorted(ids) + ['unknown-1', 'unknown-2']
+
+
+def test_every_player_matches_get_player_role(historical_data, roles, every_player):
+    roles_by_season, roles_global = roles
+    resolver = RoleResolver(*roles)
+    seasons = sorted(roles_by_season['season'].unique())
+    # A first, middle and last season, and years with no season rows at all
+    years = [seasons[0], seasons[len(seasons) // 2], seasons[-1], 2007, 2030]
+
+    for year in years:
+        expected = [get_player_role(pid, year, *roles) for pid in every_player]
+        assert list(resolver.resolve_roles(every_player, year)) == expected
+        assert [resolver.resolve(pid, year) for pid in every_player] == expected
+
+    # Every step of the fallback is exercised by the real tables
+    season_keys = set(zip(roles_by_season['player_id'], roles_by_season['season']))
+    global_ids = set(roles_global['player_id'])
+    tiers = {'season': 0, 'global': 0, 'default': 0}
+    for year in years:
+        for pid in every_player:
+            if (pid, year) in season_keys:
+                tiers['season'] += 1
+            elif pid in global_ids:
+                tiers['global'] += 1
+            else:
+                tiers['default'] += 1
+    assert min(tiers.values()) > 0, tiers
+
+
+def test_fallback_order_and_first_row_wins():
+    """Season row, then global row, then the default; duplicate rows keep the first"""
+    roles_by_season = pd.DataFrame({'player_id': ['p1', 'p1', 'p2', 'p3', 'p3'],
+                                    'season': [2024, 2024, 2023, 2024, 2025],
+                                    'role': ['WK', 'BOWL', 'AR', 'BAT', 'AR']})
+    roles_global = pd.DataFrame({'player_id': ['p1', 'p2', 'p2', 'p4'],
+                                 'role': ['BAT', 'BOWL', 'WK', 'AR']})
+    resolver = RoleResolver(roles_by_season, roles_global)
+
+    players = ['p1', 'p2', 'p3', 'p4', 'p5']
+    for year in (2023, 2024, 2025, 2026):
+        expected = [get_player_role(pid, year, roles_by_season, roles_global) for pid in players]
+        assert list(resolver.resolve_roles(players, year)) == expected
+        assert list(resolver.resolve_roles(np.array(players, dtype=object), np.int64(year))) == expected
+    assert list(resolver.resolve_roles(players, 2024)) == ['WK', 'BOWL', 'BAT', 'AR', 'BAT']
+    assert list(resolver.resolve_roles(players, 2023)) == ['BAT', 'AR', 'BAT', 'AR', 'BAT']
+
+
+def test_empty_tables_give_the_default():
+    empty_season = pd.DataFrame({'player_id': [], 'season': [], 'role': []})
+    empty_global = pd.DataFrame({'player_id': [], 'role': []})
+    resolver = RoleResolver(empty_season, empty_global)
+    assert get_player_role('p1', 2024, empty_season, empty_global) == 'BAT'
+    assert resolver.resolve('p1', 2024) == 'BAT'
+    assert list(resolver.resolve_roles(['p1', 'p2'], 2024)) == ['BAT', 'BAT']
+    assert len(resolver.resolve_roles([], 2024)) == 0
@@ -0,0 +1,199 @@
+"""
+Content-addressed XI cache: keys, bypasses, what is stored and LRU eviction
+"""
+import numpy as np
+import pytest
+from modules.constraint_profiles import compile_profile
+from modules.constraints_solver import (
+    select_optimal_xi,
+    select_top_k_xis,
+    constraint_signature,
+    DEFAULT_PROFILE,
+    CAPTAINCY_MULTIPLIERS
+)
+from modules.solver_cache import SolverCache, problem_key
+
+SQUAD_ROLES = ['WK', 'BAT', 'BAT', 'BOWL', 'AR', 'BAT', 'BOWL', 'BOWL', 'AR', 'BAT', 'BOWL', 'WK', 'AR']
+
+
+def random_pool(seed, per_team=11):
+    rng = np.random.default_rng(seed)
+    return [{
+        'player_id': f'{team}{i}',
+        'player_name': f'{team} Player {i}',
+        'team': team,
+        'role': SQUAD_ROLES[i % len(SQUAD_ROLES)],
+        'credits': float(rng.integers(8, 23)) / 2,
+        'predicted_fp': round(float(rng.gamma(4.0, 9.0)), 2)
+    } for team in ('A', 'B') for i in range(per_team)]
+
+
+def xi_key(players, multipliers=CAPTAINCY_MULTIPLIERS, profile=None, team1='A', team2='B'):
+    """The key select_optimal_xi uses"""
+    return problem_key(players, team1, team2, 'predicted_fp', ['xi', constraint_signature(multipliers, profile)])
+
+
+def ids(result):
+    return [p['player_id'] for p in result['selected_players']]
+
+
+def test_key_ignores_player_order():
+    players = random_pool(1)
+    shuffled = [players[i] for i in np.random.default_rng(0).permutation(len(players))]
+    assert xi_key(shuffled) == xi_key(players)
+    assert xi_key(list(reversed(players))) == xi_key(players)
+
+
+def test_shuffled_request_is_a_hit():
+    cache = SolverCache()
+    players = random_pool(2)
+    first = select_optimal_xi(players, 'A', 'B', solver_cache=cache)
+    again = select_optimal_xi(list(reversed(players)), 'A', 'B', solver_cache=cache)
+    assert cache.stats()['hits'] == 1 and cache.stats()['entries'] == 1
+    assert sorted(ids(again)) == sorted(ids(first))
+    assert again['total_fp_with_captaincy'] == pytest.approx(first['total_fp_with_captaincy'])
+    assert again['captain']['player_id'] == first['captain']['player_id']
+
+
+def test_key_depends_on_the_problem():
+    players = random_pool(3)
+    base = xi_key(players)
+    changed_score = [dict(p, predicted_fp=p['predicted_fp'] + 0.01) if i == 0 else p for i, p in enumerate(players)]
+    changed_credits = [dict(p, credits=p['credits'] + 0.5) if i == 0 else p for i, p in enumerate(players)]
+    changed_role = [dict(p, role='AR') if i == 0 else p for i, p in enumerate(players)]
+    others = [xi_key(changed_score), xi_key(changed_credits), xi_key(changed_role),
+              xi_key(players, team1='B', team2='A'), xi_key(players[:-1])]
+    assert len(set(others + [base])) == len(others) + 1
+    # Float noise below SCORE_DECIMALS does not split entries
+    noisy = [dict(p, predicted_fp=p['predicted_fp'] + 1e-9) for p in players]
+    assert xi_key(noisy) == base
+
+
+def test_profiles_and_multipliers_get_their_own_keys():
+    players = random_pool(4)
+    classic = compile_profile('classic', {
+        'squad_size': 11, 'budget': 100, 'max_per_team': 7, 'min_per_team': 4,
+        'roles': {'WK': [1, 4], 'BAT': [3, 6], 'AR': [1, 4], 'BOWL': [3, 6]}, 'multipliers': [2.0, 1.5]
+    })
+    keys = [
+        xi_key(players),
+        xi_key(players, multipliers=()),
+        xi_key(players, multipliers=(3.0, 2.0)),
+        xi_key(players, multipliers=(2.0,)),
+        xi_key(players, profile=classic),
+        xi_key(players, multipliers=(), profile=classic),
+        problem_key(players, 'A', 'B', 'predicted_fp', ['top_k', 3, 2, constraint_signature()]),
+        problem_key(players, 'A', 'B', 'predicted_fp', ['top_k', 3, 1, constraint_signature()])
+    ]
+    assert len(set(keys)) == len(keys)
+
+
+def test_captaincy_and_profile_are_not_served_each_others_xi():
+    cache = SolverCache()
+    players = random_pool(5, per_team=14)
+    tight = compile_profile('tight', {
+        'squad_size': 11, 'budget': 80, 'max_per_team': 6, 'min_per_team': 5,
+        'roles': {'WK': [1, 2], 'BAT': [3, 5], 'AR': [1, 3], 'BOWL': [3, 5]}, 'multipliers': [2.0, 1.5]
+    })
+    for kwargs in ({}, {'captaincy': False}, {'profile': tight}, {'profile': tight, 'captaincy': False}):
+        cached = select_optimal_xi(players, 'A', 'B', solver_cache=cache, **kwargs)
+        assert cached == select_optimal_xi(players, 'A', 'B', **kwargs) | {'pruned_players': cached['pruned_players']}
+    assert cache.stats()['hits'] == 0 and cache.stats()['entries'] == 4
+
+
+def test_duplicate_player_ids_bypass_the_cache():
+    cache = SolverCache()
+    players = random_pool(6)
+    players.append(dict(players[0], predicted_fp=players[0]['predicted_fp'] + 50))
+    assert xi_key(players) is None
+    for _ in range(2):
+        select_optimal_xi(players, 'A', 'B', solver_cache=cache)
+        select_top_k_xis(players, 'A', 'B', k=2, solver_cache=cache)
+    assert cache.stats() == SolverCache().stats()
+    assert cache.get(None) is None
+    cache.put(None, [['A0']], 'Optimal')
+    assert cache.stats()['entries'] == 0
+
+
+@pytest.mark.parametrize('seed', [5, 6])
+def test_time_limited_feasible_xi_is_not_cached(seed):
+    """A lineup cut short by the deadline is never stored, so a later full solve is not served it"""
+    cache = SolverCache()
+    players = random_pool(1000 + seed, per_team=60)
+    cut_short = select_optimal_xi(players, 'A', 'B', solver_cache=cache, time_limit=0.0)
+    assert cut_short['status'] == 'Feasible'
+    assert cache.stats()['entries'] == 0
+
+    full = select_optimal_xi(players, 'A', 'B', solver_cache=cache)
+    assert full['status'] == 'Optimal' and full['pruned_players'] is not None
+    assert full['total_fp_with_captaincy'] >= cut_short['total_fp_with_captaincy']
+    assert cache.stats()['entries'] == 1
+
+    # A completed solve is then served, with or without a time limit
+    again = select_optimal_xi(players, 'A', 'B', solver_cache=cache, time_limit=0.0)
+    assert again['status'] == 'Optimal' and again['pruned_players'] is None
+    assert ids(again) == ids(full)
+
+
+@pytest.mark.parametrize('seed', [0, 5])
+def test_time_limited_top_k_is_not_cached(seed):
+    """Top-K cut short (after its first lineup, or during it) is not stored"""
+    cache = SolverCache()
+    players = random_pool(1000 + seed, per_team=60)
+    lineups = select_top_k_xis(players, 'A', 'B', k=3, solver_cache=cache, time_limit=0.0)
+    assert lineups[-1]['status'] == 'Feasible'
+    assert cache.stats()['entries'] == 0
+
+
+def test_infeasible_outcome_is_cached():
+    cache = SolverCache()
+    players = random_pool(7)
+    for p in players:
+        p['credits'] = 12.0
+    for _ in range(2):
+        assert select_optimal_xi(players, 'A', 'B', solver_cache=cache)['status'] == 'Infeasible'
+    assert cache.stats()['hits'] == 1
+
+
+def test_top_k_cached_lineups():
+    cache = SolverCache()
+    players = random_pool(8, per_team=13)
+    first = select_top_k_xis(players, 'A', 'B', k=4, min_diff=2, solver_cache=cache)
+    again = select_top_k_xis(players, 'A', 'B', k=4, min_diff=2, solver_cache=cache)
+    assert [ids(r) for r in again] == [ids(r) for r in first]
+    assert cache.stats()['hits'] == 1
+    # A different k or min_diff is a different problem
+    select_top_k_xis(players, 'A', 'B', k=3, min_diff=2, solver_cache=cache)
+    select_top_k_xis(players, 'A', 'B', k=4, min_diff=3, solver_cache=cache)
+    assert cache.stats()['hits'] == 1 and cache.stats()['entries'] == 3
+
+
+def test_lru_eviction_counts():
+    cache = SolverCache(max_entries=3)
+    for key in 'abcde':
+        cache.put(key, [[key]], 'Optimal')
+    stats = cache.stats()
+    assert stats['entries'] == 3 and stats['evictions'] == 2
+    assert cache.get('a') is None and cache.get('b') is None
+
+    # Reading 'c' makes it most recent, so 'd' goes next
+    assert cache.get('c') == ((('c',),), 'Optimal')
+    cache.put('f', [['f']], 'Optimal')
+    assert cache.get('d') is None
+    assert cache.get('c') is not None and cache.get('e') is not None and cache.get('f') is not None
+
+    # Replacing an entry does not evict
+    cache.put('f', [['g']], 'Optimal')
+    stats = cache.stats()
+    assert stats['evictions'] == 3 and stats['entries'] == 3
+    assert stats['hits'] == 4 and stats['misses'] == 3
+    assert stats['hit_rate'] == pytest.approx(4 / 7, abs=1e-4)
+
+    cache.invalidate()
+    assert cache.stats()['entries'] == 0 and cache.stats()['evictions'] == 3
+
+
+def test_zero_size_cache_keeps_nothing():
+    cache = SolverCache(max_entries=0)
+    select_optimal_xi(random_pool(9), 'A', 'B', solver_cache=cache)
+    assert cache.stats()['entries'] == 0 and cache.stats()['evictions'] == 1
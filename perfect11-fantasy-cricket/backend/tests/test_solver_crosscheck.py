@@ -0,0 +1,395 @@
+"""
+Cross-check of the native XI search against the PuLP/CBC reference backend
+Both backends solve the same random pools; lineups may differ on ties, so
+the objectives must agree and every native lineup must pass an independent
+feasibility check.
+"""
+import os
+import numpy as np
+import pytest
+from conftest import BACKEND_DIR
+from modules.constraint_profiles import compile_profile, load_profiles
+from modules.constraints_solver import select_optimal_xi, select_top_k_xis, selection_sensitivity, DEFAULT_PROFILE
+
+pytest.importorskip('pulp')
+
+ROLES = ['WK', 'BAT', 'AR', 'BOWL']
+# Role of each squad member, cycled for larger squads
+SQUAD_ROLES = ['WK', 'BAT', 'BAT', 'BOWL', 'AR', 'BAT', 'BOWL', 'BOWL', 'AR', 'BAT', 'BOWL', 'WK', 'AR']
+TOL = 1e-6
+
+
+def random_pool(seed, per_team=11, teams=('A', 'B'), roles=ROLES, score_levels=None):
+    """
+    Squads of the given roles with random credits (4-11 in halves) and predicted points
+
+    score_levels draws the points from a few values so many players tie.
+    """
+    rng = np.random.default_rng(seed)
+    squad_roles = [role for role in SQUAD_ROLES if role in roles]
+    players = []
+    for team in teams:
+        for i in range(per_team):
+            if score_levels is None:
+                score = round(float(rng.gamma(4.0, 9.0)), 2)
+            else:
+                score = float(rng.choice(score_levels))
+            players.append({
+                'player_id': f'{team}{i}',
+                'player_name': f'{team} Player {i}',
+                'team': team,
+                'role': squad_roles[i % len(squad_roles)],
+                'credits': float(rng.integers(8, 23)) / 2,
+                'predicted_fp': score
+            })
+    return players
+
+
+def profile_with(**spec):
+    """The default profile with some settings replaced"""
+    base = {
+        'squad_size': DEFAULT_PROFILE['squad_size'],
+        'budget': DEFAULT_PROFILE['budget'],
+        'roles': {role: [lo, hi] for role, lo, hi in
+                  zip(DEFAULT_PROFILE['roles'], DEFAULT_PROFILE['role_lo'], DEFAULT_PROFILE['role_hi'])},
+        'max_per_team': DEFAULT_PROFILE['max_per_team'],
+        'min_per_team': DEFAULT_PROFILE['min_per_team'],
+        'multipliers': list(DEFAULT_PROFILE['multipliers'])
+    }
+    base.update(spec)
+    return compile_profile('test', base)
+
+
+def assert_feasible(result, players, team1, team2, profile=DEFAULT_PROFILE):
+    """Check a lineup against the profile without going through either solver"""
+    lineup = result['selected_players']
+    assert len(lineup) == profile['squad_size']
+    assert len(set(p['player_id'] for p in lineup)) == len(lineup)
+    assert sum(p['credits'] for p in lineup) <= profile['budget'] + TOL
+    for role, lo, hi in zip(profile['roles'], profile['role_lo'], profile['role_hi']):
+        if any(p['role'] == role for p in players):
+            assert lo <= sum(p['role'] == role for p in lineup) <= hi, role
+    for team in (team1, team2):
+        if any(p['team'] == team for p in players):
+            count = sum(p['team'] == team for p in lineup)
+            assert profile['min_per_team'] <= count <= profile['max_per_team'], team
+
+
+def assert_same_optimum(players, team1='A', team2='B', **kwargs):
+    """Solve with both backends and compare; returns the native result"""
+    native = select_optimal_xi(players, team1, team2, backend='native', **kwargs)
+    pulp = select_optimal_xi(players, team1, team2, backend='pulp', **kwargs)
+    assert native['status'] == pulp['status']
+    if native['status'] == 'Optimal':
+        assert native['total_fp_with_captaincy'] == pytest.approx(pulp['total_fp_with_captaincy'], abs=TOL)
+        assert_feasible(native, players, team1, team2, kwargs.get('profile') or DEFAULT_PROFILE)
+    else:
+        assert native['selected_players'] == []
+    return native
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_random_pools(seed):
+    assert assert_same_optimum(random_pool(seed), captaincy=False)['status'] == 'Optimal'
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_larger_pools(seed):
+    assert_same_optimum(random_pool(100 + seed, per_team=18), captaincy=False)
+
+
+@pytest.mark.parametrize('budget', [40, 55])
+def test_infeasible_budget(budget):
+    result = assert_same_optimum(random_pool(1), captaincy=False, profile=profile_with(budget=budget))
+    assert result['status'] == 'Infeasible' and not result['feasible']
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_tight_budget(seed):
+    assert_same_optimum(random_pool(200 + seed), captaincy=False, profile=profile_with(budget=75))
+
+
+@pytest.mark.parametrize('absent', ROLES)
+def test_absent_role(absent):
+    """A role with no candidates drops its bounds in both backends"""
+    roles = [role for role in ROLES if role != absent]
+    players = random_pool(300 + ROLES.index(absent), per_team=13, roles=roles)
+    assert_same_optimum(players, captaincy=False)
+
+
+def test_infeasible_role_minimum():
+    """Too few bowlers to meet the minimum"""
+    players = random_pool(7, roles=['WK', 'BAT', 'AR'])
+    for p in players[:2]:
+        p['role'] = 'BOWL'
+    result = assert_same_optimum(players, captaincy=False)
+    assert result['status'] == 'Infeasible'
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_tied_scores(seed):
+    players = random_pool(400 + seed, score_levels=[20.0, 30.0, 40.0])
+    assert_same_optimum(players, captaincy=False)
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_third_team_players(seed):
+    """Players from neither listed team count toward nothing but the squad and budget"""
+    players = random_pool(500 + seed, per_team=9, teams=('A', 'B', 'C'))
+    assert_same_optimum(players, captaincy=False)
+
+
+def test_single_team_pool():
+    players = random_pool(8, per_team=16, teams=('A',))
+    assert_same_optimum(players, 'A', 'B', captaincy=False)
+
+
+def assert_same_top_k(players, k, min_diff, team1='A', team2='B', **kwargs):
+    """Top-K with both backends: same objective sequence, each lineup feasible and diverse"""
+    native = select_top_k_xis(players, team1, team2, k=k, min_diff=min_diff, backend='native', **kwargs)
+    pulp = select_top_k_xis(players, team1, team2, k=k, min_diff=min_diff, backend='pulp', **kwargs)
+    assert [r['total_fp_with_captaincy'] for r in native] == pytest.approx(
+        [r['total_fp_with_captaincy'] for r in pulp], abs=TOL)
+    totals = [r['total_fp_with_captaincy'] for r in native]
+    assert totals == sorted(totals, reverse=True)
+    squad_size = (kwargs.get('profile') or DEFAULT_PROFILE)['squad_size']
+    lineups = [set(p['player_id'] for p in r['selected_players']) for r in native]
+    for r in native:
+        assert r['status'] == 'Optimal'
+        assert_feasible(r, players, team1, team2, kwargs.get('profile') or DEFAULT_PROFILE)
+    for a in range(len(lineups)):
+        for b in range(a):
+            assert len(lineups[a] & lineups[b]) <= squad_size - min_diff
+    return native
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('min_diff', [1, 2, 4])
+def test_top_k(seed, min_diff):
+    result = assert_same_top_k(random_pool(600 + seed), k=5, min_diff=min_diff, captaincy=False)
+    assert len(result) == 5
+
+
+def test_top_k_first_is_optimal_xi():
+    players = random_pool(610)
+    best = select_optimal_xi(players, 'A', 'B', captaincy=False)
+    top = select_top_k_xis(players, 'A', 'B', k=3, captaincy=False)
+    assert top[0]['total_fp_with_captaincy'] == pytest.approx(best['total_fp_with_captaincy'], abs=TOL)
+
+
+def test_top_k_runs_out_of_lineups():
+    """Exactly 12 candidates: with min_diff=2 no two lineups of 11 can differ enough"""
+    players = random_pool(620, per_team=6)
+    result = assert_same_top_k(players, k=4, min_diff=2, captaincy=False,
+                               profile=profile_with(roles={'WK': [0, 11], 'BAT': [0, 11], 'AR': [0, 11], 'BOWL': [0, 11]}))
+    assert len(result) == 1
+
+
+@pytest.mark.parametrize('seed', range(15))
+def test_captaincy(seed):
+    """XI, captain (2x) and vice-captain (1.5x) chosen jointly match the PuLP model"""
+    players = random_pool(700 + seed)
+    result = assert_same_optimum(players, captaincy=True)
+    scores = sorted((p['predicted_fp'] for p in result['selected_players']), reverse=True)
+    assert result['captain']['predicted_fp'] == scores[0]
+    assert result['vice_captain']['predicted_fp'] == scores[1]
+    assert result['captain']['player_id'] != result['vice_captain']['player_id']
+    assert result['total_fp_with_captaincy'] == pytest.approx(sum(scores) + scores[0] + 0.5 * scores[1])
+
+
+@pytest.mark.parametrize('seed', [7, 21, 53, 73, 83, 99])
+def test_captaincy_changes_xi(seed):
+    """Pools where the best XI with captaincy differs from the best plain XI"""
+    players = random_pool(seed, per_team=15)
+    profile = profile_with(budget=70)
+    with_captaincy = assert_same_optimum(players, captaincy=True, profile=profile)
+    plain = select_optimal_xi(players, 'A', 'B', captaincy=False, profile=profile)
+    assert (set(p['player_id'] for p in with_captaincy['selected_players'])
+            != set(p['player_id'] for p in plain['selected_players']))
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_captaincy_tied_scores(seed):
+    assert_same_optimum(random_pool(730 + seed, score_levels=[20.0, 30.0, 40.0]), captaincy=True)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_top_k_captaincy(seed):
+    assert_same_top_k(random_pool(740 + seed), k=4, min_diff=2, captaincy=True)
+
+
+# Compiled profiles from the shipped config (always including the default)
+CONFIG_PROFILES = load_profiles(os.path.join(BACKEND_DIR, 'config', 'constraint_profiles.json'), DEFAULT_PROFILE)
+
+
+@pytest.mark.parametrize('name', sorted(CONFIG_PROFILES))
+@pytest.mark.parametrize('seed', range(5))
+def test_config_profiles(name, seed):
+    profile = CONFIG_PROFILES[name]
+    result = assert_same_optimum(random_pool(800 + seed, per_team=14), captaincy=True, profile=profile)
+    assert result['profile'] == name
+    assert result['multipliers'] == tuple(profile['multipliers'])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_custom_format(seed):
+    """Smaller squad, own role bounds, wider team minimum, three multipliers"""
+    profile = profile_with(squad_size=8, budget=60, max_per_team=5, min_per_team=3,
+                           roles={'WK': [1, 2], 'BAT': [2, 4], 'AR': [1, 3], 'BOWL': [2, 4]},
+                           multipliers=[3.0, 2.0, 1.5])
+    result = assert_same_optimum(random_pool(820 + seed), captaincy=True, profile=profile)
+    assert result['status'] == 'Optimal'
+    assert_same_top_k(random_pool(820 + seed), k=3, min_diff=2, captaincy=True, profile=profile)
+
+
+def test_profile_with_unknown_role():
+    """Roles missing from a profile leave those players unconstrained by role"""
+    profile = profile_with(roles={'BAT': [3, 6], 'BOWL': [3, 6]})
+    result = assert_same_optimum(random_pool(830), captaincy=True, profile=profile)
+    assert result['status'] == 'Optimal'
+
+
+def assert_pruning_keeps_optimum(players, team1='A', team2='B', **kwargs):
+    """Pruned native solve vs unpruned native and unpruned PuLP; returns the pruned result"""
+    pruned = select_optimal_xi(players, team1, team2, backend='native', prune=True, **kwargs)
+    unpruned = select_optimal_xi(players, team1, team2, backend='native', prune=False, **kwargs)
+    reference = select_optimal_xi(players, team1, team2, backend='pulp', prune=False, **kwargs)
+    assert pruned['status'] == unpruned['status'] == reference['status']
+    assert unpruned['pruned_players'] == 0
+    if pruned['status'] == 'Optimal':
+        for result in (unpruned, reference):
+            assert pruned['total_fp_with_captaincy'] == pytest.approx(result['total_fp_with_captaincy'], abs=TOL)
+        assert_feasible(pruned, players, team1, team2, kwargs.get('profile') or DEFAULT_PROFILE)
+    return pruned
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('captaincy', [False, True])
+def test_pruning_large_squads(seed, captaincy):
+    result = assert_pruning_keeps_optimum(random_pool(900 + seed, per_team=32), captaincy=captaincy)
+    assert result['pruned_players'] > 0
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_pruning_multi_match_slate(seed):
+    """Four squads in one pool: only the two listed teams carry team bounds"""
+    players = random_pool(920 + seed, per_team=15, teams=('A', 'B', 'C', 'D'))
+    assert_pruning_keeps_optimum(players, captaincy=True)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_pruning_duplicates(seed):
+    """Identical players (same role, team, credits and points) dominate each other only one way"""
+    players = random_pool(940 + seed, per_team=30, score_levels=[25.0, 35.0])
+    for p in players:
+        p['credits'] = 8.0 if p['credits'] < 8 else 9.0
+    result = assert_pruning_keeps_optimum(players, captaincy=True)
+    assert result['pruned_players'] > 0
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_pruning_tight_profile(seed):
+    """Narrow role and team caps limit how many dominators an XI can hold"""
+    profile = profile_with(budget=85, max_per_team=6, min_per_team=5,
+                           roles={'WK': [1, 1], 'BAT': [3, 4], 'AR': [1, 2], 'BOWL': [3, 4]})
+    assert_pruning_keeps_optimum(random_pool(960 + seed, per_team=20), captaincy=True, profile=profile)
+
+
+@pytest.mark.parametrize('per_team', [11, 30, 60])
+@pytest.mark.parametrize('seed', range(5))
+def test_deadline_still_returns_a_lineup(per_team, seed):
+    """An exhausted time limit returns a feasible XI with a proven bound, never an empty one"""
+    players = random_pool(1000 + seed, per_team=per_team)
+    optimum = select_optimal_xi(players, 'A', 'B', backend='pulp', prune=False)['total_fp_with_captaincy']
+    for time_limit in (0.0, 0.0005):
+        result = select_optimal_xi(players, 'A', 'B', time_limit=time_limit)
+        assert result['status'] in ('Optimal', 'Feasible')
+        assert_feasible(result, players, 'A', 'B')
+        assert result['total_fp_with_captaincy'] <= optimum + TOL
+        assert result['objective_bound'] >= optimum - TOL
+        assert 0 <= result['optimality_gap'] <= 1
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_deadline_top_k(seed):
+    """Top-K out of time keeps the lineups it has, the first always included"""
+    players = random_pool(1100 + seed, per_team=30)
+    lineups = select_top_k_xis(players, 'A', 'B', k=5, min_diff=2, time_limit=0.0)
+    assert 1 <= len(lineups) <= 5
+    for result in lineups:
+        assert_feasible(result, players, 'A', 'B')
+    assert all(result['status'] == 'Optimal' for result in lineups[:-1])
+
+
+def test_deadline_infeasible():
+    """No time limit can turn an infeasible pool into a lineup"""
+    result = select_optimal_xi(random_pool(1), 'A', 'B', time_limit=0.0, profile=profile_with(budget=40))
+    assert result['status'] == 'Infeasible' and result['selected_players'] == []
+
+
+def test_generous_deadline_is_optimal():
+    players = random_pool(1200)
+    result = assert_same_optimum(players, captaincy=True, time_limit=10.0)
+    assert result['status'] == 'Optimal' and result['optimality_gap'] == 0
+
+
+def included_at(players, index, score, **kwargs):
+    """Whether the best XI includes players[index] when it is predicted to score score"""
+    moved = [dict(p, predicted_fp=score) if i == index else p for i, p in enumerate(players)]
+    result = select_optimal_xi(moved, 'A', 'B', **kwargs)
+    return any(p['player_id'] == players[index]['player_id'] for p in result['selected_players'])
+
+
+def bisect_flip(players, index, inside, outside, steps=30, **kwargs):
+    """Score where inclusion flips, between a score that includes the player and one that does not"""
+    assert included_at(players, index, inside, **kwargs) and not included_at(players, index, outside, **kwargs)
+    for _ in range(steps):
+        middle = (inside + outside) / 2
+        if included_at(players, index, middle, **kwargs):
+            inside = middle
+        else:
+            outside = middle
+    return (inside + outside) / 2
+
+
+# Scores this far from a player's prediction bracket any flip in these pools
+FLIP_RANGE = 400.0
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('captaincy', [True, False])
+def test_sensitivity_thresholds_by_bisection(seed, captaincy):
+    """
+    Each reported fp_threshold is where select_optimal_xi starts (or stops)
+    picking the player, bisected on the player's predicted_fp with everyone
+    else's points and all credits unchanged; the report describes the XI
+    /predict returns
+    """
+    # Seeds 4 and 5 tie many players, where the returned XI is one of several optima
+    players = random_pool(1300 + seed, score_levels=[20.0, 30.0, 40.0] if seed >= 4 else None)
+    if seed == 0:
+        # A lone wicket-keeper must play whatever they score
+        for p in players[1:]:
+            p['role'] = 'BAT' if p['role'] == 'WK' else p['role']
+    profile = profile_with(budget=90) if seed % 2 else DEFAULT_PROFILE
+    optimal_xi = select_optimal_xi(players, 'A', 'B', captaincy=captaincy, profile=profile)
+    in_xi = set(p['player_id'] for p in optimal_xi['selected_players'])
+    report = selection_sensitivity(players, 'A', 'B', captaincy=captaincy, profile=profile, lineup=sorted(in_xi))
+    assert set(report) == set(p['player_id'] for p in players)
+
+    for index, player in enumerate(players):
+        entry = report[player['player_id']]
+        score = player['predicted_fp']
+        assert entry['selected'] == (player['player_id'] in in_xi)
+        if entry['fp_change'] is None:
+            # Nothing the player could score flips them (e.g. no feasible swap)
+            far = score - FLIP_RANGE if entry['selected'] else score + FLIP_RANGE
+            assert included_at(players, index, far, captaincy=captaincy, profile=profile) == entry['selected']
+            continue
+        assert entry['fp_threshold'] == pytest.approx(score + entry['fp_change'])
+        assert (entry['fp_change'] <= 0) if entry['selected'] else (entry['fp_change'] >= 0)
+        if entry['selected']:
+            flip = bisect_flip(players, index, score, score - FLIP_RANGE, captaincy=captaincy, profile=profile)
+        else:
+            flip = bisect_flip(players, index, score + FLIP_RANGE, score, captaincy=captaincy, profile=profile)
+        assert flip == pytest.approx(entry['fp_threshold'], abs=1e-4), player['player_id']